@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import User, Product, ProductImage, Order, OrderItem, CartItem, Wishlist, CancelledOrder, Address
+from . import inventory
+from .models import (
+    User, Product, ProductImage, Order, OrderItem, CartItem, Wishlist, CancelledOrder, Address, Job, StockMovement, StockSnapshot,
+    ArchivedOrder, ArchivedNotification,
+)
 
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
@@ -15,11 +19,20 @@ class UserAdmin(admin.ModelAdmin):
 # Register the Product Model
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'price', 'count', 'is_active')
+    list_display = ('name', 'category', 'price', 'count', 'units_sold', 'wishlist_count', 'is_active')
     list_filter = ('category', 'is_active')
     search_fields = ('name', 'description')
+    readonly_fields = ('units_sold', 'trending_score', 'wishlist_count', 'low_stock_alerted_at')
     inlines = [ProductImageInline] 
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Edits leave the counters alone (Product.save_edits); a stock change is recorded as a ledger adjustment
+        obj.save_edits()
+        if 'count' in form.changed_data:
+            inventory.set_level(obj, form.cleaned_data['count'], user=request.user)
+
 # Register the Order Model
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -39,6 +52,94 @@ class CancelledOrderAdmin(admin.ModelAdmin):
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ('id', 'order', 'product', 'quantity', 'price') 
+    list_display = ('id', 'order', 'product_name', 'quantity', 'price') 
     list_filter = ('order',) 
-    search_fields = ('product__name', 'order__id')
\ No newline at end of file
+    list_select_related = ('order',)
+    search_fields = ('product_name', 'order__id')
+
+# Stock ledger: append-only, written by api/inventory.py
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('id', 'product', 'delta', 'reason', 'order', 'user', 'created_at')
+    list_filter = ('reason', 'created_at')
+    list_select_related = ('product', 'order', 'user')
+    search_fields = ('product__name', 'order__id')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'product', 'level', 'movements', 'taken_at')
+    list_select_related = ('product',)
+    search_fields = ('product__name',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+# Retention archive (api/retention.py): rows moved out by `manage.py archive_data`
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'total_amount', 'status', 'created_at', 'archived_at')
+    list_filter = ('status', 'archived_at')
+    list_select_related = ('user',)
+    search_fields = ('user__username', 'id')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'title', 'recipient', 'is_read', 'created_at', 'archived_at')
+    list_select_related = ('recipient',)
+    search_fields = ('title',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'priority', 'attempts', 'run_at', 'duration_ms')
+    list_filter = ('status', 'name')
+    search_fields = ('name',)
+
+# Slow-request sampler (api/profiling.py), wired up in backend/urls.py under admin.site.admin_view
+def slow_requests_view(request, sample_id=None):
+    from django.http import Http404, HttpResponseRedirect
+    from django.template.response import TemplateResponse
+    from . import profiling
+
+    if request.method == 'POST' and 'clear' in request.POST:
+        profiling.buffer.clear()
+        return HttpResponseRedirect(request.path)
+    sample = None
+    if sample_id is not None:
+        sample = profiling.buffer.get(sample_id)
+        if sample is None:
+            raise Http404('Sample has been rotated out of the buffer')
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Slow requests',
+        'samples': profiling.buffer.all(),
+        'sample': sample,
+        'config': profiling.config(),
+    }
+    return TemplateResponse(request, 'admin/api/slow_requests.html', context)
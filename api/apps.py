@@ -6,4 +6,11 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self):
-        import api.signals
\ No newline at end of file
+        import api.signals  # noqa: F401 (connects the receivers)
+        import api.tasks  # noqa: F401 (registers the @job handlers)
+        from django.db.backends.signals import connection_created
+        from api.metrics import install_query_counter, instrument_serializers
+        from api.profiling import install_query_recorder
+        connection_created.connect(install_query_counter)
+        connection_created.connect(install_query_recorder)
+        instrument_serializers()
\ No newline at end of file
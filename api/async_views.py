@@ -0,0 +1,172 @@
+"""
+Async versions of the hot endpoints, for the ASGI deployment (uvicorn):
+
+    GET  async/products/                       same output as ProductViewSet.list
+    GET  async/products/<pk>/                  same output as ProductViewSet.retrieve
+    POST async/payment/create/                 same output as CreatePaymentView
+    POST async/orders/<pk>/retry-payment/      same output as RetryPaymentView
+
+DRF views are synchronous, so these are plain Django async views. They reuse
+ProductViewSet for queryset/filter/pagination settings and ProductSerializer
+for the output. The Razorpay round trip goes through api.payments (httpx), so
+waiting on the gateway doesn't hold a thread. Under WSGI they still work, but
+each one runs on its own event loop and there is no benefit.
+"""
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import db_routers, metrics, payments
+from .authentication import authenticate_async
+from .models import Order, Product
+from .serializers import ProductSerializer
+from .throttling import AccountRateThrottle, IPRateThrottle
+from .views import ProductViewSet
+
+# Same limits as CreatePaymentView/RetryPaymentView (throttle_scope = 'payment')
+PAYMENT_THROTTLES = [IPRateThrottle.for_scope('payment'), AccountRateThrottle.for_scope('payment')]
+
+
+def render(data, status=200, headers=None):
+    # JSONRenderer rather than JsonResponse, so the bytes match the DRF views
+    return HttpResponse(JSONRenderer().render(data), status=status, headers=headers, content_type='application/json')
+
+
+def failed(detail, status, headers=None):
+    # Shape produced by api.utils.custom_exception_handler
+    return render({'error': 'Request Failed', 'detail': {'detail': detail}}, status, headers)
+
+
+def product_view(request, action, **kwargs):
+    """A ProductViewSet set up like dispatch() would, for its queryset/filter/pagination configuration."""
+    view = ProductViewSet(action=action, args=(), kwargs=kwargs, format_kwarg=None)
+    view.request = Request(request)
+    return view
+
+
+async def replica_alias(request):
+    if not db_routers.replica_aliases():
+        # Saves the auth + thread hop on single-database deployments
+        return None
+    user = await authenticate_async(request)
+    return await sync_to_async(db_routers.replica_for)(user)
+
+
+@require_GET
+async def product_list(request):
+    view = product_view(request, 'list')
+    queryset = view.filter_queryset(view.get_queryset())
+    paginator = view.paginator
+    page_size = paginator.get_page_size(view.request)
+    page_param = request.GET.get(paginator.page_query_param, 1)
+
+    with db_routers.read_from(await replica_alias(request)):
+        count = await queryset.acount()
+        num_pages = max(1, math.ceil(count / page_size))
+        try:
+            page = num_pages if page_param in paginator.last_page_strings else int(page_param)
+        except (TypeError, ValueError):
+            page = 0
+        if not 1 <= page <= num_pages:
+            return failed(paginator.invalid_page_message.format(page_number=page_param, message='Invalid page.'), 404)
+        offset = (page - 1) * page_size
+        # prefetch_related('images') runs as part of the async iteration
+        products = [product async for product in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    previous = None
+    if page > 1:
+        previous = remove_query_param(url, paginator.page_query_param) if page == 2 else \
+            replace_query_param(url, paginator.page_query_param, page - 1)
+    return render({
+        'count': count,
+        'next': replace_query_param(url, paginator.page_query_param, page + 1) if page < num_pages else None,
+        'previous': previous,
+        'results': ProductSerializer(products, many=True, context={'request': view.request}).data,
+    })
+
+
+@require_GET
+async def product_detail(request, pk):
+    view = product_view(request, 'retrieve', pk=pk)
+    queryset = view.filter_queryset(view.get_queryset())
+    with db_routers.read_from(await replica_alias(request)):
+        try:
+            product = await queryset.aget(pk=pk)
+        except Product.DoesNotExist:
+            return failed('No Product matches the given query.', 404)
+    return render(ProductSerializer(product, context={'request': view.request}).data)
+
+
+def check_throttles(request):
+    for throttle_class in PAYMENT_THROTTLES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            return math.ceil(throttle.wait() or 0)
+    return None
+
+
+async def authenticated(request):
+    """(user, error response) for the payment views: JWT auth plus the payment throttles."""
+    user = await authenticate_async(request)
+    if user is None:
+        return None, failed('Authentication credentials were not provided.', 401, {'WWW-Authenticate': 'Bearer realm="api"'})
+    request.user = user
+    wait = await sync_to_async(check_throttles, thread_sensitive=False)(request)
+    if wait is not None:
+        return None, failed(f'Request was throttled. Expected available in {wait} seconds.', 429, {'Retry-After': str(wait)})
+    return user, None
+
+
+@csrf_exempt
+@require_POST
+async def create_payment(request):
+    user, error = await authenticated(request)
+    if error:
+        return error
+    try:
+        data = json.loads(request.body or b'{}')
+        amount = data.get('amount') or data.get('total_amount')
+        if not amount:
+            return render({'error': 'Amount is required'}, 400)
+        amt = int(float(amount) * 100)
+        with metrics.timed('gateway'):
+            order = await payments.acreate_order(amt)
+        return render({
+            'id': order['id'],
+            'razorpay_order_id': order['id'],
+            'amount': amt,
+            'currency': 'INR',
+            'key_id': settings.RAZORPAY_KEY_ID,
+        })
+    except Exception as e:
+        return render({'error': str(e)}, 500)
+
+
+@csrf_exempt
+@require_POST
+async def retry_payment(request, pk):
+    user, error = await authenticated(request)
+    if error:
+        return error
+    try:
+        order = await Order.objects.aget(id=pk, user_id=user.pk)
+        if order.status != 'pending_payment':
+            return render({'error': 'Not pending'}, 400)
+        amt = int(float(order.total_amount) * 100)
+        with metrics.timed('gateway'):
+            rzp_order = await payments.acreate_order(amt)
+        return render({
+            'razorpay_order_id': rzp_order['id'], 'amount': amt,
+            'currency': 'INR', 'key_id': settings.RAZORPAY_KEY_ID, 'order_id': order.id,
+        })
+    except Exception as e:
+        return render({'error': str(e)}, 500)
@@ -0,0 +1,60 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import USER_CLAIMS, is_revoked
+
+
+async def authenticate_async(request):
+    """
+    JWT authentication for plain Django async views, which DRF's authentication
+    classes don't support. Browsers' EventSource can't send headers, so the token
+    may also come from the `token` query parameter.
+    Returns the user or None.
+    """
+    # Same class as DRF's default, so no User query when the token carries the claims
+    auth = StatelessJWTAuthentication()
+    header = auth.get_header(request)
+    try:
+        raw_token = auth.get_raw_token(header) if header else None
+        if raw_token is None:
+            raw_token = request.GET.get('token')
+        if not raw_token:
+            return None
+        validated_token = auth.get_validated_token(raw_token)
+        return await sync_to_async(auth.get_user)(validated_token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Builds request.user from the signed token claims instead of querying the
+    User table on every request. Revoked tokens (password/role change, blocked
+    or deactivated accounts) are rejected using the cached set in api.tokens.
+    The returned User has only id/claim fields loaded; anything else is fetched
+    in one query on first access.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        if is_revoked(user_id, validated_token):
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+        if not all(claim in validated_token for claim in USER_CLAIMS):
+            # Token issued before claims were added
+            return super().get_user(validated_token)
+
+        User = get_user_model()
+        claims = {'id': int(user_id), **{claim: validated_token[claim] for claim in USER_CLAIMS}}
+        # from_db expects the values of a partial row in concrete field order
+        field_names = [f.attname for f in User._meta.concrete_fields if f.attname in claims]
+        user = User.from_db(DEFAULT_DB_ALIAS, field_names, [claims[name] for name in field_names])
+        user._from_token = True
+        return user
@@ -0,0 +1,62 @@
+"""Helpers shared by the bench_* management commands."""
+import statistics
+import time
+
+from django.db import connections
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class QueryCounter:
+    """Cheap execute_wrapper that counts queries (unlike CaptureQueriesContext it keeps no SQL)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(client, method, path, iterations=200, warmup=10, **kwargs):
+    """Time `iterations` requests through a Django test client; returns a stats dict."""
+    send = getattr(client, method.lower())
+    for _ in range(warmup):
+        send(path, **kwargs)
+
+    counter = QueryCounter()
+    latencies = []
+    status_code = None
+    with connections['default'].execute_wrapper(counter):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            response = send(path, **kwargs)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            status_code = response.status_code
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'status': status_code,
+        'requests': iterations,
+        'rps': iterations / elapsed if elapsed else 0.0,
+        'mean_ms': statistics.fmean(latencies),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'queries_per_request': counter.count / iterations,
+    }
+
+
+def format_row(label, stats):
+    return (
+        f"{label:<40} {stats['status']:>4} {stats['rps']:>9.1f} req/s  "
+        f"p50 {stats['p50_ms']:>7.2f}ms  p95 {stats['p95_ms']:>7.2f}ms  p99 {stats['p99_ms']:>7.2f}ms  "
+        f"{stats['queries_per_request']:>5.1f} q/req"
+    )
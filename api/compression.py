@@ -0,0 +1,195 @@
+"""
+Response compression with a store of precompressed bodies.
+
+CompressionMiddleware gzips (or, when the `brotli` package is installed and
+the client accepts it, brotli-compresses) GET responses that are large enough
+and of a compressible type. The body's hash becomes the ETag, and a request
+whose If-None-Match carries it gets a 304 without a body. The compressed
+bytes are kept in a per-process LRU keyed by (hash, encoding), so identical
+catalog pages and unchanged carts are compressed once. Hashing is far cheaper
+than compressing. The key is derived from the bytes themselves, so one user's
+cached body can never be served for another's.
+
+Only GETs are compressed: POST responses carry tokens (login, refresh) and
+echo request input, which is what BREACH-style attacks need.
+Compression time shows up as the "compression" phase in api.metrics.
+
+Configured by settings.RESPONSE_COMPRESSION (see DEFAULTS).
+"""
+import gzip
+import hashlib
+import re
+from collections import OrderedDict
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024,                # bytes; smaller bodies aren't worth a round of compression
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,             # 10-11 are too slow for dynamic responses, even cached
+    'CACHE_BYTES': 32 * 1024 * 1024,  # compressed bytes kept per process (0 disables the store)
+    'CACHE_MAX_ENTRY': 1024 * 1024,   # larger compressed bodies aren't stored
+    'TYPES': ('application/json', 'text/', 'application/javascript', 'application/xml', 'image/svg+xml'),
+}
+
+ACCEPT_RE = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q=([0-9.]+))?')
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'RESPONSE_COMPRESSION', {})}
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding):
+    """Preferred encoding we support from an Accept-Encoding header, or None."""
+    weights = {}
+    for part in accept_encoding.split(','):
+        match = ACCEPT_RE.match(part)
+        if not match:
+            continue
+        try:
+            weights[match[1].lower()] = float(match[2]) if match[2] else 1.0
+        except ValueError:
+            continue
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body, encoding, options):
+    if encoding == 'br':
+        return brotli.compress(body, quality=options['BROTLI_QUALITY'])
+    # mtime=0 so identical bodies compress to identical bytes
+    return gzip.compress(body, compresslevel=options['GZIP_LEVEL'], mtime=0)
+
+
+class CompressedStore:
+    """LRU of compressed bodies bounded by total size; per worker process, like api.metrics."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.entries = OrderedDict()  # (body hash, encoding) -> bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return body
+
+    def put(self, key, body, limit, max_entry):
+        if len(body) > max_entry or len(body) > limit:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > limit:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def count(self, original, compressed):
+        with self.lock:
+            self.bytes_in += original
+            self.bytes_out += compressed
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = self.hits = self.misses = self.bytes_in = self.bytes_out = 0
+
+
+store = CompressedStore()
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        options = config()
+        if not options['ENABLED'] or request.method != 'GET' or response.streaming:
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(tuple(options['TYPES'])):
+            return response
+        # The representation depends on Accept-Encoding from here on, even if this one isn't compressed
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.has_header('Content-Encoding') or len(response.content) < options['MIN_SIZE']:
+            return response
+
+        body = response.content
+        # Keyed on our own hash even when the view set an ETag: weak ETags don't identify the bytes
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        etag = response.get('ETag') or f'"{digest}"'
+        response['ETag'] = etag
+        encoding = negotiate(request.headers.get('Accept-Encoding', ''))
+        if response.status_code == 200:
+            # If-None-Match compares weakly, so the W/ form sent with compressed bodies matches too
+            not_modified = get_conditional_response(request, etag=etag, response=response)
+            if not_modified is not response:
+                if encoding and not etag.startswith('W/'):
+                    not_modified['ETag'] = 'W/' + etag
+                return not_modified
+        if encoding is None:
+            return response
+
+        with metrics.timed('compression'):
+            key = (digest, encoding)
+            compressed = store.get(key) if options['CACHE_BYTES'] else None
+            if compressed is None:
+                compressed = compress(body, encoding, options)
+                if options['CACHE_BYTES']:
+                    store.put(key, compressed, options['CACHE_BYTES'], options['CACHE_MAX_ENTRY'])
+
+        if len(compressed) >= len(body):
+            return response
+        store.count(len(body), len(compressed))
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # A different byte sequence than the uncompressed response: weak, as Django's GZipMiddleware does
+        if not etag.startswith('W/'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,141 @@
+"""
+Read replicas for the read-heavy, staleness-tolerant endpoints.
+
+Only views that opt in with ReplicaReadMixin (or use read_from()) read from a replica, and only for
+GET/HEAD/OPTIONS. Everything else, and all writes, use `default`. After a
+user writes, ReplicaPinMiddleware pins that user to the primary for
+DATABASE_REPLICAS_PIN_SECONDS, so they see their own writes while the replicas catch up.
+
+Replica aliases are the DATABASES entries named "replica*" (see settings).
+A replica that fails to connect is skipped for REPLICA_RETRY_SECONDS.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_KEY = 'db:pin-primary:{}'
+REPLICA_RETRY_SECONDS = 30
+
+_read_alias = ContextVar('replica_read_alias', default=None)
+_down_until = {}  # alias -> monotonic time; per process
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+def pin_seconds():
+    return getattr(settings, 'DATABASE_REPLICAS_PIN_SECONDS', 5)
+
+
+def pin_to_primary(user):
+    if user is not None and user.is_authenticated:
+        cache.set(PIN_KEY.format(user.pk), 1, pin_seconds())
+
+
+def is_pinned(user):
+    return user is not None and user.is_authenticated and cache.get(PIN_KEY.format(user.pk)) is not None
+
+
+def replica_for(user):
+    """Alias to serve this user's safe reads from, or None for the primary."""
+    if not replica_aliases() or is_pinned(user):
+        return None
+    return choose_replica()
+
+
+@contextmanager
+def read_from(alias):
+    """Route reads made inside the block (including sync_to_async ORM calls) to alias."""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def choose_replica():
+    """A random replica that accepts connections, or None to stay on the primary."""
+    now = time.monotonic()
+    candidates = [alias for alias in replica_aliases() if _down_until.get(alias, 0) <= now]
+    random.shuffle(candidates)
+    for alias in candidates:
+        try:
+            # Cheap with persistent connections: only connects if this thread has no connection yet
+            connections[alias].ensure_connection()
+            return alias
+        except OperationalError:
+            _down_until[alias] = now + REPLICA_RETRY_SECONDS
+    return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """For DRF views whose safe requests may be served from a replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _read_alias.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        # After authentication, so the pin can be looked up for request.user
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            _read_alias.set(replica_for(request.user))
+
+
+class ReplicaPinMiddleware:
+    """Pins users who just wrote something to the primary (read-your-writes)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.process_response(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            await sync_to_async(self.process_response)(request, response)
+        return response
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replica_aliases():
+            # DRF copies the authenticated user (JWT included) back onto the Django request
+            pin_to_primary(getattr(request, 'user', None))
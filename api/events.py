@@ -0,0 +1,161 @@
+"""
+Real-time events (new notifications, order status changes) pushed to clients
+over server-sent events.
+
+Publishing happens from ordinary sync code (signals, views, run_jobs); subscribers
+are the async SSE streams in api.streaming. The broker is chosen with the
+EVENT_BROKER setting. InProcessBroker only reaches streams in the publishing
+process; RedisBroker (the default when REDIS_URL is set) carries events between
+processes over Redis pub/sub. A broker only needs:
+
+    subscribe(channels) -> Subscription  (has `async get()`)
+    unsubscribe(subscription)
+    publish(channel, event)
+    connection_count() -> int
+"""
+import asyncio
+import json
+import logging
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_CHANNEL = 'broadcast'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    def __init__(self, channels, loop, maxsize):
+        self.channels = tuple(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def _put(self, event):
+        # Slow consumers lose events rather than growing memory without bound
+        if not self.queue.full():
+            self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    """Fans events out to subscribers connected to this worker process."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, channels):
+        subscription = Subscription(channels, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            # Safe to call from any thread; the put runs on the subscriber's event loop
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:
+                # Loop already closed (worker shutting down)
+                self.unsubscribe(subscription)
+
+    def connection_count(self):
+        with self._lock:
+            return len({s for subscribers in self._channels.values() for s in subscribers})
+
+
+class RedisBroker(InProcessBroker):
+    """
+    publish() goes to Redis. Each process runs one listener task, started with
+    its first subscriber, that feeds every message into the in-process fan-out.
+    So a stream sees events published by any web worker or by run_jobs.
+    """
+    prefix = 'events:'
+
+    def __init__(self, queue_size=100, url=None):
+        super().__init__(queue_size)
+        self.url = url or settings.REDIS_URL
+        self._client = None
+        self._listener = None
+
+    def publish(self, channel, event):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url)
+        self._client.publish(self.prefix + channel, json.dumps(event))
+
+    def subscribe(self, channels):
+        subscription = super().subscribe(channels)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self.listen())
+        return subscription
+
+    def dispatch(self, message):
+        """One pub/sub message -> local subscribers."""
+        if message['type'] == 'pmessage':
+            channel = message['channel'].decode()[len(self.prefix):]
+            super().publish(channel, json.loads(message['data']))
+
+    async def listen(self):
+        import redis.asyncio as aioredis
+        while self.connection_count():
+            try:
+                async with aioredis.Redis.from_url(self.url) as client, client.pubsub() as pubsub:
+                    await pubsub.psubscribe(self.prefix + '*')
+                    while self.connection_count():
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=5)
+                        if message:
+                            self.dispatch(message)
+            except (OSError, aioredis.RedisError):
+                logger.warning('Event listener lost its Redis connection; retrying', exc_info=True)
+                await asyncio.sleep(1)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    broker_class = import_string(getattr(settings, 'EVENT_BROKER', 'api.events.InProcessBroker'))
+    return broker_class()
+
+
+def publish(channel, event_type, data):
+    """Publish once the surrounding transaction commits, so clients never see rolled-back rows."""
+    event = {'type': event_type, 'data': data}
+    transaction.on_commit(lambda: get_broker().publish(channel, event))
+
+
+def publish_notification(notification):
+    channel = user_channel(notification.recipient_id) if notification.recipient_id else BROADCAST_CHANNEL
+    publish(channel, 'notification', {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'created_at': notification.created_at.isoformat(),
+        'recipient': notification.recipient_id,
+    })
+
+
+def publish_order_status(order_id, user_id, status):
+    publish(user_channel(user_id), 'order_status', {'order_id': order_id, 'status': status})
@@ -0,0 +1,203 @@
+"""
+Stock ledger.
+
+Every change to a product's stock is an appended StockMovement: a sale at
+checkout, a restock when an order is cancelled, or an adjustment (opening
+stock, admin edits). Product.count is a cache of the running total. It is
+only changed by the same atomic UPDATE ... SET count = count + delta that goes
+with each insert, never by saving a loaded row (see Product.save_edits).
+
+`manage.py compact_stock` folds old movements into a StockSnapshot per
+product, so a product's level is always
+
+    newest snapshot level + sum(movements still in the ledger)
+
+and `manage.py verify_stock` recomputes that for every product in one query
+and compares it with the cached count. Movements of orders that are still
+open are kept by compaction: restock() reads them to give back exactly what
+the order took.
+
+Configured by settings.INVENTORY (see DEFAULTS).
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import OrderItem, Product, StockMovement, StockSnapshot
+
+DEFAULTS = {
+    'COMPACT_AFTER_DAYS': 30,  # movements older than this are folded into snapshots
+}
+
+# Orders in these states can't be cancelled any more, so their movements can be compacted
+CLOSED_STATUSES = ('delivered', 'cancelled')
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'INVENTORY', {})}
+
+
+def _units(lines):
+    units = defaultdict(int)
+    for product_id, quantity in lines:
+        units[product_id] += quantity
+    return units
+
+
+def adjust(product_id, delta, reason='adjustment', order=None, user=None):
+    """Append one movement and apply it to the cached level."""
+    movement = StockMovement.objects.create(product_id=product_id, delta=delta, reason=reason, order=order, user=user)
+    Product.objects.filter(pk=product_id).update(count=F('count') + delta)
+    return movement
+
+
+def set_level(product, level, user=None):
+    """Admin stock edit: an adjustment movement for the difference. Sets product.count to the new level."""
+    with transaction.atomic():
+        current = Product.objects.select_for_update().filter(pk=product.pk).values_list('count', flat=True).get()
+        if level != current:
+            adjust(product.pk, level - current, user=user)
+    product.count = level
+
+
+def record_opening(products, user=None):
+    """Opening stock of new products. Their count is already set by the INSERT, so only the movements are added."""
+    StockMovement.objects.bulk_create(
+        [StockMovement(product_id=product.pk, delta=product.count, reason='adjustment', user=user)
+         for product in products if product.count],
+        batch_size=1000,
+    )
+
+
+def sell(order, lines):
+    """
+    Take stock for a new order's (product_id, quantity) lines. As before the
+    ledger, a product without enough stock is left as it is and the order still
+    goes through. Returns the movements written.
+    """
+    movements = []
+    # In product order, so concurrent checkouts lock rows in the same order
+    for product_id, quantity in sorted(_units(lines).items()):
+        # Conditional decrement instead of read-check-save: two checkouts can't both take the last units
+        if Product.objects.filter(pk=product_id, count__gte=quantity).update(count=F('count') - quantity):
+            movements.append(StockMovement(product_id=product_id, delta=-quantity, reason='sale', order=order, user_id=order.user_id))
+    return StockMovement.objects.bulk_create(movements)
+
+
+def ledger_started():
+    """When the opening snapshots were taken (migration 0018), or None on a database that had no products then."""
+    return StockSnapshot.objects.order_by('pk').values_list('taken_at', flat=True).first()
+
+
+def restock(order, user=None):
+    """
+    Give back what a cancelled order took: the net of its movements, so a
+    second call does nothing. Orders placed before the ledger existed have no
+    movements and get their line quantities back, which is what cancelling did
+    before.
+    """
+    return restock_orders([order], user)
+
+
+def restock_orders(orders, user=None):
+    """restock() for many orders at once: two reads, one UPDATE over all their products and one INSERT."""
+    by_pk = {order.pk: order for order in orders}
+    taken = defaultdict(dict)  # order -> product -> net movement
+    nets = (
+        StockMovement.objects.filter(order_id__in=by_pk)
+        .values('order_id', 'product_id').annotate(net=Sum('delta'))
+        .values_list('order_id', 'product_id', 'net')
+    )
+    for order_id, product_id, net in nets:
+        taken[order_id][product_id] = net
+    started = ledger_started()
+    legacy = [pk for pk, order in by_pk.items() if pk not in taken and started is not None and order.created_at < started]
+    for order_id, product_id, quantity in OrderItem.objects.filter(order_id__in=legacy).values_list('order_id', 'product_id', 'quantity'):
+        taken[order_id][product_id] = taken[order_id].get(product_id, 0) - quantity
+
+    movements = [
+        StockMovement(product_id=product_id, delta=-net, reason='restock', order_id=order_id, user=user)
+        for order_id, products in taken.items()
+        for product_id, net in products.items()
+        if net < 0
+    ]
+    totals = _units((movement.product_id, movement.delta) for movement in movements)
+    if totals:
+        Product.objects.filter(pk__in=totals).update(count=F('count') + Case(
+            *[When(pk=product_id, then=Value(delta)) for product_id, delta in totals.items()],
+            default=Value(0), output_field=IntegerField(),
+        ))
+    return StockMovement.objects.bulk_create(movements)
+
+
+def ledger_level():
+    """Expression for a product's level according to the ledger (use on Product querysets)."""
+    snapshot = StockSnapshot.objects.filter(product=OuterRef('pk')).order_by('-pk').values('level')[:1]
+    moved = (
+        StockMovement.objects.filter(product=OuterRef('pk'))
+        .values('product').annotate(total=Sum('delta')).values('total')
+    )
+    return (
+        Coalesce(Subquery(snapshot, output_field=IntegerField()), Value(0))
+        + Coalesce(Subquery(moved, output_field=IntegerField()), Value(0))
+    )
+
+
+def mismatches():
+    """(product_id, cached count, ledger level) of every product whose cached count is off, in one query."""
+    return (
+        Product.objects.annotate(expected=ledger_level())
+        .exclude(count=F('expected'))
+        .order_by('pk')
+        .values_list('pk', 'count', 'expected')
+    )
+
+
+def repair(product_ids):
+    """Reset the cached counts of these products to their ledger level (one UPDATE); returns rows changed."""
+    return Product.objects.filter(pk__in=product_ids).update(count=ledger_level())
+
+
+def compactable(before):
+    # Old enough, and not needed by a future restock()
+    return StockMovement.objects.filter(created_at__lt=before).filter(
+        Q(order__isnull=True) | Q(order__status__in=CLOSED_STATUSES)
+    )
+
+
+def compact(before=None, batch_size=500):
+    """
+    Fold compactable movements older than `before` (default: COMPACT_AFTER_DAYS
+    ago) into a new snapshot per product, batch_size products per transaction.
+    Returns (snapshots written, movements folded).
+    """
+    before = before or timezone.now() - timedelta(days=config()['COMPACT_AFTER_DAYS'])
+    # Upper bound fixed up front, so each batch folds exactly the movements it summed
+    last_pk = compactable(before).order_by('-pk').values_list('pk', flat=True).first()
+    if last_pk is None:
+        return 0, 0
+    folding = compactable(before).filter(pk__lte=last_pk)
+    product_ids = list(folding.order_by('product_id').values_list('product_id', flat=True).distinct())
+
+    snapshots = folded = 0
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        with transaction.atomic():
+            totals = folding.filter(product_id__in=batch).values('product_id').annotate(total=Sum('delta'), n=Count('pk'))
+            latest = StockSnapshot.objects.filter(product=OuterRef('pk')).order_by('-pk').values('level')[:1]
+            base = dict(Product.objects.filter(pk__in=batch).annotate(level=Subquery(latest)).values_list('pk', 'level'))
+            now = timezone.now()
+            rows = [
+                StockSnapshot(product_id=row['product_id'], level=(base.get(row['product_id']) or 0) + row['total'],
+                              movements=row['n'], taken_at=now)
+                for row in totals
+            ]
+            StockSnapshot.objects.bulk_create(rows)
+            folded += folding.filter(product_id__in=batch).delete()[0]
+            snapshots += len(rows)
+    return snapshots, folded
@@ -0,0 +1,120 @@
+"""
+Durable background jobs stored in the main database.
+
+    @job('mail.send')
+    def send_email(subject, message, recipient_list): ...
+
+    jobs.enqueue('mail.send', {'subject': ..., ...})
+
+Jobs are rows in api.Job, inserted in the caller's transaction (so they only
+become visible if it commits) and executed by `manage.py run_jobs`, which must
+run next to the web workers (the deploy installs it as the echobay-jobs
+systemd service, see .github/workflows/deploy.yml). Workers
+claim rows with SELECT ... FOR UPDATE SKIP LOCKED where the database supports
+it (PostgreSQL) and with a conditional UPDATE otherwise (SQLite).
+"""
+import logging
+import random
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 10,          # seconds; retry n waits BASE * 2**(n-1), plus jitter
+    'BACKOFF_MAX': 60 * 60,
+    'LOCK_TIMEOUT': 15 * 60,     # a job running longer than this is assumed dead and requeued
+}
+
+_registry = {}
+
+
+def get_setting(name):
+    return {**DEFAULTS, **getattr(settings, 'JOB_QUEUE', {})}[name]
+
+
+def job(name):
+    """Register a function as the handler for jobs called `name`."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, priority=0, delay=None, max_attempts=None):
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        priority=priority,
+        run_at=timezone.now() + (delay or timedelta()),
+        max_attempts=max_attempts or get_setting('MAX_ATTEMPTS'),
+    )
+
+
+def claim(worker_id, names=None):
+    """Lock and return the next runnable job, or None."""
+    now = timezone.now()
+    ready = Job.objects.filter(status='queued', run_at__lte=now).order_by('-priority', 'run_at', 'id')
+    if names:
+        ready = ready.filter(name__in=names)
+    claim_fields = dict(status='running', locked_by=worker_id, locked_at=now, started_at=now, attempts=F('attempts') + 1)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job_id = ready.select_for_update(skip_locked=True).values_list('id', flat=True).first()
+            if job_id is None:
+                return None
+            Job.objects.filter(pk=job_id).update(**claim_fields)
+    else:
+        # No row locks (SQLite): whoever flips the status first owns the job
+        for job_id in ready.values_list('id', flat=True)[:10]:
+            if Job.objects.filter(pk=job_id, status='queued').update(**claim_fields):
+                break
+        else:
+            return None
+    return Job.objects.get(pk=job_id)
+
+
+def run(job_obj):
+    handler = _registry.get(job_obj.name)
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for job "{job_obj.name}"')
+        handler(**job_obj.payload)
+    except Exception:
+        _record_failure(job_obj, traceback.format_exc(), time.perf_counter() - started)
+        return False
+    Job.objects.filter(pk=job_obj.pk).update(
+        status='done', finished_at=timezone.now(), locked_by='', last_error='',
+        duration_ms=int((time.perf_counter() - started) * 1000),
+    )
+    return True
+
+
+def _record_failure(job_obj, error, elapsed):
+    fields = dict(last_error=error, locked_by='', duration_ms=int(elapsed * 1000), finished_at=timezone.now())
+    if job_obj.attempts >= job_obj.max_attempts:
+        logger.error('Job %s #%s failed permanently: %s', job_obj.name, job_obj.pk, error.strip().splitlines()[-1])
+        fields['status'] = 'failed'
+    else:
+        backoff = min(get_setting('BACKOFF_BASE') * 2 ** (job_obj.attempts - 1), get_setting('BACKOFF_MAX'))
+        fields.update(status='queued', run_at=timezone.now() + timedelta(seconds=backoff * random.uniform(1, 1.25)))
+    Job.objects.filter(pk=job_obj.pk).update(**fields)
+
+
+def requeue_stale():
+    """Put jobs whose worker died (lock older than LOCK_TIMEOUT) back on the queue."""
+    cutoff = timezone.now() - timedelta(seconds=get_setting('LOCK_TIMEOUT'))
+    return Job.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status='queued', locked_by='', last_error='Requeued after lock timeout'
+    )
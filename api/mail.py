@@ -0,0 +1,195 @@
+"""
+Outbound email dispatcher.
+
+A small, bounded pool of worker threads drains a queue of EmailMessages and
+sends them in batches over a reused SMTP connection (get_connection() +
+send_messages), instead of one thread and one TLS handshake per email.
+Configured through settings.EMAIL_DISPATCHER; WORKERS = 0 sends inline, which
+is handy with the locmem backend in tests.
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'WORKERS': 2,             # sender threads (each keeps one SMTP connection open)
+    'QUEUE_SIZE': 1000,       # max queued messages before submit() applies backpressure
+    'BATCH_SIZE': 50,         # messages per send_messages() call
+    'BATCH_WAIT': 0.2,        # seconds to wait for a batch to fill up
+    'ENQUEUE_TIMEOUT': 0.5,   # seconds submit() blocks on a full queue before giving up
+    'IDLE_TIMEOUT': 30,       # close an idle SMTP connection after this many seconds
+    'SHUTDOWN_TIMEOUT': 10,   # seconds to drain the queue at process exit
+}
+
+_STOP = object()
+
+
+class MailQueueFull(Exception):
+    pass
+
+
+class MailDispatcher:
+    def __init__(self, workers=2, queue_size=1000, batch_size=50, batch_wait=0.2,
+                 enqueue_timeout=0.5, idle_timeout=30, shutdown_timeout=10, **connection_kwargs):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.enqueue_timeout = enqueue_timeout
+        self.idle_timeout = idle_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.connection_kwargs = connection_kwargs
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def submit(self, message):
+        """Queue an EmailMessage. Raises MailQueueFull if the queue stays full."""
+        if self.workers == 0 or self._closed:
+            self._send([message], get_connection(**self.connection_kwargs)).close()
+            return
+        self._start()
+        try:
+            self.queue.put(message, timeout=self.enqueue_timeout)
+        except queue.Full:
+            raise MailQueueFull(f'{self.queue.qsize()} emails already queued') from None
+
+    def deliver(self, messages):
+        """Send right away on this thread's reused connection. Raises on failure so job retries kick in."""
+        connection = getattr(self._local, 'connection', None) or get_connection(**self.connection_kwargs)
+        for attempt in (1, 2):
+            try:
+                with metrics.timed('smtp'):
+                    connection.open()
+                    connection.send_messages(messages)
+                self._local.connection = connection
+                return
+            except Exception:
+                # The server may have dropped an idle connection; retry once on a fresh one
+                connection.close()
+                self._local.connection = None
+                if attempt == 2:
+                    raise
+                connection = get_connection(**self.connection_kwargs)
+
+    def flush(self):
+        """Block until every queued message has been handed to the backend."""
+        self.queue.join()
+
+    def shutdown(self, timeout=None):
+        with self._lock:
+            if self._closed or not self._threads:
+                self._closed = True
+                return
+            self._closed = True
+        timeout = self.shutdown_timeout if timeout is None else timeout
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _start(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads or self._closed:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'mail-dispatcher-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        atexit.register(self.shutdown)
+
+    def _run(self):
+        connection = None
+        while True:
+            try:
+                item = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                continue
+
+            stop = item is _STOP
+            batch = [] if stop else [item]
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=self.batch_wait)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                if connection is None:
+                    connection = get_connection(**self.connection_kwargs)
+                connection = self._send(batch, connection)
+            for _ in range(len(batch) + stop):
+                self.queue.task_done()
+            if stop:
+                if connection is not None:
+                    connection.close()
+                return
+
+    def _send(self, batch, connection):
+        """Send a batch, retrying once on a fresh connection. Returns the connection to reuse."""
+        for attempt in (1, 2):
+            try:
+                with metrics.timed('smtp'):
+                    connection.open()
+                    connection.send_messages(batch)
+                return connection
+            except Exception as e:
+                connection.close()
+                if attempt == 2:
+                    logger.error('Failed to send %d email(s): %s', len(batch), e)
+                connection = get_connection(**self.connection_kwargs)
+        return connection
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                options = {**DEFAULTS, **getattr(settings, 'EMAIL_DISPATCHER', {})}
+                _dispatcher = MailDispatcher(**{key.lower(): value for key, value in options.items()})
+    return _dispatcher
+
+
+def send_mail(subject, message, recipient_list, from_email=None, durable=False):
+    """
+    Queue a plain-text email; returns False (and logs) when the queue is saturated.
+    durable=True stores it as a background job instead, so it survives restarts.
+    """
+    if durable:
+        from .jobs import enqueue
+        enqueue('mail.send', {
+            'subject': subject, 'message': message,
+            'recipient_list': recipient_list, 'from_email': from_email,
+        })
+        return True
+
+    email = EmailMessage(subject, message, from_email or settings.DEFAULT_FROM_EMAIL, recipient_list)
+    try:
+        get_dispatcher().submit(email)
+    except MailQueueFull as e:
+        logger.warning('Dropping email to %s: %s', ', '.join(recipient_list), e)
+        return False
+    return True
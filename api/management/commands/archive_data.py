@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import retention
+
+
+class Command(BaseCommand):
+    help = (
+        'Move expired rows into the archive tables, per the policies in settings.RETENTION '
+        '(read notifications and old broadcasts; finished orders). Batched and safe to re-run or interrupt.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('policies', nargs='*', help=f"Default: every enabled policy ({', '.join(retention.POLICIES)})")
+        parser.add_argument('--batch-size', type=int, help='Rows per transaction (default RETENTION["BATCH_SIZE"])')
+        parser.add_argument('--limit', type=int, help='Stop each policy after this many rows')
+
+    def handle(self, *args, **options):
+        unknown = set(options['policies']) - set(retention.POLICIES)
+        if unknown:
+            raise CommandError(f"Unknown policy: {', '.join(sorted(unknown))}")
+        for name in options['policies'] or retention.POLICIES:
+            if not options['policies'] and not retention.policy(name)['ENABLED']:
+                self.stdout.write(f"{name}: disabled")
+                continue
+            started = time.perf_counter()
+            moved = retention.POLICIES[name](options['batch_size'], options['limit'])
+            self.stdout.write(f"{name}: archived {moved} row(s) in {time.perf_counter() - started:.2f}s")
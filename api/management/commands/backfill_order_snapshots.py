@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import OrderItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the product snapshot (name, image, category) of order lines created before OrderItem stored it, '
+        'in primary-key batches. Safe to re-run; lines that already have a snapshot are skipped. '
+        "The unit price was always stored, so it isn't touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = OrderItem.objects.filter(product_name='').order_by('pk')
+        last_pk = 0
+        updated = 0
+        while True:
+            # Keyset pagination: each batch is a fresh indexed range scan, however far in we are
+            batch = list(
+                pending.filter(pk__gt=last_pk)
+                .select_related('product')
+                .prefetch_related('product__images')[:batch_size]
+            )
+            if not batch:
+                break
+            for item in batch:
+                for field, value in OrderItem.snapshot(item.product).items():
+                    setattr(item, field, value)
+            with transaction.atomic():
+                OrderItem.objects.bulk_update(batch, ['product_name', 'product_image', 'product_category'])
+            updated += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f"{updated} line(s) backfilled")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {updated} order line(s) backfilled"))
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from api import async_views, payments, views
+from api.bench import percentile
+from api.management.commands.seed_data import PREFIX
+from api.models import User
+from api.tokens import ClaimsRefreshToken
+
+
+class RazorpayStandInHandler(BaseHTTPRequestHandler):
+    """Answers POST /v1/orders like Razorpay, after the configured latency."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.orders += 1
+            order_id = f'order_bench{self.server.orders}'
+        payload = json.dumps({'id': order_id, 'entity': 'order', 'amount': body.get('amount'), 'status': 'created'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class RazorpayStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency):
+        super().__init__(('127.0.0.1', 0), RazorpayStandInHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.orders = 0
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Requests/sec of the sync views under a threaded WSGI server vs the async views under an ASGI event loop, '
+        'for the catalog and for payment creation against a Razorpay stand-in with --gateway-latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads (like gunicorn --threads)')
+        parser.add_argument('--concurrency', type=int, default=100, help='In-flight requests on the ASGI event loop')
+        parser.add_argument('--gateway-latency', type=float, default=150, help='Milliseconds per Razorpay call')
+
+    def handle(self, *args, **options):
+        customer = User.objects.filter(username=f'{PREFIX}user-0').first()
+        if customer is None:
+            raise CommandError('No seeded data found; run `manage.py seed_data` first')
+        auth = f'Bearer {ClaimsRefreshToken.for_user(customer).access_token}'
+
+        server = RazorpayStandIn(options['gateway_latency'] / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        scenarios = [
+            ('catalog', 'get', '/api/products/?category=Electronics', '/api/async/products/?category=Electronics', None),
+            ('payment', 'post', '/api/payment/create/', '/api/async/payment/create/', {'amount': 499}),
+        ]
+        gateway = payments.get_client()
+        original = (views.CreatePaymentView.throttle_classes, async_views.PAYMENT_THROTTLES, gateway.base_url)
+        try:
+            # Throttling would reject most of the run; both sides talk to the stand-in
+            views.CreatePaymentView.throttle_classes = []
+            async_views.PAYMENT_THROTTLES = []
+            gateway.base_url = server.url
+            with override_settings(RAZORPAY_API_URL=server.url):
+                for name, method, sync_path, async_path, data in scenarios:
+                    wsgi = self.run_wsgi(method, sync_path, data, auth, options['requests'], options['threads'])
+                    self.report(f"{name:<8} WSGI  {options['threads']} threads", wsgi)
+                    asgi = asyncio.run(self.run_asgi(method, async_path, data, auth, options['requests'], options['concurrency']))
+                    self.report(f"{name:<8} ASGI  {options['concurrency']} in flight", asgi)
+        finally:
+            views.CreatePaymentView.throttle_classes, async_views.PAYMENT_THROTTLES, gateway.base_url = original
+            server.shutdown()
+
+    def run_wsgi(self, method, path, data, auth, total, threads):
+        local = threading.local()
+
+        def one(_):
+            if not hasattr(local, 'client'):
+                local.client = Client(headers={'Authorization': auth})
+            started = time.perf_counter()
+            if method == 'get':
+                response = local.client.get(path)
+            else:
+                response = local.client.post(path, data, content_type='application/json')
+            return time.perf_counter() - started, response.status_code
+
+        def close(_):
+            connections.close_all()
+
+        with ThreadPoolExecutor(threads) as pool:
+            started = time.perf_counter()
+            results = list(pool.map(one, range(total)))
+            elapsed = time.perf_counter() - started
+            list(pool.map(close, range(threads)))
+        return self.stats(results, elapsed)
+
+    async def run_asgi(self, method, path, data, auth, total, concurrency):
+        client = AsyncClient()
+        headers = {'Authorization': auth}  # AsyncClient doesn't apply client-level headers
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                if method == 'get':
+                    response = await client.get(path, headers=headers)
+                else:
+                    response = await client.post(path, data, content_type='application/json', headers=headers)
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(total)))
+        return self.stats(results, time.perf_counter() - started)
+
+    def stats(self, results, elapsed):
+        latencies = sorted(seconds * 1000 for seconds, _ in results)
+        return {
+            'status': sorted({status for _, status in results}),
+            'rps': len(results) / elapsed,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'mean_ms': statistics.fmean(latencies),
+        }
+
+    def report(self, label, stats):
+        status = ','.join(map(str, stats['status']))
+        self.stdout.write(
+            f"{label:<32} {status:>7} {stats['rps']:>8.1f} req/s  p50 {stats['p50_ms']:>8.2f}ms  p95 {stats['p95_ms']:>8.2f}ms"
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.authentication import StatelessJWTAuthentication
+from api.bench import format_row, measure
+from api.models import User
+from api.tokens import ClaimsRefreshToken
+from api.views import CartView, OrderViewSet
+
+
+class Command(BaseCommand):
+    help = 'Requests/sec on authenticated endpoints with the per-request User lookup vs. stateless JWT claims.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500)
+
+    def handle(self, *args, **options):
+        views = [(CartView, '/api/cart/'), (OrderViewSet, '/api/orders/')]
+        original = {view: view.authentication_classes for view, _ in views}
+
+        # Everything happens in a transaction that is rolled back at the end
+        with transaction.atomic():
+            user = User.objects.create_user('bench-auth-user', 'bench-auth@example.com', 'bench-password')
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+            try:
+                for auth_class in (JWTAuthentication, StatelessJWTAuthentication):
+                    for view, path in views:
+                        view.authentication_classes = [auth_class]
+                        stats = measure(client, 'get', path, iterations=options['iterations'])
+                        self.stdout.write(format_row(f'{auth_class.__name__} {path}', stats))
+            finally:
+                for view, classes in original.items():
+                    view.authentication_classes = classes
+                transaction.set_rollback(True)
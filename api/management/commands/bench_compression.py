@@ -0,0 +1,95 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api import compression
+from api.management.commands.seed_data import PREFIX
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Bytes saved and CPU per request of CompressionMiddleware on the hot JSON endpoints: compressing every '
+        'response vs serving repeats from the precompressed store (needs `manage.py seed_data`).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--encoding', default='gzip', help='Accept-Encoding sent by the client')
+
+    def handle(self, *args, **options):
+        customer = User.objects.filter(username=f'{PREFIX}user-0').first()
+        admin = User.objects.filter(username=f'{PREFIX}admin').first()
+        if customer is None or admin is None:
+            raise CommandError('No seeded data found; run `manage.py seed_data` first')
+        encoding = options['encoding']
+        if compression.negotiate(encoding) is None:
+            raise CommandError(f'None of {encoding!r} is available (have {", ".join(compression.available_encodings())})')
+
+        clients = {}
+        for name, user in (('customer', customer), ('admin', admin)):
+            clients[name] = APIClient()
+            clients[name].force_authenticate(user)
+        endpoints = [
+            ('customer', '/api/products/'),
+            ('customer', '/api/products/?page_size=100'),
+            ('customer', '/api/cart/'),
+            ('customer', '/api/orders/'),
+            ('customer', '/api/notifications/'),
+            ('admin', '/api/admin/products/'),
+        ]
+
+        self.stdout.write(
+            f"{'endpoint':<32} {'view cpu':>10} {'raw':>9} {'sent':>8} {'saved':>6} {'compress':>10} {'from store':>11}"
+        )
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=encoding)
+        middleware = compression.CompressionMiddleware(lambda request: None)
+        totals = {'view': 0.0, 'raw': 0, 'sent': 0, 'cold': 0.0, 'warm': 0.0}
+        for who, path in endpoints:
+            # The view's own CPU time, uncompressed, for scale
+            view_cpu = []
+            with override_settings(RESPONSE_COMPRESSION={'ENABLED': False}):
+                for _ in range(min(options['iterations'], 50)):
+                    started = time.process_time()
+                    response = clients[who].get(path)
+                    view_cpu.append(time.process_time() - started)
+            if response.status_code != 200:
+                raise CommandError(f'{path} returned {response.status_code}')
+            body = response.content
+
+            timings = {}
+            for mode, overrides in (('cold', {'CACHE_BYTES': 0}), ('warm', {})):
+                compression.store.clear()
+                samples = []
+                with override_settings(RESPONSE_COMPRESSION=overrides):
+                    middleware.process_response(request, HttpResponse(body, content_type='application/json'))
+                    for _ in range(options['iterations']):
+                        fresh = HttpResponse(body, content_type='application/json')
+                        started = time.process_time()
+                        compressed = middleware.process_response(request, fresh)
+                        samples.append(time.process_time() - started)
+                timings[mode] = statistics.fmean(samples) * 1000
+
+            sent = len(compressed.content)
+            view = statistics.fmean(view_cpu) * 1000
+            for key, value in (('view', view), ('raw', len(body)), ('sent', sent),
+                               ('cold', timings['cold']), ('warm', timings['warm'])):
+                totals[key] += value
+            self.stdout.write(self.row(path, view, len(body), sent, timings['cold'], timings['warm']))
+
+        self.stdout.write(self.row('total', totals['view'], totals['raw'], totals['sent'], totals['cold'], totals['warm']))
+        self.stdout.write(
+            f"compression adds {totals['cold'] / totals['view'] * 100:.1f}% CPU when every response is compressed, "
+            f"{totals['warm'] / totals['view'] * 100:.1f}% when repeats come from the store"
+        )
+
+    def row(self, label, view, raw, sent, cold, warm):
+        return (
+            f"{label:<32} {view:>8.2f}ms {raw:>9,} {sent:>8,} {(1 - sent / raw) * 100:>5.1f}% "
+            f"{cold * 1000:>8.0f}us {warm * 1000:>9.0f}us"
+        )
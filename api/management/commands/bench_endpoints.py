@@ -0,0 +1,309 @@
+import hashlib
+import hmac
+import json
+import platform
+import statistics
+import subprocess
+import time
+from contextlib import nullcontext
+
+from allauth.account.forms import default_token_generator as allauth_token_generator
+from allauth.account.utils import user_pk_to_url_str
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.urls import URLPattern, URLResolver
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework.test import APIClient
+
+from api import urls as api_urls
+from api.bench import QueryCounter, percentile
+from api.management.commands.seed_data import PREFIX
+from api.models import Product, User
+from api.tokens import ClaimsRefreshToken
+
+# Routes the runner leaves out on purpose (everything else in api/urls.py needs a scenario)
+SKIPPED = {
+    'google_login': 'needs a live Google OAuth code exchange',
+    'create-payment': 'calls the Razorpay API',
+    'retry-payment': 'calls the Razorpay API',
+    'async-create-payment': 'calls the Razorpay API, see bench_async',
+    'async-retry-payment': 'calls the Razorpay API, see bench_async',
+    'event-stream': 'long-lived stream, see sse_loadtest',
+}
+
+
+class Scenario:
+    def __init__(self, route, method, path, auth=None, data=None, label='', write=False):
+        self.route, self.method, self.path, self.auth = route, method, path, auth
+        self.data, self.label, self.write = data, label, write
+
+    @property
+    def key(self):
+        return f"{self.method} {self.route}{' ' + self.label if self.label else ''}"
+
+
+def route_names(patterns=api_urls.urlpatterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name, pattern.callback
+
+
+def scenarios(fx):
+    """One or more requests per route; `fx` holds the seeded rows they point at."""
+    customer, order, product = fx['customer'], fx['order'], fx['product']
+    uid = urlsafe_base64_encode(force_bytes(customer.pk))
+    # dj-rest-auth's confirm view uses allauth's base36 uid and token generator when allauth is installed
+    allauth_uid = user_pk_to_url_str(customer)
+    allauth_token = allauth_token_generator.make_token(customer)
+    reset_token = default_token_generator.make_token(customer)
+    new_password = {'new_password1': 'bench-New-pass-123', 'new_password2': 'bench-New-pass-123'}
+    items = [
+        # Reads
+        Scenario('api-root', 'get', '/api/'),
+        Scenario('products-list', 'get', '/api/products/'),
+        Scenario('products-list', 'get', '/api/products/?category=Electronics&page=2', label='category page 2'),
+        Scenario('products-list', 'get', '/api/products/?search=product%201&ordering=price', label='search'),
+        Scenario('products-detail', 'get', f'/api/products/{product.pk}/'),
+        Scenario('products-bought-together', 'get', f'/api/products/{product.pk}/recommendations/'),
+        Scenario('products-top', 'get', '/api/products/top/'),
+        Scenario('products-top', 'get', '/api/products/top/?by=best_sellers&category=Electronics', label='category best sellers'),
+        Scenario('async-products-list', 'get', '/api/async/products/?category=Electronics&page=2'),
+        Scenario('async-products-detail', 'get', f'/api/async/products/{product.pk}/'),
+        Scenario('user_details', 'get', '/api/user/', 'customer'),
+        Scenario('cart', 'get', '/api/cart/', 'customer'),
+        Scenario('wishlist', 'get', '/api/wishlist/', 'customer'),
+        Scenario('addresses-list', 'get', '/api/addresses/', 'customer'),
+        Scenario('addresses-detail', 'get', f"/api/addresses/{fx['address'].pk}/", 'customer'),
+        Scenario('user-orders-list', 'get', '/api/orders/', 'customer'),
+        Scenario('user-orders-list', 'get', '/api/orders/?archived=1', 'customer', label='archived'),
+        Scenario('user-orders-detail', 'get', f'/api/orders/{order.pk}/', 'customer'),
+        Scenario('my-notifications', 'get', '/api/notifications/', 'customer'),
+        Scenario('unread-notification-count', 'get', '/api/notifications/unread-count/', 'customer'),
+        Scenario('admin-stats', 'get', '/api/admin/stats/', 'admin'),
+        Scenario('admin-products-list', 'get', '/api/admin/products/', 'admin'),
+        Scenario('admin-products-detail', 'get', f'/api/admin/products/{product.pk}/', 'admin'),
+        Scenario('admin-users-list', 'get', '/api/admin/users/', 'admin'),
+        Scenario('admin-users-detail', 'get', f'/api/admin/users/{customer.pk}/', 'admin'),
+        Scenario('admin-orders-list', 'get', '/api/admin/orders/', 'admin'),
+        Scenario('admin-orders-list', 'get', f'/api/admin/orders/?user={customer.pk}', 'admin', label='by user'),
+        Scenario('admin-orders-detail', 'get', f'/api/admin/orders/{order.pk}/', 'admin'),
+        Scenario('user-list', 'get', '/api/users/', 'admin'),
+        Scenario('metrics', 'get', '/api/metrics/', 'admin'),
+
+        # Writes (each request runs in its own rolled-back transaction)
+        Scenario('register', 'post', '/api/register/', data={
+            'username': 'bench-register', 'email': 'bench-register@example.com', 'password': 'bench-password',
+        }),
+        Scenario('login', 'post', '/api/login/', data={'username': customer.username, 'password': fx['password']}),
+        # Refresh tokens are single-use (api.tokens.mark_rotated), so mint one per request
+        Scenario('token_refresh', 'post', '/api/token/refresh/',
+                 data=lambda: {'refresh': str(ClaimsRefreshToken.for_user(customer))}),
+        Scenario('password_change', 'post', '/api/password/change/', 'customer',
+                 data={'old_password': fx['password'], **new_password}),
+        Scenario('password_reset', 'post', '/api/password/reset/', data={'email': customer.email}),
+        Scenario('password_reset_confirm', 'post', f'/api/password/reset/confirm/{allauth_uid}/{allauth_token}/',
+                 data={'uid': allauth_uid, 'token': allauth_token, **new_password}),
+        Scenario('password_reset_confirm_api', 'post', '/api/password/reset/confirm/',
+                 data={'uid': uid, 'token': reset_token, **new_password}),
+        Scenario('cart', 'post', '/api/cart/', 'customer', data={'product_id': fx['other_product'].pk, 'quantity': 1}),
+        Scenario('wishlist', 'post', '/api/wishlist/', 'customer', data={'product_id': fx['other_product'].pk}),
+        Scenario('addresses-list', 'post', '/api/addresses/', 'customer', data={
+            'name': 'Bench', 'phone': '9000000000', 'street': '1 Bench Road', 'city': 'Kochi',
+            'state': 'Kerala', 'zip_code': '682001',
+        }),
+        Scenario('order-checkout', 'post', '/api/orders/checkout/', 'customer', data={
+            'shipping_details': {'name': 'Bench', 'city': 'Kochi'}, 'total_amount': '100.00', 'payment_method': 'cod',
+        }),
+        Scenario('admin-products-list', 'post', '/api/admin/products/', 'admin', data={
+            'name': 'Bench product', 'description': 'bench', 'price': '10.00', 'count': 5, 'category': 'Electronics',
+        }),
+        Scenario('admin-products-detail', 'patch', f'/api/admin/products/{product.pk}/', 'admin', data={'count': 50}),
+        Scenario('admin-users-detail', 'patch', f'/api/admin/users/{customer.pk}/', 'admin', data={'is_blocked': False}),
+        Scenario('admin-orders-detail', 'patch', f'/api/admin/orders/{order.pk}/', 'admin', data={'status': 'shipped'}),
+        Scenario('send-notification', 'post', '/api/notifications/send/', 'admin',
+                 data={'user_id': customer.pk, 'title': 'Bench', 'message': 'Benchmark notification'}),
+        Scenario('read-notifications', 'post', '/api/notifications/read/', 'customer', data={'all': True}),
+    ]
+    if fx['cart_item']:
+        items.append(Scenario('cart-delete', 'delete', f"/api/cart/{fx['cart_item'].pk}/", 'customer'))
+    if fx['wishlist_item']:
+        items.append(Scenario('wishlist-delete', 'delete', f"/api/wishlist/{fx['wishlist_item'].pk}/", 'customer'))
+    if fx['cancellable']:
+        items.append(Scenario('cancel-order', 'post', f"/api/orders/{fx['cancellable'].pk}/cancel/", 'customer',
+                              data={'reason': 'Benchmark'}))
+    if fx['notification']:
+        items.append(Scenario('read-notification', 'post', f"/api/notifications/{fx['notification'].pk}/read/", 'customer'))
+    paid = fx['razorpay_order']
+    if paid and settings.RAZORPAY_KEY_SECRET:
+        payment_id = 'pay_bench'
+        signature = hmac.new(
+            settings.RAZORPAY_KEY_SECRET.encode(), f'{paid.razorpay_order_id}|{payment_id}'.encode(), hashlib.sha256,
+        ).hexdigest()
+        items.append(Scenario('verify-payment', 'post', '/api/payment/verify/', 'customer', data={
+            'razorpay_order_id': paid.razorpay_order_id, 'razorpay_payment_id': payment_id,
+            'razorpay_signature': signature, 'order_id': paid.pk,
+        }))
+    for item in items:
+        item.write = item.method != 'get'
+    return items
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every route in api/urls.py through the test client against the configured database '
+        '(seed it first with seed_data). Reports p50/p95/p99, queries per request and throughput; '
+        '--output writes JSON that --compare can diff against.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--only', help='Run only scenarios whose key contains this text')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--compare', help='JSON file from an earlier --output run to diff against')
+        parser.add_argument('--password', default='seed-password', help='Password seed_data was run with')
+
+    def handle(self, *args, **options):
+        fx = self.fixtures(options['password'])
+        items = scenarios(fx)
+        if options['only']:
+            items = [s for s in items if options['only'] in s.key]
+
+        covered = {s.route for s in scenarios(fx)}
+        views = {}
+        for name, callback in route_names():
+            if name not in covered and name not in SKIPPED:
+                self.stderr.write(f"No benchmark scenario for route {name!r}")
+            view = getattr(callback, 'cls', None)
+            if view is not None:
+                views[view] = view.throttle_classes
+
+        clients = {None: APIClient()}
+        for role in ('customer', 'admin'):
+            clients[role] = APIClient()
+            token = ClaimsRefreshToken.for_user(fx[role]).access_token
+            clients[role].credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        results = {}
+        try:
+            # Throttling would turn most of the login/register/reset runs into 429s
+            for view in views:
+                view.throttle_classes = []
+            for scenario in items:
+                stats = self.run(clients[scenario.auth], scenario, options['iterations'], options['warmup'])
+                results[scenario.key] = stats
+                self.stdout.write(self.format(scenario.key, stats))
+        finally:
+            for view, classes in views.items():
+                view.throttle_classes = classes
+
+        for route, reason in sorted(SKIPPED.items()):
+            self.stdout.write(f"{'skipped ' + route:<52} {reason}")
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'meta': self.meta(options), 'results': results}, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+    def fixtures(self, password):
+        customer = User.objects.filter(username=f'{PREFIX}user-0').first()
+        admin = User.objects.filter(username=f'{PREFIX}admin').first()
+        if customer is None or admin is None:
+            raise CommandError('No seeded data found; run `manage.py seed_data` first')
+        in_cart = customer.cart_items.values('product_id')
+        return {
+            'customer': customer,
+            'admin': admin,
+            'password': password,
+            'product': Product.objects.filter(name__startswith=PREFIX, is_active=True).first(),
+            'other_product': Product.objects.filter(name__startswith=PREFIX, is_active=True)
+                .exclude(pk__in=in_cart).exclude(pk__in=customer.wishlist_items.values('product_id')).first(),
+            'address': customer.addresses.first(),
+            'order': customer.orders.first(),
+            'cancellable': customer.orders.exclude(status__in=['delivered', 'cancelled']).first(),
+            'razorpay_order': customer.orders.filter(razorpay_order_id__isnull=False).first(),
+            'cart_item': customer.cart_items.first(),
+            'wishlist_item': customer.wishlist_items.first(),
+            'notification': customer.notifications.first(),
+        }
+
+    def run(self, client, scenario, iterations, warmup):
+        send = getattr(client, scenario.method)
+        counter = QueryCounter()
+        latencies = []
+        status_codes = set()
+        for i in range(warmup + iterations):
+            data = scenario.data() if callable(scenario.data) else scenario.data
+            with transaction.atomic():
+                measured = i >= warmup
+                with connection.execute_wrapper(counter) if measured else nullcontext():
+                    started = time.perf_counter()
+                    if scenario.method == 'get':
+                        response = send(scenario.path)
+                    else:
+                        response = send(scenario.path, data, format='json')
+                    elapsed = time.perf_counter() - started
+                if scenario.write:
+                    transaction.set_rollback(True)
+            if measured:
+                latencies.append(elapsed * 1000)
+                status_codes.add(response.status_code)
+
+        total = sum(latencies) / 1000
+        latencies.sort()
+        return {
+            'status': sorted(status_codes),
+            'requests': iterations,
+            'rps': iterations / total if total else 0.0,
+            'mean_ms': statistics.fmean(latencies),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'queries_per_request': counter.count / iterations,
+        }
+
+    def format(self, key, stats):
+        status = ','.join(map(str, stats['status']))
+        return (
+            f"{key:<52} {status:>7} {stats['rps']:>8.1f} req/s  p50 {stats['p50_ms']:>7.2f}ms  "
+            f"p95 {stats['p95_ms']:>7.2f}ms  p99 {stats['p99_ms']:>7.2f}ms  {stats['queries_per_request']:>5.1f} q/req"
+        )
+
+    def compare(self, path, results):
+        with open(path) as f:
+            baseline = json.load(f)
+        self.stdout.write(f"\nCompared with {path} ({baseline['meta'].get('commit', '?')}):")
+        for key, stats in results.items():
+            before = baseline['results'].get(key)
+            if before is None:
+                self.stdout.write(f"{key:<52} new")
+                continue
+            change = (stats['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+            queries = stats['queries_per_request'] - before['queries_per_request']
+            self.stdout.write(
+                f"{key:<52} p50 {before['p50_ms']:>7.2f} -> {stats['p50_ms']:>7.2f}ms ({change:+6.1f}%)  "
+                f"queries {queries:+.1f}"
+            )
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except OSError:
+            commit = ''
+        return {
+            'commit': commit,
+            'at': timezone.now().isoformat(),
+            'database': connections['default'].vendor,
+            'python': platform.python_version(),
+            'iterations': options['iterations'],
+        }
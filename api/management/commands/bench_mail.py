@@ -0,0 +1,118 @@
+import socketserver
+import threading
+import time
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+
+from api.mail import MailDispatcher
+
+
+class SMTPStandInHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to satisfy Django's smtp backend (no TLS, no auth)."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.record('connections')
+        self.reply('220 localhost stand-in')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250 localhost')
+            elif command == b'DATA':
+                self.reply('354 end with <CRLF>.<CRLF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                self.server.record('messages')
+                self.reply('250 queued')
+            elif command == b'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPStandInHandler)
+        self.counts = {'connections': 0, 'messages': 0}
+        self.lock = threading.Lock()
+
+    def record(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+
+class Command(BaseCommand):
+    help = 'Compare thread-per-email sending with the pooled MailDispatcher against a local SMTP stand-in.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        server = SMTPStandIn()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        connection_kwargs = {
+            'backend': 'django.core.mail.backends.smtp.EmailBackend',
+            'host': '127.0.0.1', 'port': server.server_address[1],
+            'username': '', 'password': '', 'use_tls': False, 'use_ssl': False,
+        }
+        emails = [
+            EmailMessage('Security Alert: New Login Detected', 'Hi,\n\nYou logged in.', 'EchoBay <echobay@gmail.com>', [f'user{i}@example.com'])
+            for i in range(options['emails'])
+        ]
+
+        try:
+            self.report('thread per email', server, lambda: self.thread_per_email(emails, connection_kwargs))
+            dispatcher = MailDispatcher(
+                workers=options['workers'], batch_size=options['batch_size'],
+                queue_size=len(emails), **connection_kwargs
+            )
+            self.report('dispatcher', server, lambda: self.pooled(dispatcher, emails))
+        finally:
+            server.shutdown()
+
+    def thread_per_email(self, emails, connection_kwargs):
+        # Mirrors the old signal handlers: a new thread and a new SMTP session each time
+        threads = [
+            threading.Thread(target=lambda m=message: get_connection(**connection_kwargs).send_messages([m]))
+            for message in emails
+        ]
+        for thread in threads:
+            thread.start()
+        peak = threading.active_count()
+        for thread in threads:
+            thread.join()
+        return peak
+
+    def pooled(self, dispatcher, emails):
+        for message in emails:
+            dispatcher.submit(message)
+        peak = threading.active_count()
+        dispatcher.flush()
+        dispatcher.shutdown()
+        return peak
+
+    def report(self, label, server, run):
+        server.counts.update(connections=0, messages=0)
+        started = time.perf_counter()
+        peak_threads = run()
+        elapsed = time.perf_counter() - started
+        # Let the stand-in finish counting the last session
+        time.sleep(0.2)
+        self.stdout.write(
+            f"{label:>18}: {server.counts['messages']} emails in {elapsed:.3f}s "
+            f"({server.counts['messages'] / elapsed:.0f}/s), "
+            f"{server.counts['connections']} SMTP connections, peak threads {peak_threads}"
+        )
@@ -0,0 +1,76 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api.models import Product, User
+
+MIDDLEWARE = 'api.metrics.MetricsMiddleware'
+
+
+class Command(BaseCommand):
+    help = 'Measure the request overhead of MetricsMiddleware (fails if the endpoint mix slows by more than --max-overhead percent).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='Request pairs per endpoint')
+        parser.add_argument('--max-overhead', type=float, default=2.0)
+
+    def client_for(self, user, middleware):
+        client = APIClient()
+        client.force_authenticate(user)
+        # The test client builds its middleware chain on the first request, so load it under the override
+        with override_settings(MIDDLEWARE=middleware):
+            client.get('/api/')
+        return client
+
+    def handle(self, *args, **options):
+        with_metrics = list(settings.MIDDLEWARE)
+        if MIDDLEWARE not in with_metrics:
+            with_metrics.insert(0, MIDDLEWARE)
+        without_metrics = [m for m in with_metrics if m != MIDDLEWARE]
+
+        with transaction.atomic():
+            user = User.objects.create_user('bench-metrics-user', 'bench-metrics@example.com', 'bench-password')
+            Product.objects.bulk_create(
+                Product(name=f'Bench {i}', description='bench', price=10 + i, count=5, category='bench')
+                for i in range(20)
+            )
+            clients = {
+                'without': self.client_for(user, without_metrics),
+                'with': self.client_for(user, with_metrics),
+            }
+            paths = ['/api/products/', '/api/cart/', '/api/notifications/unread-count/']
+            totals = {'with': 0.0, 'without': 0.0}
+            for path in paths:
+                samples = {'with': [], 'without': []}
+                for label, client in clients.items():
+                    for _ in range(20):
+                        client.get(path)
+                # Interleave request by request so machine noise hits both sides equally
+                for i in range(options['iterations']):
+                    order = ('with', 'without') if i % 2 else ('without', 'with')
+                    for label in order:
+                        started = time.perf_counter()
+                        clients[label].get(path)
+                        samples[label].append(time.perf_counter() - started)
+                base = statistics.median(samples['without']) * 1000
+                instrumented = statistics.median(samples['with']) * 1000
+                overhead = (instrumented - base) / base * 100
+                totals['without'] += base
+                totals['with'] += instrumented
+                self.stdout.write(
+                    f"{path:<36} without {base:7.3f}ms  with {instrumented:7.3f}ms  "
+                    f"overhead {(instrumented - base) * 1000:+6.1f}us ({overhead:+5.2f}%)"
+                )
+            transaction.set_rollback(True)
+
+        # The fixed per-request cost is a few microseconds, which is several percent of a near-empty
+        # in-process request; the budget applies to the mix, not to the cheapest endpoint alone.
+        overall = (totals['with'] - totals['without']) / totals['without'] * 100
+        self.stdout.write(f"overall overhead {overall:+.2f}%")
+        if overall > options['max_overhead']:
+            raise CommandError(f"Metrics overhead {overall:.2f}% exceeds {options['max_overhead']}%")
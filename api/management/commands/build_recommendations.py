@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import recommendations
+from api.models import ProductAffinity
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the "frequently bought together" table (ProductAffinity) from the order lines of live (not archived) orders. '
+        'Checkout keeps it current afterwards through recommendations.refresh jobs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, help='Neighbours kept per product (default RECOMMENDATIONS["TOP_K"])')
+        parser.add_argument('--engine', choices=['numpy', 'python'], help='Default: numpy when installed')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['engine'] == 'numpy' and not recommendations.has_numpy():
+            raise CommandError('NumPy is not installed; use --engine python')
+        engine = options['engine'] or ('numpy' if recommendations.has_numpy() else 'python')
+        started = time.perf_counter()
+        rows = recommendations.build_all(options['top_k'], engine, options['batch_size'])
+        products = ProductAffinity.objects.values('product').distinct().count()
+        self.stdout.write(self.style.SUCCESS(
+            f"{rows} neighbour row(s) for {products} product(s) in {time.perf_counter() - started:.2f}s ({engine})"
+        ))
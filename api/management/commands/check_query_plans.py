@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from api.models import CartItem, Notification, Order, Product, User, Wishlist
+
+CATEGORY_INDEXES = ('product_cat_trending_idx', 'product_cat_units_sold_idx', 'product_cat_wishlist_idx')
+
+
+def hot_queries():
+    """(label, queryset, index expected in the plan) for the main query of each hot endpoint."""
+    # SQLite builds unique constraints into the table, so their index is named sqlite_autoindex_<table>_N
+    user = User(id=1, date_joined=timezone.now())
+    return [
+        ('OrderViewSet.list', Order.objects.filter(user=user).order_by('-created_at'), 'order_user_created_idx'),
+        ('AdminOrderViewSet.list ?user=', Order.objects.filter(user_id=1).order_by('-created_at'), 'order_user_created_idx'),
+        ('Order by razorpay_order_id', Order.objects.filter(razorpay_order_id='order_x'), 'order_razorpay_order_idx'),
+        ('NotificationListView', Notification.objects.for_user(user).order_by('-created_at'), 'notification_recipient_idx'),
+        # Any of the leaderboard indexes that lead with lower(category) will do
+        ('ProductViewSet ?category=', Product.objects.in_category('audio').order_by('-id'), CATEGORY_INDEXES),
+        ('ProductViewSet.top ?category=',
+         Product.objects.in_category('audio').filter(is_active=True).order_by('-trending_score', '-id'),
+         'product_cat_trending_idx'),
+        ('UserSerializer.validate_email',
+         User.objects.alias(email_lower=Lower('email')).filter(email_lower='a@example.com'), 'user_email_lower_idx'),
+        ('CartView.post', CartItem.objects.filter(user=user, product_id=1),
+         ('unique_cart_item', 'sqlite_autoindex_api_cartitem')),
+        ('WishlistView.post', Wishlist.objects.filter(user=user, product_id=1),
+         ('unique_wishlist_item', 'sqlite_autoindex_api_wishlist')),
+    ]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN each hot endpoint's main query and fail if its index isn't used (run after migrate, e.g. in CI)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plans')
+
+    def handle(self, *args, **options):
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Tiny CI tables make a seq scan cheapest; we only care that the index is usable
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for label, queryset, indexes in hot_queries():
+                indexes = (indexes,) if isinstance(indexes, str) else indexes
+                plan = queryset.explain()
+                ok = any(index in plan for index in indexes)
+                self.stdout.write(f"{'ok  ' if ok else 'FAIL'} {label:<32} {indexes[0]}")
+                if options['verbose_plans'] or not ok:
+                    self.stdout.write('     ' + plan.replace('\n', '\n     '))
+                if not ok:
+                    failures.append(label)
+
+        if failures:
+            raise CommandError(f"{len(failures)} query plan(s) don't use their index: {', '.join(failures)}")
@@ -0,0 +1,26 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import inventory
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold stock movements older than INVENTORY["COMPACT_AFTER_DAYS"] into one new StockSnapshot per product '
+        "and delete them. Movements of orders that can still be cancelled are kept. Run it periodically (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Override COMPACT_AFTER_DAYS')
+        parser.add_argument('--batch-size', type=int, default=500, help='Products per transaction')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else inventory.config()['COMPACT_AFTER_DAYS']
+        started = time.perf_counter()
+        snapshots, folded = inventory.compact(timezone.now() - timedelta(days=days), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Folded {folded} movement(s) into {snapshots} snapshot(s) in {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,100 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Imported on first use (api.payments, api.social); loading any of them at startup is a regression.
+# (allauth's Google views aren't listed: allauth.urls imports them for the accounts/ routes.)
+LAZY_MODULES = (
+    'razorpay',
+    'httpx',
+    'dj_rest_auth.registration.views',
+)
+
+# Runs in a fresh interpreter: what a gunicorn worker does before it can answer its first request
+STARTUP_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+ready = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+loaded = time.perf_counter()
+print(json.dumps({
+    'app_ready_ms': (ready - started) * 1000,
+    'urlconf_ms': (loaded - ready) * 1000,
+    'modules': sorted(sys.modules),
+}))
+'''
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from `python -X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Cold-start profile: WSGI app-ready time and URLconf load time in a fresh interpreter, plus per-module '
+        'import times (-X importtime). With --budget-ms it fails when startup is over budget, or when a module '
+        'meant to be imported lazily gets loaded at startup (for CI).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Timing runs; the fastest is reported')
+        parser.add_argument('--top', type=int, default=20, help='Slowest modules to list')
+        parser.add_argument('--budget-ms', type=float, help='Fail if app-ready + URLconf time exceeds this')
+
+    def run(self, *flags):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        result = subprocess.run(
+            [sys.executable, *flags, '-c', STARTUP_SCRIPT],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        if result.returncode:
+            raise CommandError(f'Startup failed:\n{result.stderr[-2000:]}')
+        return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+    def handle(self, *args, **options):
+        runs = [self.run()[0] for _ in range(max(options['repeat'], 1))]
+        best = min(runs, key=lambda run: run['app_ready_ms'] + run['urlconf_ms'])
+        _, stderr = self.run('-X', 'importtime')
+        rows = parse_importtime(stderr)
+
+        self.stdout.write(f"{'module':<60} {'self ms':>9} {'cumul. ms':>10}")
+        for name, self_us, cumulative_us, _ in sorted(rows, key=lambda row: -row[1])[:options['top']]:
+            self.stdout.write(f"{name:<60} {self_us / 1000:>9.1f} {cumulative_us / 1000:>10.1f}")
+
+        by_package = defaultdict(int)
+        for name, self_us, _, _ in rows:
+            by_package[name.split('.')[0]] += self_us
+        self.stdout.write(f"\n{'package':<60} {'self ms':>9}")
+        for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"{package:<60} {self_us / 1000:>9.1f}")
+
+        total = best['app_ready_ms'] + best['urlconf_ms']
+        self.stdout.write(
+            f"\n{len(rows)} modules imported, {sum(row[1] for row in rows) / 1000:.1f}ms in imports (with importtime overhead)"
+            f"\napp ready {best['app_ready_ms']:.1f}ms + URLconf {best['urlconf_ms']:.1f}ms = {total:.1f}ms"
+            f" (best of {len(runs)})"
+        )
+
+        problems = [f'{name} is imported at startup' for name in LAZY_MODULES if name in best['modules']]
+        if options['budget_ms'] is not None and total > options['budget_ms']:
+            problems.append(f"startup took {total:.1f}ms, budget is {options['budget_ms']:.0f}ms")
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems and options['budget_ms'] is not None:
+            raise CommandError('Startup regression: ' + '; '.join(problems))
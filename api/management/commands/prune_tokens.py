@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.tokens import prune_rotated_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete rotated refresh token records that have expired (run periodically, e.g. daily from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        removed = prune_rotated_tokens(options['batch_size'])
+        self.stdout.write(f"Removed {removed} expired rotated token record(s)")
@@ -0,0 +1,101 @@
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+
+from api import jobs
+from api.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database queue (see api/jobs.py).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Worker threads in this process')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--only', action='append', dest='names', help='Only run jobs with this name (repeatable)')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--stats', action='store_true', help='Print per-job timing metrics and exit')
+        parser.add_argument('--since-hours', type=int, default=24, help='Window for --stats')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            return self.print_stats(options['since_hours'])
+
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            # Finish the job in hand, then exit
+            signal.signal(sig, lambda *_: stop.set())
+
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        workers = [
+            threading.Thread(target=self.work, args=(f'{prefix}:{i}', stop, options), daemon=True)
+            for i in range(options['concurrency'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} job worker(s) [{prefix}]")
+
+        next_stale_check = 0
+        while any(worker.is_alive() for worker in workers):
+            if time.monotonic() >= next_stale_check:
+                requeued = jobs.requeue_stale()
+                if requeued:
+                    self.stdout.write(f"Requeued {requeued} stale job(s)")
+                next_stale_check = time.monotonic() + 60
+            for worker in workers:
+                worker.join(1)
+        connection.close()
+
+    def work(self, worker_id, stop, options):
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                try:
+                    job = jobs.claim(worker_id, options['names'])
+                except OperationalError:
+                    # e.g. "database is locked" on SQLite under contention
+                    job = None
+                if job is None:
+                    if options['once']:
+                        return
+                    stop.wait(options['poll_interval'])
+                    continue
+
+                started = time.perf_counter()
+                ok = jobs.run(job)
+                self.stdout.write(
+                    f"[{worker_id}] {job.name} #{job.pk} {'done' if ok else 'failed'} "
+                    f"in {(time.perf_counter() - started) * 1000:.0f}ms (attempt {job.attempts})"
+                )
+        finally:
+            connection.close()
+
+    def print_stats(self, since_hours):
+        rows = (
+            Job.objects.filter(created_at__gte=timezone.now() - timedelta(hours=since_hours))
+            .values('name')
+            .annotate(
+                total=Count('id'),
+                queued=Count('id', filter=Q(status='queued')),
+                running=Count('id', filter=Q(status='running')),
+                done=Count('id', filter=Q(status='done')),
+                failed=Count('id', filter=Q(status='failed')),
+                avg_ms=Avg('duration_ms', filter=Q(status='done')),
+                max_ms=Max('duration_ms', filter=Q(status='done')),
+            )
+            .order_by('name')
+        )
+        self.stdout.write(f"{'job':<30}{'total':>7}{'queued':>8}{'running':>9}{'done':>7}{'failed':>8}{'avg ms':>9}{'max ms':>9}")
+        for row in rows:
+            self.stdout.write(
+                f"{row['name']:<30}{row['total']:>7}{row['queued']:>8}{row['running']:>9}{row['done']:>7}"
+                f"{row['failed']:>8}{row['avg_ms'] or 0:>9.1f}{row['max_ms'] or 0:>9}"
+            )
@@ -0,0 +1,227 @@
+import random
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from api import inventory, notifications, popularity
+from api.models import (
+    Address, CancelledOrder, CartItem, Notification, Order, OrderItem, Product, ProductImage, User, Wishlist,
+)
+
+PREFIX = 'seed-'
+CATEGORIES = ['Electronics', 'Fashion', 'Home', 'Books', 'Sports', 'Beauty', 'Toys', 'Grocery']
+STATUSES = ['pending_payment', 'processing', 'shipped', 'delivered', 'cancelled']
+
+
+class Command(BaseCommand):
+    help = (
+        'Insert synthetic users, products, carts, wishlists, orders and notifications for benchmarking '
+        '(bulk inserts; seeded rows are prefixed "seed-" and removed with --clear).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--images-per-product', type=int, default=3)
+        parser.add_argument('--cart-items', type=int, default=3, help='Per user')
+        parser.add_argument('--wishlist-items', type=int, default=5, help='Per user')
+        parser.add_argument('--orders-per-user', type=int, default=5)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--notifications-per-user', type=int, default=10)
+        parser.add_argument('--broadcasts', type=int, default=20)
+        parser.add_argument('--days', type=int, default=180, help='Spread created_at over this many days')
+        parser.add_argument('--password', default='seed-password', help='Shared password of every seeded user')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded rows first (or only, with --users 0)')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.days = max(options['days'], 1)
+
+        with transaction.atomic():
+            if options['clear']:
+                self.clear()
+            if options['users'] <= 0:
+                return
+            if User.objects.filter(username__startswith=PREFIX).exists():
+                self.stderr.write('Seeded data already exists; pass --clear to replace it')
+                return
+
+            users, admin = self.seed_users(options['users'], options['password'])
+            products = self.seed_products(options['products'], options['images_per_product'])
+            self.seed_addresses(users)
+            self.seed_pairs(CartItem, users, products, options['cart_items'], quantity=True)
+            self.seed_pairs(Wishlist, users, products, options['wishlist_items'])
+            self.seed_orders(users, products, admin, options['orders_per_user'], options['items_per_order'])
+            self.seed_notifications(users, options['notifications_per_user'], options['broadcasts'])
+            # Nor does it go through checkout/the wishlist signals that keep the popularity counters
+            popularity.rebuild(self.batch_size)
+
+        # bulk_create skips the signals that keep the unread badges current
+        if not cache.add(notifications.BROADCAST_VERSION_KEY, 1, None):
+            cache.incr(notifications.BROADCAST_VERSION_KEY)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} users (+ {admin.username}), {len(products)} products. "
+            f"Log in as {users[0].username} / {admin.username} with password {options['password']!r}"
+        ))
+
+    def clear(self):
+        # Cascades take care of carts, wishlists, addresses, orders and personal notifications
+        deleted, _ = User.objects.filter(username__startswith=PREFIX).delete()
+        deleted += Product.objects.filter(name__startswith=PREFIX).delete()[0]
+        deleted += Notification.objects.filter(recipient__isnull=True, title__startswith=PREFIX).delete()[0]
+        self.stdout.write(f"Removed {deleted} seeded row(s)")
+
+    def backdate(self, model, field, objs):
+        """
+        created_at is auto_now_add, so bulk_create stamps everything with "now".
+        Spread the rows over --days with one UPDATE per day rather than one per row.
+        """
+        by_day = defaultdict(list)
+        for obj in objs:
+            by_day[self.rng.randrange(self.days)].append(obj.pk)
+        for day, pks in by_day.items():
+            for start in range(0, len(pks), self.batch_size):
+                model.objects.filter(pk__in=pks[start:start + self.batch_size]).update(
+                    **{field: self.now - timedelta(days=day, seconds=self.rng.randrange(86400))}
+                )
+
+    def seed_users(self, count, password):
+        # Hashing is deliberately slow; every seeded user shares one hash
+        password_hash = make_password(password)
+        joined = self.now - timedelta(days=self.days + 1)
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=f'{PREFIX}user-{i}', email=f'{PREFIX}user-{i}@example.com', password=password_hash,
+                    first_name=f'Seed{i}', last_name='User', date_joined=joined,
+                )
+                for i in range(count)
+            ],
+            batch_size=self.batch_size,
+        )
+        # bulk_create here too, so the welcome-email signal doesn't fire
+        [admin] = User.objects.bulk_create([User(
+            username=f'{PREFIX}admin', email=f'{PREFIX}admin@example.com', password=password_hash,
+            role='admin', is_staff=True, is_superuser=True, date_joined=joined,
+        )])
+        return users, admin
+
+    def seed_products(self, count, images_per_product):
+        products = Product.objects.bulk_create(
+            [
+                Product(
+                    name=f'{PREFIX}product {i}',
+                    description=f'Synthetic product {i} for benchmarking. ' * 5,
+                    price=Decimal(self.rng.randrange(100, 500000)) / 100,
+                    count=self.rng.randrange(0, 200),
+                    category=self.rng.choice(CATEGORIES),
+                    is_active=self.rng.random() > 0.05,
+                )
+                for i in range(count)
+            ],
+            batch_size=self.batch_size,
+        )
+        # bulk_create skips the post_save signal that records opening stock in the ledger
+        inventory.record_opening(products)
+        ProductImage.objects.bulk_create(
+            [
+                ProductImage(product=product, external_url=f'https://picsum.photos/seed/{product.pk}-{n}/600/600')
+                for product in products
+                for n in range(images_per_product)
+            ],
+            batch_size=self.batch_size,
+        )
+        self.backdate(Product, 'created_at', products)
+        # Order lines snapshot each product's first image
+        prefetch_related_objects(products, 'images')
+        return products
+
+    def seed_addresses(self, users):
+        Address.objects.bulk_create(
+            [
+                Address(
+                    user=user, name=f'{user.first_name} {user.last_name}', phone='9000000000',
+                    street=f'{n + 1} Benchmark Street', city='Kochi', state='Kerala', zip_code='682001',
+                    is_default=n == 0,
+                )
+                for user in users
+                for n in range(self.rng.randint(1, 2))
+            ],
+            batch_size=self.batch_size,
+        )
+
+    def seed_pairs(self, model, users, products, per_user, quantity=False):
+        rows = []
+        for user in users:
+            for product in self.rng.sample(products, min(per_user, len(products))):
+                extra = {'quantity': self.rng.randint(1, 5)} if quantity else {}
+                rows.append(model(user=user, product=product, **extra))
+        model.objects.bulk_create(rows, batch_size=self.batch_size)
+
+    def seed_orders(self, users, products, admin, per_user, items_per_order):
+        orders, lines = [], []
+        for user in users:
+            for _ in range(per_user):
+                chosen = self.rng.sample(products, min(self.rng.randint(1, items_per_order), len(products)))
+                items = [(product, self.rng.randint(1, 3)) for product in chosen]
+                status = self.rng.choices(STATUSES, weights=[10, 20, 20, 40, 10])[0]
+                method = self.rng.choice(['cod', 'razorpay'])
+                orders.append(Order(
+                    user=user,
+                    total_amount=sum(product.price * qty for product, qty in items),
+                    status=status,
+                    payment_method=method,
+                    razorpay_order_id=f'order_seed{len(orders)}' if method == 'razorpay' else None,
+                    shipping_details={'name': f'{user.first_name} {user.last_name}', 'city': 'Kochi', 'zip_code': '682001'},
+                ))
+                lines.append(items)
+        orders = Order.objects.bulk_create(orders, batch_size=self.batch_size)
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem.for_product(order, product, qty)
+                for order, items in zip(orders, lines)
+                for product, qty in items
+            ],
+            batch_size=self.batch_size,
+        )
+        CancelledOrder.objects.bulk_create(
+            [
+                CancelledOrder(order=order, cancelled_by=self.rng.choice([order.user, admin]), reason='Seeded cancellation')
+                for order in orders
+                if order.status == 'cancelled'
+            ],
+            batch_size=self.batch_size,
+        )
+        self.backdate(Order, 'created_at', orders)
+
+    def seed_notifications(self, users, per_user, broadcasts):
+        personal = Notification.objects.bulk_create(
+            [
+                Notification(
+                    recipient=user, title=f'Order update {n}', message='Your order has been updated.',
+                    is_read=self.rng.random() < 0.6,
+                )
+                for user in users
+                for n in range(per_user)
+            ],
+            batch_size=self.batch_size,
+        )
+        announcements = Notification.objects.bulk_create(
+            [
+                Notification(title=f'{PREFIX}announcement {n}', message='Synthetic broadcast for benchmarking.')
+                for n in range(broadcasts)
+            ],
+            batch_size=self.batch_size,
+        )
+        self.backdate(Notification, 'created_at', personal + announcements)
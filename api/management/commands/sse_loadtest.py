@@ -0,0 +1,84 @@
+import asyncio
+import json
+import ssl
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Hold many concurrent connections open on /api/events/ and report how many each server process is serving.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/events/')
+        parser.add_argument('--token', required=True, help='JWT access token used for every connection')
+        parser.add_argument('--connections', type=int, default=1000)
+        parser.add_argument('--hold', type=float, default=10.0, help='Seconds to keep the connections open')
+        parser.add_argument('--connect-concurrency', type=int, default=200, help='Connections opened in parallel')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme not in ('http', 'https'):
+            raise CommandError('URL must be http(s)')
+        stats = asyncio.run(self.run(url, options))
+
+        self.stdout.write(f"Opened {stats['opened']}/{options['connections']} connections "
+                          f"({stats['failed']} failed) in {stats['connect_seconds']:.2f}s")
+        self.stdout.write(f"Still open after {options['hold']}s: {stats['alive']}")
+        for pid, count in sorted(stats['per_process'].items()):
+            self.stdout.write(f"  process {pid}: {count} concurrent connections")
+
+    async def run(self, url, options):
+        path = f"{url.path or '/'}?{urlencode({'token': options['token']})}"
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        context = ssl.create_default_context() if url.scheme == 'https' else None
+        gate = asyncio.Semaphore(options['connect_concurrency'])
+        release = asyncio.Event()
+        per_process = defaultdict(int)
+        stats = {'opened': 0, 'failed': 0, 'alive': 0}
+
+        async def client():
+            writer = None
+            try:
+                async with gate:
+                    reader, writer = await asyncio.open_connection(url.hostname, port, ssl=context)
+                    writer.write(
+                        f"GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\nAccept: text/event-stream\r\n\r\n".encode()
+                    )
+                    await writer.drain()
+                    ready = await asyncio.wait_for(self.read_ready_event(reader), 30)
+                stats['opened'] += 1
+                # Servers report their own live count in the ready event; keep the highest per process
+                per_process[ready['pid']] = max(per_process[ready['pid']], ready['connections'])
+                await release.wait()
+                if not reader.at_eof():
+                    stats['alive'] += 1
+            except (OSError, asyncio.TimeoutError, ValueError):
+                stats['failed'] += 1
+            finally:
+                if writer is not None:
+                    writer.close()
+
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(client()) for _ in range(options['connections'])]
+        while stats['opened'] + stats['failed'] < len(tasks):
+            await asyncio.sleep(0.1)
+        stats['connect_seconds'] = time.perf_counter() - started
+        await asyncio.sleep(options['hold'])
+        release.set()
+        await asyncio.gather(*tasks)
+        stats['per_process'] = dict(per_process)
+        return stats
+
+    async def read_ready_event(self, reader):
+        status = await reader.readline()
+        if b' 200 ' not in status:
+            raise ValueError(status)
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ValueError('connection closed before ready event')
+            if line.startswith(b'data:'):
+                return json.loads(line[5:])
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from api import sweeper
+
+
+class Command(BaseCommand):
+    help = (
+        'Cancel orders left in pending_payment past SWEEPER["PENDING_TTL_HOURS"] (restoring their stock) and send '
+        'admins one notification listing newly low-stock products. Idempotent and safe to run from cron on '
+        'several nodes at once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-hours', type=float, help='Override PENDING_TTL_HOURS')
+        parser.add_argument('--batch-size', type=int, help='Orders per transaction (default SWEEPER["BATCH_SIZE"])')
+        parser.add_argument('--threshold', type=int, help='Override LOW_STOCK_THRESHOLD')
+        parser.add_argument('--skip-orders', action='store_true')
+        parser.add_argument('--skip-stock', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['skip_orders']:
+            ttl = timedelta(hours=options['ttl_hours']) if options['ttl_hours'] is not None else None
+            cancelled = sweeper.cancel_stale_orders(ttl, options['batch_size'])
+            self.stdout.write(f"Cancelled {cancelled} unpaid order(s)")
+        if not options['skip_stock']:
+            reported = sweeper.alert_low_stock(options['threshold'])
+            self.stdout.write(f"Reported {len(reported)} newly low-stock product(s)")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import inventory
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every product's stock from the ledger (newest snapshot + later movements) in one query "
+        'and report products whose cached Product.count differs. --fix resets those counts to the ledger level.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Set mismatched counts to the ledger level')
+        parser.add_argument('--limit', type=int, default=50, help='Mismatches listed (all are counted)')
+
+    def handle(self, *args, **options):
+        rows = list(inventory.mismatches())
+        for product_id, count, expected in rows[:options['limit']]:
+            self.stdout.write(f"product {product_id}: count {count}, ledger {expected} ({count - expected:+d})")
+        if len(rows) > options['limit']:
+            self.stdout.write(f"... and {len(rows) - options['limit']} more")
+        if not rows:
+            self.stdout.write(self.style.SUCCESS('Every cached stock level matches the ledger'))
+            return
+        if not options['fix']:
+            raise CommandError(f"{len(rows)} product(s) don't match the ledger; rerun with --fix to repair them")
+
+        negative = [product_id for product_id, _, expected in rows if expected < 0]
+        fixed = inventory.repair([product_id for product_id, _, expected in rows if expected >= 0])
+        self.stdout.write(self.style.SUCCESS(f"{fixed} product(s) reset to their ledger level"))
+        if negative:
+            raise CommandError(f"Ledger level is negative for product(s) {negative}; add an adjustment by hand")
@@ -0,0 +1,176 @@
+"""
+Media (uploaded product images) delivery.
+
+serve_media replaces django.conf.urls.static.static(), which only works with
+DEBUG on and reads whole files in Python. It answers If-None-Match /
+If-Modified-Since with 304 and single byte ranges with 206. Content-addressed
+names (see ContentAddressedStorage) get a one-year immutable Cache-Control.
+Other files get MAX_AGE. The body is either handed to the front proxy
+(X-Accel-Redirect for nginx, X-Sendfile for Apache/lighttpd) or streamed with
+FileResponse, which WSGI servers with wsgi.file_wrapper (gunicorn) send with
+sendfile().
+
+Configured by settings.MEDIA_DELIVERY (see DEFAULTS).
+"""
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+DEFAULTS = {
+    'SENDFILE': None,                       # None, 'x-accel-redirect' or 'x-sendfile'
+    'X_ACCEL_PREFIX': '/protected-media/',  # nginx `internal` location aliased to MEDIA_ROOT
+    'MAX_AGE': 60 * 60,                     # for names that aren't content-addressed
+}
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+HASH_LENGTH = 12
+HASHED_NAME_RE = re.compile(rf'\.[0-9a-f]{{{HASH_LENGTH}}}\.[^./]+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'MEDIA_DELIVERY', {})}
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Saves uploads as <name>.<sha256 prefix><ext>, so a name always refers to
+    the same bytes and can be cached forever. Uploading identical content
+    again reuses the existing file (uploads are never deleted).
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        suffix = f'.{digest.hexdigest()[:HASH_LENGTH]}'
+        root, ext = os.path.splitext(name)
+        if max_length and len(root) + len(suffix) + len(ext) > max_length:
+            # Trim the readable part, never the hash
+            root = root[:max_length - len(suffix) - len(ext)]
+        name = f'{root}{suffix}{ext}'
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single `bytes=` range, None to ignore the
+    header (multiple or malformed ranges: send the whole file), or False
+    when it can't be satisfied.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or not (match[1] or match[2]):
+        return None
+    if not match[1]:
+        # Suffix range: the last N bytes
+        length = int(match[2])
+        return (max(size - length, 0), size - 1) if length and size else False
+    start = int(match[1])
+    end = min(int(match[2]), size - 1) if match[2] else size - 1
+    if match[2] and int(match[2]) < start:
+        return None
+    return (start, end) if start < size else False
+
+
+class FileRange:
+    """File object limited to `length` bytes from its current position. fileno() stays available for sendfile()."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Not found')
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Not found')
+
+    options = config()
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if HASHED_NAME_RE.search(path) else f"public, max-age={options['MAX_AGE']}",
+        'Accept-Ranges': 'bytes',
+    }
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        return not_modified
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    sendfile = (options['SENDFILE'] or '').lower()
+    if sendfile:
+        # The proxy sends the body and handles Range itself
+        response = HttpResponse(content_type=content_type, headers=headers)
+        if sendfile == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = options['X_ACCEL_PREFIX'].rstrip('/') + '/' + quote(path)
+        else:
+            response['X-Sendfile'] = full_path
+        return response
+
+    byte_range = None
+    if 'Range' in request.headers and request.headers.get('If-Range', etag) == etag:
+        byte_range = parse_range(request.headers['Range'], size)
+        if byte_range is False:
+            return HttpResponse(status=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['Content-Length'] = size
+        return response
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        return FileResponse(file, content_type=content_type, headers=headers)
+
+    start, end = byte_range
+    file.seek(start)
+    response = FileResponse(FileRange(file, end - start + 1), status=206, content_type=content_type, headers=headers)
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
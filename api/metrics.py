@@ -0,0 +1,206 @@
+"""
+In-process request metrics, exposed in Prometheus text format at /api/metrics/.
+
+MetricsMiddleware records per-route latency, status and DB query count/time.
+Code inside a request can add named phases with `with metrics.timed('gateway')`;
+serializer time is collected automatically (see instrument_serializers).
+Everything is aggregated in memory per worker process, so scrape each worker
+(or put them behind a Prometheus multi-target setup).
+"""
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'query_seconds', 'phases')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.phases = defaultdict(float)
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    connection.execute_wrapper hook, installed once per connection (see install_query_counter)
+    instead of per request: looking connections up on every request costs more than the rest
+    of the middleware put together.
+    """
+    state = _current.get()
+    if state is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        state.queries += 1
+        state.query_seconds += time.perf_counter() - started
+
+
+def install_query_counter(sender, connection, **kwargs):
+    # connection_created receiver; the wrapper object (and its execute_wrappers) outlives reconnects
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class Registry:
+    def __init__(self):
+        self.lock = Lock()
+        self.latency = defaultdict(Histogram)        # (route, method)
+        self.responses = defaultdict(int)            # (route, method, status)
+        self.db_queries = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))  # route
+        self.db_seconds = defaultdict(float)         # route
+        self.phases = defaultdict(Histogram)         # (route, phase)
+
+    def observe_request(self, route, method, status, seconds, state):
+        with self.lock:
+            self.latency[route, method].observe(seconds)
+            self.responses[route, method, status] += 1
+            self.db_queries[route].observe(state.queries)
+            self.db_seconds[route] += state.query_seconds
+            for phase, phase_seconds in state.phases.items():
+                self.phases[route, phase].observe(phase_seconds)
+
+    def observe_phase(self, route, phase, seconds):
+        with self.lock:
+            self.phases[route, phase].observe(seconds)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            self._histogram(lines, 'http_request_duration_seconds', 'Request latency by route.',
+                            self.latency, ('route', 'method'))
+            lines += ['# HELP http_responses_total Responses by route and status.',
+                      '# TYPE http_responses_total counter']
+            for (route, method, status), value in sorted(self.responses.items()):
+                lines.append(f'http_responses_total{_labels(route=route, method=method, status=status)} {value}')
+            self._histogram(lines, 'db_queries_per_request', 'Database queries per request.',
+                            self.db_queries, ('route',))
+            lines += ['# HELP db_query_seconds_total Time spent in database queries.',
+                      '# TYPE db_query_seconds_total counter']
+            for route, value in sorted(self.db_seconds.items()):
+                lines.append(f'db_query_seconds_total{_labels(route=route)} {value:.6f}')
+            self._histogram(lines, 'request_phase_duration_seconds',
+                            'Time per request spent serializing, calling the payment gateway, sending email...',
+                            self.phases, ('route', 'phase'))
+        return '\n'.join(lines) + '\n'
+
+    def _histogram(self, lines, name, help_text, series, label_names):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for key, hist in sorted(series.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            labels = dict(zip(label_names, key))
+            cumulative = 0
+            for upper, count in zip(hist.buckets, hist.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(**labels, le=upper)} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {hist.count}')
+            lines.append(f'{name}_sum{_labels(**labels)} {hist.sum:.6f}')
+            lines.append(f'{name}_count{_labels(**labels)} {hist.count}')
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+
+registry = Registry()
+
+
+@contextmanager
+def timed(phase):
+    """Attribute the enclosed block's time to `phase` of the current request (or to route "-" outside one)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        state = _current.get()
+        if state is not None:
+            state.phases[phase] += elapsed
+        else:
+            registry.observe_phase('-', phase, elapsed)
+
+
+def instrument_serializers():
+    """Time DRF's Serializer.data / ListSerializer.data (top-level only; nested serializers don't call .data)."""
+    from rest_framework import serializers
+
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        prop = cls.__dict__['data']
+        if getattr(prop.fget, '_timed', False):
+            continue
+
+        def data(self, _fget=prop.fget):
+            with timed('serializer'):
+                return _fget(self)
+        data._timed = True
+        setattr(cls, 'data', property(data))
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = RequestMetrics()
+        token = _current.set(state)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            self._record(request, response, time.perf_counter() - started, state)
+            return response
+        finally:
+            _current.reset(token)
+
+    async def __acall__(self, request):
+        # ORM calls made through sync_to_async copy the context, so their queries are counted too
+        state = RequestMetrics()
+        token = _current.set(state)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            self._record(request, response, time.perf_counter() - started, state)
+            return response
+        finally:
+            _current.reset(token)
+
+    def _record(self, request, response, seconds, state):
+        match = request.resolver_match
+        route = match.view_name if match else 'unresolved'
+        registry.observe_request(route, request.method, response.status_code, seconds, state)
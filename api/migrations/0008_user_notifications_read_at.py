@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-19 04:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_notificationreceipt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='notifications_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
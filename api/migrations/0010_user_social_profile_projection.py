@@ -0,0 +1,40 @@
+# Generated by Django 5.2.9 on 2026-10-19 04:59
+
+from django.db import migrations, models
+
+
+def backfill_social_profiles(apps, schema_editor):
+    SocialAccount = apps.get_model('socialaccount', 'SocialAccount')
+    User = apps.get_model('api', 'User')
+    for account in SocialAccount.objects.filter(provider='google').iterator():
+        extra_data = account.extra_data or {}
+        url = extra_data.get('picture')
+        if url and ('googleusercontent.com/profile/picture' in url or '/0' in url):
+            url = None
+        if url and url.startswith('http://'):
+            url = url.replace('http://', 'https://')
+        User.objects.filter(pk=account.user_id).update(
+            avatar_url=url or '', display_name=(extra_data.get('name') or '')[:150]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_job'),
+        ('socialaccount', '0003_extra_data_default_dict'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='display_name',
+            field=models.CharField(blank=True, max_length=150),
+        ),
+        migrations.RunPython(backfill_social_profiles, migrations.RunPython.noop),
+    ]
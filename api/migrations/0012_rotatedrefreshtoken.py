@@ -0,0 +1,20 @@
+# Generated by Django 5.2.9 on 2026-10-19 05:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_user_tokens_valid_after'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RotatedRefreshToken',
+            fields=[
+                ('jti', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.9 on 2026-10-19 05:02
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def dedupe_cart_and_wishlist(apps, schema_editor):
+    # Collapse duplicate (user, product) rows before the unique constraints in 0014
+    CartItem = apps.get_model('api', 'CartItem')
+    Wishlist = apps.get_model('api', 'Wishlist')
+
+    duplicates = (
+        CartItem.objects.values('user_id', 'product_id')
+        .annotate(rows=Count('id'), keep=Min('id'), total=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for dup in duplicates:
+        rows = CartItem.objects.filter(user_id=dup['user_id'], product_id=dup['product_id'])
+        rows.exclude(id=dup['keep']).delete()
+        rows.filter(id=dup['keep']).update(quantity=min(dup['total'], 5))
+
+    duplicates = (
+        Wishlist.objects.values('user_id', 'product_id')
+        .annotate(rows=Count('id'), keep=Min('id'))
+        .filter(rows__gt=1)
+    )
+    for dup in duplicates:
+        Wishlist.objects.filter(user_id=dup['user_id'], product_id=dup['product_id']).exclude(id=dup['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_rotatedrefreshtoken'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_cart_and_wishlist, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-19 06:09
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_archive_tables'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_category_lower_idx',
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Lower
 from decimal import Decimal
 
 # 1. Custom User Model
@@ -8,6 +10,41 @@ class User(AbstractUser):
     ROLE_CHOICES = (('admin', 'Admin'), ('user', 'User'))
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='user')
     is_blocked = models.BooleanField(default=False)
+    # Broadcast notifications created at or before this moment count as read ("mark all read")
+    notifications_read_at = models.DateTimeField(null=True, blank=True)
+    # Profile projection of the linked Google account, kept in sync by api/signals.py
+    avatar_url = models.URLField(max_length=500, blank=True)
+    display_name = models.CharField(max_length=150, blank=True)
+
+    # JWTs issued before this moment are rejected (see api/tokens.py)
+    tokens_valid_after = models.DateTimeField(null=True, blank=True)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Users built from JWT claims defer most columns; load them together
+        # on first access instead of one query per field.
+        if fields and getattr(self, '_from_token', False):
+            fields = list(self.get_deferred_fields() | set(fields))
+            self._from_token = False
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+    def apply_social_profile(self, extra_data):
+        extra_data = extra_data or {}
+        url = extra_data.get('picture')
+
+        # Google Loop fix
+        if url and ('googleusercontent.com/profile/picture' in url or '/0' in url):
+            url = None
+
+        if url and url.startswith('http://'):
+            url = url.replace('http://', 'https://')
+        self.avatar_url = url or ''
+        self.display_name = (extra_data.get('name') or '')[:150]
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Case-insensitive email checks (UserSerializer.validate_email)
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+        ]
 
 # 2. Address Model
 class Address(models.Model):
@@ -24,6 +61,12 @@ class Address(models.Model):
         return f"{self.name}, {self.city}"
 
 # 3. Product Model
+class ProductQuerySet(models.QuerySet):
+    def in_category(self, category):
+        # Matches the lower(category) indexes on Product (a plain iexact filter can't use them)
+        return self.alias(category_lower=Lower('category')).filter(category_lower=category.lower())
+
+
 class Product(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
@@ -35,9 +78,54 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Popularity counters, maintained by api.popularity
+    units_sold = models.PositiveIntegerField(default=0)
+    trending_score = models.FloatField(default=0)
+    wishlist_count = models.PositiveIntegerField(default=0)
+    # Set when the sweeper reports the product as low on stock, cleared once it's restocked (api/sweeper.py)
+    low_stock_alerted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Leaderboards (api/popularity.py): site-wide, and per category through in_category().
+            # The per-category ones lead with lower(category), so they also serve the plain ?category= filter.
+            models.Index(fields=['-trending_score'], name='product_trending_idx'),
+            models.Index(fields=['-units_sold'], name='product_units_sold_idx'),
+            models.Index(fields=['-wishlist_count'], name='product_wishlist_count_idx'),
+            models.Index(Lower('category'), models.F('trending_score').desc(), name='product_cat_trending_idx'),
+            models.Index(Lower('category'), models.F('units_sold').desc(), name='product_cat_units_sold_idx'),
+            models.Index(Lower('category'), models.F('wishlist_count').desc(), name='product_cat_wishlist_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    # Changed by atomic UPDATEs (api/inventory.py, api/popularity.py, api/sweeper.py), never written back from a loaded row
+    COUNTER_FIELDS = ('count', 'units_sold', 'trending_score', 'wishlist_count', 'low_stock_alerted_at')
+
+    def save_edits(self):
+        """
+        Save an edit (admin form, serializer, image upload) without the counters: a full-row
+        UPDATE would overwrite sales made since the row was read. Stock edits go through inventory.set_level().
+        """
+        self.save(update_fields=[
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.name not in self.COUNTER_FIELDS
+        ])
+
+    def primary_image_url(self):
+        """Main image, else the first gallery image (uses prefetched `images`), else ''."""
+        if self.image:
+            return self.image.url
+        for img in self.images.all():
+            if img.image:
+                return img.image.url
+            if img.external_url:
+                return img.external_url
+        return ''
+
 # backend/api/models.py
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
@@ -53,11 +141,21 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_cart_item'),
+        ]
+
 # 5. Wishlist Model
 class Wishlist(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wishlist_items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_wishlist_item'),
+        ]
+
 # 6. Order Model
 class Order(models.Model):
     STATUS_CHOICES = (
@@ -76,14 +174,40 @@ class Order(models.Model):
     razorpay_order_id = models.CharField(max_length=100, blank=True, null=True)
     razorpay_payment_id = models.CharField(max_length=100, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            models.Index(fields=['razorpay_order_id'], name='order_razorpay_order_idx'),
+            # Sweeper: oldest orders in a status (pending_payment past its TTL)
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
-    price = models.DecimalField(max_digits=10, decimal_places=2)
+    price = models.DecimalField(max_digits=10, decimal_places=2)  # unit price when bought
+    # The product as it was bought, so order history neither joins the catalog nor shows today's data.
+    # Lines from before these fields existed are filled by `manage.py backfill_order_snapshots`.
+    product_name = models.CharField(max_length=255, blank=True, default='')
+    product_image = models.CharField(max_length=500, blank=True, default='')
+    product_category = models.CharField(max_length=100, blank=True, default='')
 
     def __str__(self):
-        return f"{self.quantity} x {self.product.name} (Order #{self.order.id})"
+        return f"{self.quantity} x {self.product_name or self.product.name} (Order #{self.order_id})"
+
+    @staticmethod
+    def snapshot(product):
+        return {
+            'product_name': product.name,
+            'product_image': product.primary_image_url()[:500],
+            'product_category': product.category,
+        }
+
+    @classmethod
+    def for_product(cls, order, product, quantity):
+        """Unsaved line for `product` at its current price, with the snapshot filled in."""
+        return cls(order=order, product=product, quantity=quantity, price=product.price, **cls.snapshot(product))
 
 # 7. Cancelled Order
 class CancelledOrder(models.Model):
@@ -95,8 +219,99 @@ class CancelledOrder(models.Model):
 
     def __str__(self):
         return f"Cancelled Order #{self.order.id}"
+
+
+# Stock ledger (see api/inventory.py): every change to Product.count is one of these rows, and the
+# product's level is its latest StockSnapshot plus the movements after it. Product.count caches that sum.
+class StockMovement(models.Model):
+    REASON_CHOICES = (
+        ('sale', 'Sale'),
+        ('restock', 'Cancellation restock'),
+        ('adjustment', 'Adjustment'),
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    # Kept when the order or user goes away: the movement still happened
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.product_id} {self.delta:+d} ({self.reason})"
+
+
+# Movements folded by `manage.py compact_stock`; a product's newest snapshot is its starting level
+class StockSnapshot(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    level = models.IntegerField()
+    movements = models.PositiveIntegerField(default=0)  # folded into this snapshot (since the previous one)
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.product_id} = {self.level} at {self.taken_at:%Y-%m-%d %H:%M}"
+
+
+# "Frequently bought together": each product's top-K co-purchased products, built from OrderItem
+# by api/recommendations.py. Keyed (product, rank), so a product's list is one index range scan.
+class ProductAffinity(models.Model):
+    pk = models.CompositePrimaryKey('product', 'rank')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='affinities', db_index=False)  # PK prefix
+    rank = models.PositiveSmallIntegerField()  # 1 = bought together most often
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField()  # orders containing both products
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} (#{self.rank}, {self.score})"
     
 
+# Retention (see api/retention.py): finished orders past their policy's age, moved out of the hot tables by
+# `manage.py archive_data`. One row per order keeping its original id; lines and cancellation are embedded.
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # the Order's id
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    shipping_details = models.JSONField(default=dict)
+    payment_method = models.CharField(max_length=50)
+    razorpay_order_id = models.CharField(max_length=100, blank=True, null=True)
+    razorpay_payment_id = models.CharField(max_length=100, blank=True, null=True)
+    # [{product_id, product_name, product_image, product_category, quantity, price}, ...] in line order
+    items = models.JSONField(default=list)
+    units = models.PositiveIntegerField(default=0)  # sum of line quantities, for dashboard totals
+    cancellation = models.JSONField(null=True, blank=True)  # {reason, cancelled_at, refund_status, cancelled_by}
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archived_order_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order #{self.id}"
+
+
+class NotificationQuerySet(models.QuerySet):
+    def for_user(self, user):
+        # Personal notifications plus broadcasts (recipient=NULL) sent after the user joined.
+        # Broadcasts are stored once, so their read state comes from NotificationReceipt.
+        visible = models.Q(recipient=user)
+        if not user.is_superuser:
+            visible |= models.Q(recipient__isnull=True, created_at__gte=user.date_joined)
+        receipts = NotificationReceipt.objects.filter(notification=models.OuterRef('pk'), user=user)
+        broadcast_read = models.Exists(receipts)
+        if user.notifications_read_at:
+            broadcast_read = models.Q(created_at__lte=user.notifications_read_at) | broadcast_read
+        return self.filter(visible).annotate(
+            has_read=models.Case(
+                models.When(recipient__isnull=True, then=broadcast_read),
+                default=models.F('is_read'),
+                output_field=models.BooleanField(),
+            )
+        )
+
+
 class Notification(models.Model):
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
     title = models.CharField(max_length=255)
@@ -104,5 +319,88 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = NotificationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Also serves broadcasts (recipient IS NULL) ordered by date
+            models.Index(fields=['recipient', '-created_at'], name='notification_recipient_idx'),
+        ]
+
+    @property
+    def is_broadcast(self):
+        return self.recipient_id is None
+
+    def __str__(self):
+        return f"{self.title} - {self.recipient.username if self.recipient else 'All Users'}"
+
+
+# Read personal notifications and old broadcasts, moved out of Notification by `manage.py archive_data`
+class ArchivedNotification(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # the Notification's id
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='archived_notifications')
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Archived: {self.title}"
+
+
+# Sparse per-user read state for broadcast notifications (one row only once a user reads it)
+class NotificationReceipt(models.Model):
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='receipts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_receipts')
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'notification'], name='unique_notification_receipt'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} read #{self.notification_id}"
+
+
+# Refresh tokens that have already been rotated (cache-backed, see api/tokens.py).
+# Rows are only needed until the token would have expired anyway; `manage.py prune_tokens` deletes the rest.
+class RotatedRefreshToken(models.Model):
+    jti = models.CharField(max_length=64, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+# Background jobs (see api/jobs.py and `manage.py run_jobs`)
+class Job(models.Model):
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    priority = models.SmallIntegerField(default=0)  # higher runs first
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at'], name='job_ready_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.title} - {self.recipient.username if self.recipient else 'All Users'}"
\ No newline at end of file
+        return f"{self.name} #{self.id} ({self.status})"
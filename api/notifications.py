@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification, NotificationReceipt, User
+
+# Unread badge counters. Each user's count is cached together with the broadcast
+# "version" it was computed against, so a new broadcast invalidates every badge with
+# a single cache write instead of touching one key per user.
+UNREAD_KEY = 'notifications:unread:{}'
+UNREAD_VERSION_KEY = 'notifications:unread:{}:version'
+BROADCAST_VERSION_KEY = 'notifications:broadcast-version'
+UNREAD_TTL = 60 * 60 * 24
+
+
+def unread_count(user):
+    keys = [UNREAD_KEY.format(user.pk), UNREAD_VERSION_KEY.format(user.pk), BROADCAST_VERSION_KEY]
+    cached = cache.get_many(keys)
+    version = cached.get(BROADCAST_VERSION_KEY, 0)
+    if keys[0] in cached and cached.get(keys[1]) == version:
+        return max(cached[keys[0]], 0)
+
+    count = Notification.objects.for_user(user).filter(has_read=False).count()
+    cache.set_many({keys[0]: count, keys[1]: version}, UNREAD_TTL)
+    return count
+
+
+def _adjust_unread(user_id, delta):
+    if not delta:
+        return
+    try:
+        cache.incr(UNREAD_KEY.format(user_id), delta)
+    except ValueError:
+        # Nothing cached yet; the next unread_count() call computes it from the database
+        pass
+
+
+def on_notification_created(notification):
+    if notification.recipient_id:
+        _adjust_unread(notification.recipient_id, 1)
+        return
+    if not cache.add(BROADCAST_VERSION_KEY, 1, None):
+        cache.incr(BROADCAST_VERSION_KEY)
+
+
+def mark_read(user, ids=None):
+    """Mark the given notification ids (or everything when ids is None) as read for user."""
+    personal = Notification.objects.filter(recipient=user, is_read=False)
+    if ids is None:
+        now = timezone.now()
+        personal.update(is_read=True)
+        User.objects.filter(pk=user.pk).update(notifications_read_at=now)
+        user.notifications_read_at = now
+        cache.delete(UNREAD_KEY.format(user.pk))
+        return
+
+    updated = personal.filter(id__in=ids).update(is_read=True)
+    broadcast_ids = list(
+        Notification.objects.for_user(user)
+        .filter(Q(id__in=ids), recipient__isnull=True, has_read=False)
+        .values_list('id', flat=True)
+    )
+    NotificationReceipt.objects.bulk_create(
+        [NotificationReceipt(notification_id=pk, user=user) for pk in broadcast_ids],
+        ignore_conflicts=True,
+    )
+    _adjust_unread(user.pk, -(updated + len(broadcast_ids)))
@@ -0,0 +1,70 @@
+"""
+Razorpay clients.
+
+get_client() is the official SDK client used by the synchronous views. The
+async helpers (for api/async_views.py) call the same REST endpoint with httpx,
+so under ASGI a request waiting on Razorpay is just a suspended coroutine. One
+pooled AsyncClient is kept per event loop.
+
+Both SDKs are imported on first use, not at import time: most processes
+(manage.py commands, WSGI workers that never take a payment) don't need them.
+"""
+import asyncio
+import functools
+import weakref
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+_clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+
+
+class GatewayError(Exception):
+    pass
+
+
+def api_url():
+    return getattr(settings, 'RAZORPAY_API_URL', 'https://api.razorpay.com').rstrip('/')
+
+
+def credentials():
+    if not (settings.RAZORPAY_KEY_ID and settings.RAZORPAY_KEY_SECRET):
+        raise ImproperlyConfigured('RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET must be set to take payments')
+    return settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET
+
+
+@functools.cache
+def get_client():
+    """The process-wide razorpay.Client, created on first use."""
+    import razorpay
+
+    return razorpay.Client(auth=credentials(), base_url=api_url())
+
+
+def _async_client():
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return client
+
+
+async def acreate_order(amount, currency='INR'):
+    """Async equivalent of `client.order.create(...)`; amount is in paise."""
+    response = await _async_client().post(
+        f'{api_url()}/v1/orders',
+        json={'amount': amount, 'currency': currency, 'payment_capture': '1'},
+        auth=credentials(),
+    )
+    if response.status_code >= 400:
+        try:
+            description = response.json()['error']['description']
+        except (ValueError, KeyError, TypeError):
+            description = response.text
+        raise GatewayError(description)
+    return response.json()
@@ -0,0 +1,138 @@
+"""
+Per-product popularity counters kept on Product, so "best sellers" and
+"trending" are an indexed ORDER BY rather than an OrderItem aggregation:
+
+    units_sold      units in orders that weren't cancelled
+    trending_score  units sold, exponentially decayed with HALF_LIFE_HOURS
+    wishlist_count  current Wishlist rows
+
+trending_score uses forward decay: a sale at time t adds
+quantity * 2 ** ((t - EPOCH) / half-life), so newer sales weigh more. Every
+product's true decayed score is its stored value times the same
+2 ** (-(now - EPOCH) / half-life), so ordering by the column is ordering by
+the decayed score, and nothing has to be rewritten as time passes.
+decayed() converts a stored value to "units, decayed to now" for display.
+The weights double every half-life, and a float runs out after ~1000 of
+them (eight years at the default 72h). Moving EPOCH forward, or changing the
+half-life, needs `manage.py rebuild_popularity` to put every score back on
+one scale.
+
+Checkout (record_sale), order status changes to and from 'cancelled' and
+Wishlist adds/removes (api/signals.py) update the counters in place with F()
+expressions.
+rebuild() recomputes everything from order lines (archived orders included)
+and Wishlist.
+"""
+from collections import defaultdict
+from itertools import chain
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ArchivedOrder, OrderItem, Product, Wishlist
+
+DEFAULTS = {
+    'HALF_LIFE_HOURS': 72,
+    'EPOCH': datetime(2026, 1, 1, tzinfo=dt_timezone.utc),
+}
+
+# ?by= for the top-N endpoint -> column
+LEADERBOARDS = {
+    'trending': 'trending_score',
+    'best_sellers': 'units_sold',
+    'wishlisted': 'wishlist_count',
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'POPULARITY', {})}
+
+
+def weight(at=None):
+    """Forward-decay weight of an event at `at` (default now)."""
+    options = config()
+    hours = ((at or timezone.now()) - options['EPOCH']).total_seconds() / 3600
+    return 2.0 ** (hours / options['HALF_LIFE_HOURS'])
+
+
+def decayed(score, now=None):
+    """A stored trending_score as units sold, decayed to `now`."""
+    return score / weight(now)
+
+
+def _apply(units, scores, sign):
+    """units/scores: {product_id: units} and {product_id: weighted units}, added (sign=1) or taken back (-1)."""
+    for product_id in sorted(units):
+        Product.objects.filter(pk=product_id).update(
+            units_sold=Greatest(F('units_sold') + sign * units[product_id], Value(0)),
+            trending_score=F('trending_score') + sign * scores[product_id],
+        )
+
+
+def _tally(lines):
+    """lines: (product_id, quantity, when) -> ({product_id: units}, {product_id: weighted units})"""
+    units, scores = defaultdict(int), defaultdict(float)
+    for product_id, quantity, at in lines:
+        units[product_id] += quantity
+        scores[product_id] += quantity * weight(at)
+    return units, scores
+
+
+def record_sale(lines, at=None):
+    """lines: (product_id, quantity) of a new order."""
+    at = at or timezone.now()
+    _apply(*_tally((product_id, quantity, at) for product_id, quantity in lines), 1)
+
+
+def on_status_changed(order, old_status):
+    """
+    Cancelled orders don't count. Cancelling takes back exactly what checkout
+    added (weighted at order.created_at), and an admin un-cancelling puts it back.
+    """
+    if (old_status == 'cancelled') == (order.status == 'cancelled'):
+        return
+    sign = -1 if order.status == 'cancelled' else 1
+    lines = order.items.values_list('product_id', 'quantity')
+    _apply(*_tally((product_id, quantity, order.created_at) for product_id, quantity in lines), sign)
+
+
+def record_cancellations(orders):
+    """on_status_changed() for orders cancelled in bulk with .update() (see api/sweeper.py), one read for all."""
+    created = {order.pk: order.created_at for order in orders}
+    lines = OrderItem.objects.filter(order_id__in=created).values_list('order_id', 'product_id', 'quantity')
+    _apply(*_tally((product_id, quantity, created[order_id]) for order_id, product_id, quantity in lines), -1)
+
+
+def record_wishlist(product_id, delta):
+    Product.objects.filter(pk=product_id).update(wishlist_count=Greatest(F('wishlist_count') + delta, Value(0)))
+
+
+def rebuild(batch_size=1000):
+    """Recompute all three counters from order lines (live and archived) and Wishlist; returns products updated."""
+    lines = chain(
+        OrderItem.objects.exclude(order__status='cancelled')
+        .values_list('product_id', 'quantity', 'order__created_at')
+        .iterator(chunk_size=batch_size),
+        # Orders moved to the archive (api/retention.py) still count
+        (
+            (line['product_id'], line['quantity'], created_at)
+            for items, created_at in ArchivedOrder.objects.exclude(status='cancelled')
+            .values_list('items', 'created_at').iterator(chunk_size=batch_size)
+            for line in items
+        ),
+    )
+    units, trending = _tally(lines)
+    wishlisted = dict(Wishlist.objects.values('product').annotate(n=Count('pk')).values_list('product', 'n'))
+
+    products = list(Product.objects.only('pk'))
+    for product in products:
+        product.units_sold = units.get(product.pk, 0)
+        product.trending_score = trending.get(product.pk, 0.0)
+        product.wishlist_count = wishlisted.get(product.pk, 0)
+    with transaction.atomic():
+        Product.objects.bulk_update(products, ['units_sold', 'trending_score', 'wishlist_count'], batch_size=batch_size)
+    return len(products)
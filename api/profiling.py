@@ -0,0 +1,217 @@
+"""
+Slow-request sampler.
+
+SlowRequestMiddleware times every request, and every request that finishes
+over the threshold is kept in an in-memory ring buffer, browsable at
+/admin/slow-requests/. Only the heavy part is sampled: for SAMPLE_RATE of
+requests it also records the SQL issued (parameterised statement, params,
+duration). A slow sampled request gets its statements grouped by SQL text (the
+same statement repeated many times is the usual N+1 signature) and the most
+expensive ones EXPLAINed. Fast requests only pay for a list append per query
+when sampled, and for two clock reads otherwise.
+
+Configured by settings.SLOW_REQUEST_SAMPLER (see DEFAULTS). Samples live per
+worker process, like api.metrics.
+"""
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from itertools import count
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+DEFAULTS = {
+    'ENABLED': True,
+    'THRESHOLD_MS': 500,
+    'SAMPLE_RATE': 0.01,      # fraction of requests whose SQL is recorded and EXPLAINed (raise it while investigating)
+    'MAX_SAMPLES': 50,        # ring buffer size
+    'MAX_QUERIES': 1000,      # stop recording statements after this many per request
+    'N_PLUS_ONE_MIN': 5,      # a statement repeated this often is flagged
+    'EXPLAIN_TOP': 3,         # EXPLAIN this many of the most expensive SELECTs (0 to disable)
+}
+
+_current = ContextVar('slow_request_queries', default=None)
+_ids = count(1)
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'SLOW_REQUEST_SAMPLER', {})}
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper installed once per connection (see install_query_recorder), like api.metrics.count_query."""
+    queries = _current.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.append((context['connection'].alias, sql, params, many, time.perf_counter() - started))
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class SampleBuffer:
+    def __init__(self, size):
+        self.lock = Lock()
+        self.samples = deque(maxlen=size)
+
+    def add(self, sample):
+        with self.lock:
+            self.samples.appendleft(sample)
+
+    def all(self):
+        with self.lock:
+            return list(self.samples)
+
+    def get(self, sample_id):
+        with self.lock:
+            return next((s for s in self.samples if s['id'] == sample_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+
+buffer = SampleBuffer(config()['MAX_SAMPLES'])
+
+
+def group_statements(queries, n_plus_one_min):
+    """Collapse recorded queries by SQL text, most expensive first."""
+    groups = {}
+    for alias, sql, params, many, seconds in queries:
+        group = groups.get((alias, sql))
+        if group is None:
+            group = groups[alias, sql] = {
+                'alias': alias, 'sql': sql, 'params': params, 'many': many,
+                'count': 0, 'total_ms': 0.0, 'plan': None,
+            }
+        group['count'] += 1
+        group['total_ms'] += seconds * 1000
+    statements = sorted(groups.values(), key=lambda g: g['total_ms'], reverse=True)
+    for group in statements:
+        group['n_plus_one'] = group['count'] >= n_plus_one_min
+    return statements
+
+
+def explain(group):
+    connection = connections[group['alias']]
+    prefix = connection.ops.explain_query_prefix()
+    try:
+        # Savepoint so a failing EXPLAIN can't poison an outer transaction
+        with transaction.atomic(using=group['alias']), connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {group['sql']}", group['params'])
+            return '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+    except DatabaseError as e:
+        return f'EXPLAIN failed: {e}'
+
+
+def build_sample(request, response, seconds, queries, conf):
+    """`queries` is None when the request's SQL wasn't sampled: the sample then only has its timing."""
+    statements = group_statements(queries or [], conf['N_PLUS_ONE_MIN'])
+    explained = 0
+    for group in statements:
+        if explained >= conf['EXPLAIN_TOP']:
+            break
+        if group['many'] or not group['sql'].lstrip().upper().startswith('SELECT'):
+            continue
+        group['plan'] = explain(group)
+        explained += 1
+    for group in statements:
+        # Keep the buffer free of live objects (and bounded): params are only needed for EXPLAIN
+        group['params'] = repr(group['params'])[:500]
+    match = request.resolver_match
+    return {
+        'id': next(_ids),
+        'at': timezone.now(),
+        'method': request.method,
+        'path': request.get_full_path()[:500],
+        'route': match.view_name if match else None,
+        'status': response.status_code,
+        'duration_ms': seconds * 1000,
+        'sql_recorded': queries is not None,
+        'query_count': len(queries) + queries.dropped if queries is not None else None,
+        'dropped': queries.dropped if queries is not None else 0,
+        'sql_ms': sum(q[4] for q in queries) * 1000 if queries is not None else None,
+        'n_plus_one': [g for g in statements if g['n_plus_one']],
+        'statements': statements,
+    }
+
+
+class _Queries(list):
+    """A list that silently stops growing at `limit` (a runaway request shouldn't eat the worker's memory)."""
+    __slots__ = ('limit', 'dropped')
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.dropped = 0
+
+    def append(self, item):
+        if len(self) < self.limit:
+            super().append(item)
+        else:
+            self.dropped += 1
+
+
+class SlowRequestMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def sample_queries(conf):
+        """The list this request's SQL is recorded into, or None (not sampled: timed only)."""
+        return _Queries(conf['MAX_QUERIES']) if random.random() < conf['SAMPLE_RATE'] else None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        conf = config()
+        if not conf['ENABLED']:
+            return self.get_response(request)
+
+        queries = self.sample_queries(conf)
+        token = _current.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        seconds = time.perf_counter() - started
+        if seconds * 1000 >= conf['THRESHOLD_MS']:
+            buffer.add(build_sample(request, response, seconds, queries, conf))
+        return response
+
+    async def __acall__(self, request):
+        # ORM calls made through sync_to_async copy the context, so they are recorded too
+        conf = config()
+        if not conf['ENABLED']:
+            return await self.get_response(request)
+
+        queries = self.sample_queries(conf)
+        token = _current.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        seconds = time.perf_counter() - started
+        # Streaming responses (SSE) return straight away, so they rarely cross the threshold
+        if seconds * 1000 >= conf['THRESHOLD_MS']:
+            buffer.add(await sync_to_async(build_sample)(request, response, seconds, queries, conf))
+        return response
@@ -0,0 +1,184 @@
+"""
+"Frequently bought together", precomputed into ProductAffinity.
+
+build_all() counts, for every pair of products, the orders that contain both
+(a sparse product x product co-occurrence matrix built from OrderItem) and
+keeps the TOP_K neighbours of each product. With NumPy installed the counting
+is vectorized: one array of (order, product) lines is expanded into all
+within-order pairs, and np.unique counts the pairs. Without NumPy a
+Counter-based loop gives the same result, just slower.
+
+New orders only change the rows of the products they contain, so checkout
+enqueues a 'recommendations.refresh' job for those products. refresh() then
+recomputes their rows with one aggregate query each. Run
+`manage.py build_recommendations` for the first build, or to start from
+scratch.
+
+Ties are broken by product id, so every path produces the same ranking.
+
+Only live orders count: orders moved to ArchivedOrder by `manage.py
+archive_data` (api/retention.py, delivered or cancelled orders older than
+a year by default) drop out of the counts at the next build or refresh.
+This is intentional. refresh() needs an order's lines as OrderItem rows to
+aggregate them per product, and archived lines are JSON. So the table
+describes what is bought together within the retention window. Unlike
+popularity.rebuild(), it is not a total over the shop's whole history.
+"""
+from collections import Counter, defaultdict
+from importlib.util import find_spec
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+
+from .jobs import enqueue
+from .models import OrderItem, ProductAffinity, ProductImage
+
+DEFAULTS = {
+    'TOP_K': 10,
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'RECOMMENDATIONS', {})}
+
+
+def has_numpy():
+    # Checked without importing it: NumPy is only imported by a full build, never at startup
+    return find_spec('numpy') is not None
+
+
+def order_lines():
+    """Distinct (order_id, product_id) pairs of live orders, ordered by order."""
+    return OrderItem.objects.values_list('order_id', 'product_id').distinct().order_by('order_id', 'product_id')
+
+
+def top_k_numpy(lines, k):
+    """{product: [(related, score), ...]} from an (n, 2) int64 array of distinct (order, product) lines sorted by order."""
+    import numpy as np
+
+    if not len(lines):
+        return {}
+    orders, products = lines[:, 0], lines[:, 1]
+    # Each line is paired with every line of its order: line i repeats `size` times, against start..start+size-1
+    starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    sizes = np.diff(np.r_[starts, len(lines)])
+    line_size = np.repeat(sizes, sizes)
+    line_start = np.repeat(starts, sizes)
+    left = np.repeat(np.arange(len(lines)), line_size)
+    offsets = np.arange(len(left)) - np.repeat(np.cumsum(line_size) - line_size, line_size)
+    right = np.repeat(line_start, line_size) + offsets
+    keep = left != right
+    if not keep.any():
+        return {}
+
+    # The sparse matrix in COO form: each (product, related) cell encoded as one int64, counted by np.unique
+    base = int(products.max()) + 1
+    cells, scores = np.unique(products[left[keep]] * base + products[right[keep]], return_counts=True)
+    rows, cols = np.divmod(cells, base)
+    # Per product: highest score first, then lowest related id
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    row_starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    row_rank = np.arange(len(rows)) - np.repeat(row_starts, np.diff(np.r_[row_starts, len(rows)]))
+    top = row_rank < k
+
+    result = defaultdict(list)
+    for product, related, score in zip(rows[top].tolist(), cols[top].tolist(), scores[top].tolist()):
+        result[product].append((related, score))
+    return result
+
+
+def top_k_python(lines, k):
+    """Same as top_k_numpy, from an iterable of distinct (order, product) lines sorted by order."""
+    counts = defaultdict(Counter)
+    basket, current = [], None
+    for order_id, product_id in chain(lines, [(None, None)]):
+        if order_id != current:
+            for a in basket:
+                for b in basket:
+                    if a != b:
+                        counts[a][b] += 1
+            basket, current = [], order_id
+        basket.append(product_id)
+    return {
+        product: sorted(related.items(), key=lambda item: (-item[1], item[0]))[:k]
+        for product, related in counts.items()
+    }
+
+
+def affinity_rows(neighbours):
+    return [
+        ProductAffinity(product_id=product, rank=rank, related_id=related, score=score)
+        for product, ranked in neighbours.items()
+        for rank, (related, score) in enumerate(ranked, start=1)
+    ]
+
+
+def build_all(k=None, engine=None, batch_size=2000):
+    """Rebuild the whole table; returns the number of rows written."""
+    k = k or config()['TOP_K']
+    engine = engine or ('numpy' if has_numpy() else 'python')
+    if engine == 'numpy':
+        import numpy as np
+
+        lines = np.array(list(order_lines()), dtype=np.int64).reshape(-1, 2)
+        neighbours = top_k_numpy(lines, k)
+    else:
+        neighbours = top_k_python(order_lines().iterator(chunk_size=batch_size), k)
+    rows = affinity_rows(neighbours)
+    with transaction.atomic():
+        ProductAffinity.objects.all().delete()
+        ProductAffinity.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def neighbours_of(product_id, k):
+    """One product's row, straight from OrderItem: orders sharing a line with it, counted per other product."""
+    orders = OrderItem.objects.filter(product_id=product_id).values('order_id')
+    ranked = (
+        OrderItem.objects.filter(order_id__in=orders)
+        .exclude(product_id=product_id)
+        .values('product_id')
+        .annotate(score=Count('order_id', distinct=True))
+        .order_by('-score', 'product_id')[:k]
+    )
+    return [(row['product_id'], row['score']) for row in ranked]
+
+
+def refresh(product_ids, k=None):
+    """Recompute the rows of the given products (after orders containing them were placed)."""
+    k = k or config()['TOP_K']
+    product_ids = sorted(set(product_ids))
+    rows = affinity_rows({product_id: neighbours_of(product_id, k) for product_id in product_ids})
+    with transaction.atomic():
+        ProductAffinity.objects.filter(product_id__in=product_ids).delete()
+        ProductAffinity.objects.bulk_create(rows)
+    return len(rows)
+
+
+def for_product(product_id):
+    """
+    The product's neighbours, best first, in one query: the (product, rank)
+    primary key range plus the related products, with their first gallery
+    image as subqueries (RecommendedProductSerializer reads those).
+    """
+    first_image = ProductImage.objects.filter(product=OuterRef('related_id')).order_by('pk')
+    return (
+        ProductAffinity.objects.filter(product_id=product_id, related__is_active=True)
+        .select_related('related')
+        .defer('related__description')
+        .annotate(
+            gallery_image=Subquery(first_image.values('image')[:1]),
+            gallery_url=Subquery(first_image.values('external_url')[:1]),
+        )
+        .order_by('rank')
+    )
+
+
+def schedule_refresh(product_ids):
+    """Called at checkout; a basket of one product changes nobody's neighbours."""
+    product_ids = sorted(set(product_ids))
+    if len(product_ids) > 1:
+        enqueue('recommendations.refresh', {'product_ids': product_ids}, priority=-1)
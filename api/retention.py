@@ -0,0 +1,165 @@
+"""
+Retention: `manage.py archive_data` moves rows the live endpoints no longer
+need out of the hot tables, so their indexes stop growing with the shop's
+whole history:
+
+    notifications  read personal notifications older than READ_AFTER_DAYS,
+                   and broadcasts older than BROADCAST_AFTER_DAYS (with their
+                   per-user receipts) -> ArchivedNotification
+    orders         orders in STATUSES older than AFTER_DAYS, with their lines
+                   and cancellation -> ArchivedOrder (one row per order)
+
+Each policy moves bounded batches in primary-key order, and each batch is read,
+copied and deleted in one transaction. Archived rows keep their original ids
+and inserts ignore conflicts, so an interrupted run, or two overlapping ones,
+never lose or duplicate anything. Orders stay readable: the order history
+(GET /api/orders/) pages through live orders and then archived ones (see
+OrderHistory), ?archived=1 lists only archived ones (also on
+/api/admin/orders/), and retrieving an order from either endpoint falls back
+to ArchivedOrder. Archived orders still count in popularity.rebuild(), but
+not in the "frequently bought together" table (see api/recommendations.py).
+
+Archive tables instead of PostgreSQL partitions: they work the same on the
+SQLite setups, and Django would not manage partitioned tables anyway.
+
+Configured by settings.RETENTION (see DEFAULTS). A policy given there only
+needs the keys it changes.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import notifications
+from .models import ArchivedNotification, ArchivedOrder, Notification, Order, OrderItem
+
+DEFAULTS = {
+    'BATCH_SIZE': 500,
+    'POLICIES': {
+        'notifications': {'ENABLED': True, 'READ_AFTER_DAYS': 90, 'BROADCAST_AFTER_DAYS': 180},
+        'orders': {'ENABLED': True, 'AFTER_DAYS': 365, 'STATUSES': ('delivered', 'cancelled')},
+    },
+}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'RETENTION', {})}
+
+
+def policy(name):
+    return {**DEFAULTS['POLICIES'][name], **config()['POLICIES'].get(name, {})}
+
+
+def move(queryset, archive_model, to_archived, batch_size, limit=None):
+    """Archive and delete `queryset` in pk order, batch_size rows per transaction; returns rows moved."""
+    moved = last_pk = 0
+    while limit is None or moved < limit:
+        size = batch_size if limit is None else min(batch_size, limit - moved)
+        with transaction.atomic():
+            # Keyset pagination: each batch is a fresh range scan however far in we are
+            batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:size])
+            if not batch:
+                break
+            archive_model.objects.bulk_create([to_archived(row) for row in batch], ignore_conflicts=True)
+            queryset.model.objects.filter(pk__in=[row.pk for row in batch]).delete()
+        moved += len(batch)
+        last_pk = batch[-1].pk
+    return moved
+
+
+def archived_notification(notification):
+    return ArchivedNotification(
+        id=notification.pk, recipient_id=notification.recipient_id, title=notification.title,
+        message=notification.message, is_read=notification.is_read, created_at=notification.created_at,
+    )
+
+
+def archived_order(order):
+    items = []
+    for item in order.items.all():
+        # Lines from before snapshots existed (not backfilled yet) read the product once, here
+        snapshot = (
+            {'product_name': item.product_name, 'product_image': item.product_image, 'product_category': item.product_category}
+            if item.product_name else OrderItem.snapshot(item.product)
+        )
+        items.append({'product_id': item.product_id, **snapshot, 'quantity': item.quantity, 'price': str(item.price)})
+    cancellation = getattr(order, 'cancellation_details', None)
+    return ArchivedOrder(
+        id=order.pk, user_id=order.user_id, status=order.status, total_amount=order.total_amount,
+        created_at=order.created_at, shipping_details=order.shipping_details, payment_method=order.payment_method,
+        razorpay_order_id=order.razorpay_order_id, razorpay_payment_id=order.razorpay_payment_id,
+        items=items, units=sum(item['quantity'] for item in items),
+        cancellation=cancellation and {
+            'reason': cancellation.reason,
+            'cancelled_at': cancellation.cancelled_at.isoformat(),
+            'refund_status': cancellation.refund_status,
+            'cancelled_by': cancellation.cancelled_by_id,
+        },
+    )
+
+
+def archive_notifications(batch_size=None, limit=None, now=None):
+    options = policy('notifications')
+    now = now or timezone.now()
+    batch_size = batch_size or config()['BATCH_SIZE']
+    expired = Notification.objects.filter(
+        Q(recipient__isnull=False, is_read=True, created_at__lt=now - timedelta(days=options['READ_AFTER_DAYS']))
+        | Q(recipient__isnull=True, created_at__lt=now - timedelta(days=options['BROADCAST_AFTER_DAYS']))
+    )
+    broadcasts = expired.filter(recipient__isnull=True).exists()
+    moved = move(expired, ArchivedNotification, archived_notification, batch_size, limit)
+    if broadcasts:
+        # Unread badges counted those broadcasts; bumping the version recomputes every badge
+        if not cache.add(notifications.BROADCAST_VERSION_KEY, 1, None):
+            cache.incr(notifications.BROADCAST_VERSION_KEY)
+    return moved
+
+
+def archive_orders(batch_size=None, limit=None, now=None):
+    options = policy('orders')
+    now = now or timezone.now()
+    batch_size = batch_size or config()['BATCH_SIZE']
+    expired = (
+        Order.objects.filter(status__in=options['STATUSES'], created_at__lt=now - timedelta(days=options['AFTER_DAYS']))
+        .select_related('cancellation_details')
+        .prefetch_related('items')
+    )
+    return move(expired, ArchivedOrder, archived_order, batch_size, limit)
+
+
+class OrderHistory:
+    """
+    Live orders followed by archived ones, as one sequence Django's Paginator
+    can count and slice. Only archived orders are read for pages past the live
+    ones. Archiving takes the oldest closed orders, so the result is newest
+    first, apart from open orders older than the retention window.
+    """
+
+    def __init__(self, live, archived):
+        self.live, self.archived = live, archived
+        self._live_count = None
+
+    def live_count(self):
+        if self._live_count is None:
+            self._live_count = self.live.count()
+        return self._live_count
+
+    def count(self):
+        return self.live_count() + self.archived.count()
+
+    def __getitem__(self, window):
+        start, stop = window.start or 0, window.stop
+        live = self.live_count()
+        rows = list(self.live[start:min(stop, live)]) if start < live else []
+        if stop > live:
+            rows += self.archived[max(start - live, 0):stop - live]
+        return rows
+
+
+POLICIES = {
+    'notifications': archive_notifications,
+    'orders': archive_orders,
+}
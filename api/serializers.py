@@ -1,12 +1,18 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Product, ProductImage, CartItem, Wishlist, Order, OrderItem, Address, CancelledOrder, Notification
+from .models import Product, ProductImage, CartItem, Wishlist, Order, OrderItem, Address, CancelledOrder, Notification, ArchivedOrder
 
 from dj_rest_auth.serializers import UserDetailsSerializer
-from allauth.socialaccount.models import SocialAccount
 from dj_rest_auth.serializers import PasswordResetSerializer
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.contrib.auth.forms import PasswordResetForm
+from django.db.models.functions import Lower
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .tokens import ClaimsRefreshToken, is_revoked, mark_rotated, revoke_user_tokens
+from . import inventory, popularity
 
 User = get_user_model()
 
@@ -23,23 +29,12 @@ class CustomUserSerializer(UserDetailsSerializer):
         read_only_fields = ('email', 'role', 'is_superuser', 'date_joined')
 
     def get_image(self, user):
-        try:
-            google_account = SocialAccount.objects.get(user=user, provider='google')
-            url = google_account.extra_data.get('picture')
-            
-            # Google Loop fix
-            if url and ('googleusercontent.com/profile/picture' in url or '/0' in url):
-                return None 
-
-            if url and url.startswith('http://'):
-                url = url.replace('http://', 'https://')
-            return url
-        except SocialAccount.DoesNotExist:
-            return None
+        # Denormalized from the Google SocialAccount (see User.apply_social_profile)
+        return user.avatar_url or None
 
     def get_name(self, user):
         full_name = f"{user.first_name} {user.last_name}".strip()
-        return full_name if full_name else user.username
+        return full_name or user.display_name or user.username
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -51,7 +46,8 @@ class UserSerializer(serializers.ModelSerializer):
 
     def validate_email(self, value):
         lower_email = value.lower()
-        if User.objects.filter(email__iexact=lower_email).exists():
+        # Lower() rather than __iexact so user_email_lower_idx is used
+        if User.objects.alias(email_lower=Lower('email')).filter(email_lower=lower_email).exists():
             raise serializers.ValidationError("This email is already registered.")
         return lower_email
 
@@ -80,10 +76,28 @@ class AdminUserSerializer(serializers.ModelSerializer):
 # ==========================================
 class ProductSerializer(serializers.ModelSerializer):
     images = serializers.SerializerMethodField()
+    trending_score = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = '__all__'
+        # count stays writable: update() turns it into a ledger adjustment
+        read_only_fields = ['units_sold', 'wishlist_count', 'low_stock_alerted_at']
+
+    def update(self, instance, validated_data):
+        # Stock isn't saved with the row (see Product.save_edits): an edit becomes a ledger adjustment
+        level = validated_data.pop('count', None)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save_edits()
+        if level is not None:
+            request = self.context.get('request')
+            inventory.set_level(instance, level, user=request.user if request else None)
+        return instance
+
+    def get_trending_score(self, obj):
+        # The stored value is on a growing scale (see api/popularity.py); clients see units decayed to now
+        return round(popularity.decayed(obj.trending_score), 2)
 
     def get_images(self, obj):
         request = self.context.get('request') 
@@ -150,43 +164,73 @@ class CancelledOrderSerializer(serializers.ModelSerializer):
         model = CancelledOrder
         fields = ['reason', 'cancelled_at', 'refund_status']
 
+def absolute_media_url(url, request):
+    """Snapshot image URLs are either external or site-relative (/media/...)."""
+    if not url:
+        return None
+    if not url.startswith('/'):
+        return url
+    if request:
+        return request.build_absolute_uri(url)
+    return f"http://127.0.0.1:8000{url}"
+
+class RecommendedProductSerializer(serializers.Serializer):
+    """Product card for a ProductAffinity from recommendations.for_product(); no further queries."""
+
+    def to_representation(self, affinity):
+        product = affinity.related
+        if product.image:
+            url = product.image.url
+        elif affinity.gallery_image:
+            url = default_storage.url(affinity.gallery_image)
+        else:
+            url = affinity.gallery_url
+        url = absolute_media_url(url, self.context.get('request'))
+        return {
+            'id': product.id,
+            'name': product.name,
+            'price': str(product.price),
+            'category': product.category,
+            'count': product.count,
+            'images': [{'id': 'main', 'url': url}] if url else [],
+            'score': affinity.score,
+        }
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
-    product_name = serializers.ReadOnlyField(source='product.name')
-    product_image = serializers.SerializerMethodField()
-    
+    """
+    Rendered from the line's snapshot (see OrderItem): no product or gallery
+    queries, and it shows what was bought rather than today's catalog entry.
+    `product` keeps the keys the frontend reads from the full ProductSerializer.
+    """
+
     class Meta:
         model = OrderItem
-        fields = ['product', 'product_name', 'product_image', 'quantity', 'price']
-
-    def get_product_image(self, obj):
-        if not obj.product: return None
-        
-        image_url = None
-        request = self.context.get('request')
-
-        if obj.product.image:
-            try:
-                image_url = obj.product.image.url
-            except: pass
-        
-        if not image_url:
-            images = getattr(obj.product, 'images', None) or getattr(obj.product, 'productimage_set', None)
-            if images and images.exists():
-                first_img = images.first()
-                if first_img.image:
-                    try:
-                        image_url = first_img.image.url
-                    except: pass
-                elif first_img.external_url:
-                    return first_img.external_url 
-
-        if image_url:
-            if request:
-                return request.build_absolute_uri(image_url)
-            return f"http://127.0.0.1:8000{image_url}"
-
-        return None
+        fields = ['quantity', 'price']
+
+    def to_representation(self, obj):
+        if obj.product_name:
+            snapshot = {'product_name': obj.product_name, 'product_image': obj.product_image,
+                        'product_category': obj.product_category}
+        else:
+            # Not backfilled yet: read the live product (a few queries per line)
+            snapshot = OrderItem.snapshot(obj.product)
+        return order_line(obj.product_id, snapshot, super().to_representation(obj), self.context.get('request'))
+
+def order_line(product_id, snapshot, data, request):
+    """An order line as the frontend reads it; `data` holds quantity and price. Shared with archived orders."""
+    image_url = absolute_media_url(snapshot['product_image'], request)
+    return {
+        'product': {
+            'id': product_id,
+            'name': snapshot['product_name'],
+            'category': snapshot['product_category'],
+            'price': data['price'],
+            'images': [{'id': 'main', 'url': image_url}] if image_url else [],
+        },
+        'product_name': snapshot['product_name'],
+        'product_image': image_url,
+        **data,
+    }
         
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
@@ -200,6 +244,63 @@ class OrderSerializer(serializers.ModelSerializer):
             'shipping_details', 'items', 'payment_method', 'cancellation_details'
         ]
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """
+    Order history rows. Needs the item_count and thumbnail annotations from
+    OrderViewSet.get_queryset; lines and the user are only loaded on retrieve.
+    """
+    item_count = serializers.IntegerField(read_only=True)
+    thumbnail = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = ['id', 'status', 'total_amount', 'created_at', 'payment_method', 'item_count', 'thumbnail']
+
+    def get_thumbnail(self, order):
+        return absolute_media_url(order.thumbnail, self.context.get('request'))
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    """An ArchivedOrder in OrderSerializer's shape, plus `archived: true`; everything but the user is in the row."""
+    user = CustomUserSerializer(read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ['id', 'user', 'total_amount', 'status', 'created_at', 'shipping_details', 'payment_method']
+
+    def to_representation(self, order):
+        request = self.context.get('request')
+        data = super().to_representation(order)
+        data['items'] = [
+            order_line(line['product_id'], line, {'quantity': line['quantity'], 'price': line['price']}, request)
+            for line in order.items
+        ]
+        cancellation = order.cancellation
+        data['cancellation_details'] = cancellation and {
+            'reason': cancellation['reason'],
+            'cancelled_at': cancellation['cancelled_at'],
+            'refund_status': cancellation['refund_status'],
+        }
+        data['archived'] = True
+        return data
+
+class ArchivedOrderSummarySerializer(serializers.ModelSerializer):
+    """OrderSummarySerializer's fields for ?archived=1 history pages."""
+    item_count = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ['id', 'status', 'total_amount', 'created_at', 'payment_method', 'item_count', 'thumbnail']
+
+    def get_item_count(self, order):
+        return len(order.items)
+
+    def get_thumbnail(self, order):
+        return absolute_media_url(order.items[0]['product_image'] if order.items else '', self.context.get('request'))
+
+    def to_representation(self, order):
+        return {**super().to_representation(order), 'archived': True}
+
 class AdminOrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     user_email = serializers.ReadOnlyField(source='user.email')
@@ -209,6 +310,15 @@ class AdminOrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['id', 'user_email', 'username', 'total_amount', 'status', 'created_at', 'shipping_details', 'items']
 
+class AdminArchivedOrderSerializer(ArchivedOrderSerializer):
+    """An ArchivedOrder in AdminOrderSerializer's shape (plus cancellation_details and `archived: true`)."""
+    user = None
+    user_email = serializers.ReadOnlyField(source='user.email')
+    username = serializers.ReadOnlyField(source='user.username')
+
+    class Meta(ArchivedOrderSerializer.Meta):
+        fields = ['id', 'user_email', 'username', 'total_amount', 'status', 'created_at', 'shipping_details']
+
 
 # ==========================================
 #  5. ADDRESS & PASSWORD RESET
@@ -244,6 +354,46 @@ class CustomPasswordResetSerializer(PasswordResetSerializer):
 
 
 class NotificationSerializer(serializers.ModelSerializer):
+    is_read = serializers.SerializerMethodField()
+
     class Meta:
         model = Notification
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+    def get_is_read(self, obj):
+        # Per-user read state annotated by Notification.objects.for_user()
+        return getattr(obj, 'has_read', obj.is_read)
+
+
+# ==========================================
+#  6. JWT REFRESH
+# ==========================================
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Re-reads the user on refresh so the new tokens carry current claims, honours
+    revocations, and rejects refresh tokens that were already rotated. A replay
+    means the token leaked, so it also revokes every token issued to the user so
+    far, including the ones rotated from it.
+    """
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(pk=refresh.get(jwt_settings.USER_ID_CLAIM)).first()
+        if not jwt_settings.USER_AUTHENTICATION_RULE(user) or user.is_blocked or is_revoked(user.pk, refresh):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        refresh.set_user_claims(user)
+        data = {'access': str(refresh.access_token)}
+
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            # Replaces simplejwt's token_blacklist app (and its ever-growing outstanding-token tables)
+            if jwt_settings.BLACKLIST_AFTER_ROTATION and not mark_rotated(refresh):
+                revoke_user_tokens(user)
+                raise AuthenticationFailed('Token has already been used', 'token_not_valid')
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+
+        return data
\ No newline at end of file
@@ -1,29 +1,13 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_init, post_delete
 from django.contrib.auth.signals import user_logged_in
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
 from django.contrib.auth import get_user_model
-import threading
+from allauth.socialaccount.models import SocialAccount
+from .models import Notification, Order, Product, Wishlist
+from . import inventory, notifications, events, mail, popularity, tokens
 
 User = get_user_model()
 
-def send_welcome_email_thread(user_email, username):
-    try:
-        subject = 'Welcome to EchoBay!'
-        message = f'Hi {username},\n\nThank you for registering with EchoBay. We are excited to have you on board!\n\nHappy Shopping!'
-        
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user_email],
-            fail_silently=False,
-        )
-        print(f"Welcome email sent to {user_email}")
-    except Exception as e:
-        print(f"Failed to send welcome email: {e}")
-
 @receiver(post_save, sender=User)
 def on_user_signup(sender, instance, created, **kwargs):
     if created and instance.email:
@@ -31,30 +15,15 @@ def on_user_signup(sender, instance, created, **kwargs):
         
         display_name = instance.name if hasattr(instance, 'name') and instance.name else instance.username
         
-        email_thread = threading.Thread(
-            target=send_welcome_email_thread, 
-            args=(instance.email, display_name)
+        mail.send_mail(
+            'Welcome to EchoBay!',
+            f'Hi {display_name},\n\nThank you for registering with EchoBay. We are excited to have you on board!\n\nHappy Shopping!',
+            [instance.email],
+            durable=True,
         )
-        email_thread.start()
 
 
 # LOGIN ALERT (Login)
-def send_login_email_thread(user_email, username):
-    try:
-        subject = 'Security Alert: New Login Detected'
-        message = f'Hi {username},\n\nYou have successfully logged into your EchoBay account.\n\nIf this was not you, please contact support immediately.'
-        
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user_email],
-            fail_silently=False,
-        )
-        print(f"Login email sent to {user_email}")
-    except Exception as e:
-        print(f"Failed to send login email: {e}")
-
 @receiver(user_logged_in)
 def on_user_logged_in(sender, request, user, **kwargs):
     print(f"User logged in: {user.username}")
@@ -65,8 +34,88 @@ def on_user_logged_in(sender, request, user, **kwargs):
         full_name = f"{first} {last}".strip()
         display_name = full_name if full_name else user.username
 
-        email_thread = threading.Thread(
-            target=send_login_email_thread, 
-            args=(user.email, display_name)
+        mail.send_mail(
+            'Security Alert: New Login Detected',
+            f'Hi {display_name},\n\nYou have successfully logged into your EchoBay account.\n\nIf this was not you, please contact support immediately.',
+            [user.email],
         )
-        email_thread.start()
\ No newline at end of file
+
+
+# TOKEN REVOCATION (fields baked into JWT claims or that should end sessions)
+AUTH_FIELDS = ('password', 'is_active', 'is_blocked', 'is_superuser', 'role')
+
+@receiver(post_init, sender=User)
+def remember_auth_fields(sender, instance, **kwargs):
+    instance._auth_snapshot = tuple(instance.__dict__.get(field) for field in AUTH_FIELDS)
+
+@receiver(post_save, sender=User)
+def on_auth_fields_changed(sender, instance, created, update_fields=None, **kwargs):
+    snapshot = tuple(instance.__dict__.get(field) for field in AUTH_FIELDS)
+    if created:
+        instance._auth_snapshot = snapshot
+        return
+    # Fields that were deferred at load time show up as None in the old snapshot; only compare known values
+    changed = any(
+        old is not None and old != new
+        for old, new in zip(instance._auth_snapshot, snapshot)
+    )
+    instance._auth_snapshot = snapshot
+    if changed:
+        tokens.revoke_user_tokens(instance)
+
+
+# UNREAD BADGE COUNTERS
+@receiver(post_save, sender=Notification)
+def on_notification_created(sender, instance, created, **kwargs):
+    if created:
+        notifications.on_notification_created(instance)
+        events.publish_notification(instance)
+
+
+# REAL-TIME ORDER STATUS (pushed to /api/events/)
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    # __dict__ lookup so a deferred status field doesn't trigger a query
+    instance._loaded_status = instance.__dict__.get('status')
+
+@receiver(post_save, sender=Order)
+def on_order_status_changed(sender, instance, created, **kwargs):
+    if created or instance.status != instance._loaded_status:
+        events.publish_order_status(instance.id, instance.user_id, instance.status)
+        if not created and instance._loaded_status is not None:
+            popularity.on_status_changed(instance, instance._loaded_status)
+        instance._loaded_status = instance.status
+
+
+# STOCK LEDGER (a new product's stock is its first movement; later changes go through api/inventory.py)
+@receiver(post_save, sender=Product)
+def on_product_created(sender, instance, created, **kwargs):
+    if created:
+        inventory.record_opening([instance])
+
+
+# POPULARITY COUNTERS (Product.wishlist_count; sales are recorded at checkout)
+@receiver(post_save, sender=Wishlist)
+def on_wishlist_added(sender, instance, created, **kwargs):
+    if created:
+        popularity.record_wishlist(instance.product_id, 1)
+
+@receiver(post_delete, sender=Wishlist)
+def on_wishlist_removed(sender, instance, **kwargs):
+    popularity.record_wishlist(instance.product_id, -1)
+
+
+# SOCIAL PROFILE PROJECTION (avatar/name copied onto User)
+@receiver(post_save, sender=SocialAccount)
+def on_social_account_saved(sender, instance, **kwargs):
+    if instance.provider != 'google':
+        return
+    # Same object allauth/dj-rest-auth hold, so the login response sees the new values too
+    user = instance.user
+    user.apply_social_profile(instance.extra_data)
+    User.objects.filter(pk=user.pk).update(avatar_url=user.avatar_url, display_name=user.display_name)
+
+@receiver(post_delete, sender=SocialAccount)
+def on_social_account_removed(sender, instance, **kwargs):
+    if instance.provider == 'google':
+        User.objects.filter(pk=instance.user_id).update(avatar_url='', display_name='')
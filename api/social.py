@@ -0,0 +1,26 @@
+"""
+Google login. Kept out of api/views.py because allauth's provider views and
+dj-rest-auth's registration views are slow to import; api/urls.py routes to it
+with lazy_view(), so they're only imported when someone signs in with Google.
+"""
+from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
+from allauth.socialaccount.providers.oauth2.client import OAuth2Client
+from dj_rest_auth.registration.views import SocialLoginView
+
+from .serializers import CustomUserSerializer
+from .tokens import ClaimsRefreshToken
+
+
+class GoogleLogin(SocialLoginView):
+    adapter_class = GoogleOAuth2Adapter
+    client_class = OAuth2Client
+    callback_url = "https://project-ui-react.vercel.app"
+
+    def get_response(self):
+        response = super().get_response()
+        user = self.user
+        refresh = ClaimsRefreshToken.for_user(user)
+        response.data['access'] = str(refresh.access_token)
+        response.data['refresh'] = str(refresh)
+        response.data['user'] = CustomUserSerializer(user).data
+        return response
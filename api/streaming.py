@@ -0,0 +1,58 @@
+import asyncio
+import json
+import os
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .authentication import authenticate_async
+from .events import BROADCAST_CHANNEL, get_broker, user_channel
+
+KEEPALIVE_SECONDS = 15
+
+
+def format_sse(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+async def event_stream(request):
+    """
+    Server-sent events for the logged-in user: new notifications and order status
+    changes. Must be served by the ASGI application (uvicorn/daphne) – each idle
+    client is just a coroutine and a small queue, not a worker thread.
+    """
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI (gunicorn sync workers) every open stream would pin a worker
+        # for as long as the tab stays open. Clients fall back to polling.
+        return JsonResponse({'detail': 'Event streaming is only served by the ASGI application.'}, status=503)
+
+    user = await authenticate_async(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    channels = [user_channel(user.pk)]
+    if not user.is_superuser:
+        channels.append(BROADCAST_CHANNEL)
+
+    broker = get_broker()
+    subscription = broker.subscribe(channels)
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            yield format_sse('ready', {'connections': broker.connection_count(), 'pid': os.getpid()})
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event['type'], event['data'])
+        finally:
+            # Runs when the client disconnects and Django cancels the stream
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
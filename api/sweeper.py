@@ -0,0 +1,137 @@
+"""
+Periodic housekeeping run by `manage.py sweep_orders` (from cron, on any
+number of nodes at once):
+
+- cancel_stale_orders(): orders still 'pending_payment' PENDING_TTL_HOURS
+  after checkout are cancelled in chunks of BATCH_SIZE, read oldest first off
+  order_status_created_idx. Each chunk is claimed the way api.jobs claims
+  jobs: SELECT ... FOR UPDATE SKIP LOCKED where the database supports it,
+  otherwise a conditional UPDATE per order. So two sweepers never cancel the
+  same order. The claimed chunk
+  is then handled set-wise: its stock goes back in one UPDATE
+  (inventory.restock_orders), and its CancelledOrder rows are a single
+  INSERT.
+- alert_low_stock(): active products at or below LOW_STOCK_THRESHOLD that
+  haven't been reported yet are claimed by stamping low_stock_alerted_at.
+  Every admin gets one Notification that lists them all. The stamp is
+  cleared once a product is back above the threshold, so each shortage is
+  reported once, however often or wherever the sweeper runs.
+
+A customer can still pay an order after it was swept: VerifyPaymentView only
+moves orders that are still 'pending_payment', and hands a payment for a
+cancelled order to record_late_payment(), which flags it for refund.
+
+Configured by settings.SWEEPER (see DEFAULTS).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import events, inventory, popularity
+from .models import CancelledOrder, Notification, Order, Product, User
+
+DEFAULTS = {
+    'PENDING_TTL_HOURS': 24,
+    'BATCH_SIZE': 200,
+    'LOW_STOCK_THRESHOLD': 5,  # count at or below this is "low"; 0 = only out of stock
+    'LOW_STOCK_LIST_MAX': 50,  # products named in the notification; the rest are counted
+}
+
+CANCEL_REASON = 'Payment not completed in time'
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'SWEEPER', {})}
+
+
+def _claim(stale, batch_size):
+    """Flip up to batch_size stale orders to 'cancelled'; returns the ids this process won."""
+    if connection.features.has_select_for_update_skip_locked:
+        ids = list(stale.select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size])
+        Order.objects.filter(pk__in=ids).update(status='cancelled')
+        return ids
+    # No row locks (SQLite): whoever flips the status first owns the order
+    return [
+        pk for pk in stale.values_list('pk', flat=True)[:batch_size]
+        if Order.objects.filter(pk=pk, status='pending_payment').update(status='cancelled')
+    ]
+
+
+def cancel_stale_orders(ttl=None, batch_size=None):
+    """Returns the number of orders this run cancelled."""
+    options = config()
+    cutoff = timezone.now() - (ttl if ttl is not None else timedelta(hours=options['PENDING_TTL_HOURS']))
+    batch_size = batch_size or options['BATCH_SIZE']
+    stale = Order.objects.filter(status='pending_payment', created_at__lt=cutoff).order_by('created_at', 'pk')
+
+    cancelled = 0
+    while True:
+        with transaction.atomic():
+            ids = _claim(stale, batch_size)
+            if not ids:
+                # Nothing left, or what's left is being swept by another node right now
+                break
+            # .update() skips the Order signals, so their work is done here, for the whole chunk
+            orders = list(Order.objects.filter(pk__in=ids).only('pk', 'user_id', 'created_at'))
+            CancelledOrder.objects.bulk_create(
+                [CancelledOrder(order=order, reason=CANCEL_REASON, refund_status='not_applicable') for order in orders],
+                ignore_conflicts=True,
+            )
+            inventory.restock_orders(orders)
+            popularity.record_cancellations(orders)
+        for order in orders:
+            events.publish_order_status(order.pk, order.user_id, 'cancelled')
+        cancelled += len(orders)
+    return cancelled
+
+
+def notify_admins(title, message):
+    # Personal notifications (not a broadcast): only admins should see these. create() keeps badges and SSE current.
+    for admin in User.objects.filter(is_superuser=True, is_active=True).only('pk'):
+        Notification.objects.create(recipient=admin, title=title, message=message)
+
+
+def record_late_payment(order_id, payment_id):
+    """
+    A payment verified after its order was cancelled: the payment id is kept on
+    the order, the cancellation is marked refund 'pending' and admins are told.
+    Returns False if the order isn't cancelled.
+    """
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order_id, status='cancelled').update(razorpay_payment_id=payment_id):
+            return False
+        CancelledOrder.objects.filter(order_id=order_id).update(refund_status='pending')
+    notify_admins(
+        f"Refund needed: order #{order_id}",
+        f"Payment {payment_id} was completed after order #{order_id} had been cancelled.",
+    )
+    return True
+
+
+def alert_low_stock(threshold=None):
+    """Returns the products this run reported (already-reported shortages are skipped)."""
+    options = config()
+    threshold = options['LOW_STOCK_THRESHOLD'] if threshold is None else threshold
+    # Restocked since the last report: report it again next time it runs low
+    Product.objects.filter(low_stock_alerted_at__isnull=False, count__gt=threshold).update(low_stock_alerted_at=None)
+
+    # The stamp doubles as this run's claim: a concurrent sweeper's UPDATE skips rows that already have one
+    stamp = timezone.now()
+    claimed = Product.objects.filter(is_active=True, count__lte=threshold, low_stock_alerted_at__isnull=True).update(
+        low_stock_alerted_at=stamp
+    )
+    if not claimed:
+        return []
+    products = list(
+        Product.objects.filter(low_stock_alerted_at=stamp).order_by('count', 'pk').values_list('pk', 'name', 'count')
+    )
+    listed = products[:options['LOW_STOCK_LIST_MAX']]
+    lines = [f"- {name} (#{pk}): {'out of stock' if count == 0 else f'{count} left'}" for pk, name, count in listed]
+    if len(products) > len(listed):
+        lines.append(f"...and {len(products) - len(listed)} more")
+    title = f"Low stock: {len(products)} product(s)"
+    message = f"At or below {threshold} in stock:\n" + '\n'.join(lines)
+    notify_admins(title, message)
+    return products
@@ -0,0 +1,15 @@
+# Background job handlers, run by `manage.py run_jobs` (see api/jobs.py)
+from django.core.mail import EmailMessage
+
+from .jobs import job
+from . import mail, recommendations
+
+
+@job('mail.send')
+def send_email(subject, message, recipient_list, from_email=None):
+    mail.get_dispatcher().deliver([EmailMessage(subject, message, from_email, recipient_list)])
+
+
+@job('recommendations.refresh')
+def refresh_recommendations(product_ids):
+    recommendations.refresh(product_ids)
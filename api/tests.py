@@ -1,3 +1,820 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail as django_mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from allauth.socialaccount.models import SocialAccount
+from rest_framework.test import APIClient
+
+from . import (
+    compression, db_routers, events, inventory, jobs, mail, media, popularity, profiling, recommendations, retention,
+    sweeper,
+)
+from .management.commands.profile_startup import LAZY_MODULES
+from .models import (
+    CancelledOrder, CartItem, Job, Notification, NotificationReceipt, Order, OrderItem, Product, ProductAffinity,
+    RotatedRefreshToken, User,
+)
+from .serializers import CustomUserSerializer
+from .tokens import ClaimsRefreshToken
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+    return client
+
+
+def place_order(user, product, quantity, status='pending_payment'):
+    """What checkout does, without the cart."""
+    order = Order.objects.create(user=user, total_amount=product.price * quantity, shipping_details={}, status=status)
+    OrderItem.for_product(order, product, quantity).save()
+    inventory.sell(order, [(product.pk, quantity)])
+    popularity.record_sale([(product.pk, quantity)], order.created_at)
+    return order
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret-pass-1', role='admin')
+
+    def test_customer_token_is_refused_on_admin_routes(self):
+        response = client_for(self.customer).get('/api/admin/users/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_admin_token_is_allowed_on_admin_routes(self):
+        response = client_for(self.admin).get('/api/admin/users/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_user_has_the_claimed_fields(self):
+        response = client_for(self.customer).get('/api/user/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['username'], 'customer')
+
+
+class RefreshTokenRotationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)  # the revocations entry would outlive this test's users
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        self.login_token = str(ClaimsRefreshToken.for_user(self.customer))
+
+    def refresh(self, token):
+        return APIClient().post('/api/token/refresh/', {'refresh': token}, format='json')
+
+    def test_replayed_refresh_token_revokes_the_family(self):
+        rotated = self.refresh(self.login_token)
+        self.assertEqual(rotated.status_code, 200)
+        # A leaked token is replayed later, after the rotated tokens were issued
+        later = timezone.now() + timedelta(seconds=2)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(self.refresh(self.login_token).status_code, 401)
+        self.assertEqual(self.refresh(rotated.data['refresh']).status_code, 401)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {rotated.data['access']}")
+        self.assertEqual(client.get('/api/user/').status_code, 401)
+
+    def test_replay_is_caught_without_the_cache(self):
+        self.assertEqual(self.refresh(self.login_token).status_code, 200)
+        cache.clear()
+        self.assertEqual(self.refresh(self.login_token).status_code, 401)
+
+    def test_prune_removes_only_expired_records(self):
+        now = timezone.now()
+        RotatedRefreshToken.objects.create(jti='expired', expires_at=now - timedelta(hours=1))
+        RotatedRefreshToken.objects.create(jti='live', expires_at=now + timedelta(hours=1))
+        call_command('prune_tokens', batch_size=1, stdout=StringIO())
+        self.assertEqual(list(RotatedRefreshToken.objects.values_list('jti', flat=True)), ['live'])
+
+
+class SocialProfileTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        self.account = SocialAccount.objects.create(
+            user=self.customer, provider='google', uid='g-1',
+            extra_data={'picture': 'http://lh3.example.com/a.jpg', 'name': 'Cust Omer'},
+        )
+
+    def profile(self):
+        return User.objects.values_list('avatar_url', 'display_name').get(pk=self.customer.pk)
+
+    def test_google_account_is_projected_onto_the_user(self):
+        self.assertEqual(self.profile(), ('https://lh3.example.com/a.jpg', 'Cust Omer'))
+        self.account.extra_data = {'picture': 'https://lh3.example.com/b.jpg', 'name': 'Renamed'}
+        self.account.save()
+        self.assertEqual(self.profile(), ('https://lh3.example.com/b.jpg', 'Renamed'))
+
+    def test_removing_the_account_clears_the_projection(self):
+        self.account.delete()
+        self.assertEqual(self.profile(), ('', ''))
+
+    def test_other_providers_are_ignored(self):
+        SocialAccount.objects.create(user=self.customer, provider='github', uid='gh-1', extra_data={'name': 'Other'})
+        self.assertEqual(self.profile(), ('https://lh3.example.com/a.jpg', 'Cust Omer'))
+
+    def test_user_serialization_needs_no_queries(self):
+        user = User.objects.get(pk=self.customer.pk)
+        with self.assertNumQueries(0):
+            data = CustomUserSerializer(user).data
+        self.assertEqual((data['image'], data['name']), ('https://lh3.example.com/a.jpg', 'Cust Omer'))
+
+
+class SweeperTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret-pass-1', role='admin')
+        self.product = Product.objects.create(name='Mug', description='', price=100, count=10, category='Kitchen')
+        self.order = place_order(self.customer, self.product, 3)
+
+    def test_stale_order_is_cancelled_exactly_once(self):
+        self.assertEqual(sweeper.cancel_stale_orders(ttl=timedelta(0)), 1)
+        self.assertEqual(sweeper.cancel_stale_orders(ttl=timedelta(0)), 0)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 10)
+        self.assertEqual(self.product.units_sold, 0)
+        self.assertEqual(CancelledOrder.objects.get(order=self.order).refund_status, 'not_applicable')
+        self.assertFalse(list(inventory.mismatches()))
+
+    @mock.patch('api.payments.get_client')
+    def test_payment_after_sweep_is_flagged_for_refund(self, get_client):
+        sweeper.cancel_stale_orders(ttl=timedelta(0))
+        response = client_for(self.customer).post('/api/payment/verify/', {
+            'order_id': self.order.pk, 'razorpay_order_id': 'order_1',
+            'razorpay_payment_id': 'pay_1', 'razorpay_signature': 'sig',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 409)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.razorpay_payment_id), ('cancelled', 'pay_1'))
+        self.assertEqual(CancelledOrder.objects.get(order=self.order).refund_status, 'pending')
+        self.assertTrue(Notification.objects.filter(recipient=self.admin, title__contains=f'#{self.order.pk}').exists())
+
+    @mock.patch('api.payments.get_client')
+    def test_payment_in_time_moves_the_order_on(self, get_client):
+        response = client_for(self.customer).post('/api/payment/verify/', {
+            'order_id': self.order.pk, 'razorpay_order_id': 'order_1',
+            'razorpay_payment_id': 'pay_1', 'razorpay_signature': 'sig',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'processing')
+        self.assertEqual(sweeper.cancel_stale_orders(ttl=timedelta(0)), 0)
+
+
+class ProductEditTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret-pass-1', role='admin')
+        self.product = Product.objects.create(name='Mug', description='', price=100, count=10, category='Kitchen')
+
+    def test_edit_keeps_sales_made_since_the_row_was_read(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        Product.objects.filter(pk=self.product.pk).update(units_sold=3)
+        response = client_for(self.admin).patch(f'/api/admin/products/{stale.pk}/', {'price': 120}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.price, self.product.units_sold), (120, 3))
+
+    def test_stock_edit_is_a_ledger_adjustment(self):
+        client_for(self.admin).patch(f'/api/admin/products/{self.product.pk}/', {'count': 4}, format='json')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 4)
+        self.assertIn(-6, self.product.stock_movements.values_list('delta', flat=True))
+
+    def test_explicit_update_fields_are_saved(self):
+        self.product.count = 7
+        self.product.save(update_fields=['count'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 7)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        self.product = Product.objects.create(name='Mug', description='', price=100, count=10, category='Kitchen')
+        CartItem.objects.create(user=self.customer, product=self.product, quantity=2)
+
+    def checkout(self):
+        return client_for(self.customer).post('/api/orders/checkout/', {'shipping_details': {'city': 'Pune'}, 'total_amount': 200}, format='json')
+
+    def test_checkout_sells_and_clears_the_cart(self):
+        self.assertEqual(self.checkout().status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 8)
+        self.assertFalse(CartItem.objects.filter(user=self.customer).exists())
+
+    def test_failure_part_way_rolls_everything_back(self):
+        with mock.patch('api.popularity.record_sale', side_effect=RuntimeError('boom')):
+            self.assertEqual(self.checkout().status_code, 500)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 10)
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(CartItem.objects.filter(user=self.customer).exists())
+
+
+class CancelOrderTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        self.product = Product.objects.create(name='Mug', description='', price=100, count=10, category='Kitchen')
+        self.order = place_order(self.customer, self.product, 3)
+
+    def cancel(self):
+        return client_for(self.customer).post(f'/api/orders/{self.order.pk}/cancel/', {'reason': 'Changed mind'}, format='json')
+
+    def assertRestoredOnce(self):
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.count, self.product.units_sold), (10, 0))
+        self.assertEqual(self.product.trending_score, 0)
+        self.assertEqual(CancelledOrder.objects.filter(order=self.order).count(), 1)
+
+    def test_cancelling_twice_gives_stock_back_once(self):
+        self.assertEqual(self.cancel().status_code, 200)
+        self.assertEqual(self.cancel().status_code, 400)
+        self.assertRestoredOnce()
+
+    def test_cancelling_a_swept_order_is_refused(self):
+        sweeper.cancel_stale_orders(ttl=timedelta(0))
+        self.assertEqual(self.cancel().status_code, 400)
+        self.assertRestoredOnce()
+
+    def test_restock_is_idempotent(self):
+        Order.objects.filter(pk=self.order.pk).update(status='cancelled')
+        self.assertEqual(len(inventory.restock(self.order)), 1)
+        self.assertEqual(inventory.restock(self.order), [])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count, 10)
+
+
+@override_settings(RETENTION={'POLICIES': {'orders': {'AFTER_DAYS': 30}}})
+class ArchivedOrderTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret-pass-1', role='admin')
+        self.product = Product.objects.create(name='Mug', description='', price=100, count=10, category='Kitchen')
+        self.old = place_order(self.customer, self.product, 2, status='delivered')
+        Order.objects.filter(pk=self.old.pk).update(created_at=timezone.now() - timedelta(days=60))
+        self.recent = place_order(self.customer, self.product, 1, status='delivered')
+        self.assertEqual(retention.archive_orders(), 1)
+
+    def test_archive_round_trip(self):
+        self.assertFalse(Order.objects.filter(pk=self.old.pk).exists())
+        response = client_for(self.customer).get(f'/api/orders/{self.old.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['archived'])
+        self.assertEqual(response.data['items'][0]['product']['name'], 'Mug')
+        self.assertEqual(response.data['items'][0]['quantity'], 2)
+
+    def test_history_lists_live_then_archived_orders(self):
+        response = client_for(self.customer).get('/api/orders/', {'page_size': 1})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([order['id'] for order in response.data['results']], [self.recent.pk])
+        response = client_for(self.customer).get('/api/orders/', {'page_size': 1, 'page': 2})
+        self.assertEqual([(order['id'], order['archived']) for order in response.data['results']], [(self.old.pk, True)])
+
+    def test_admin_endpoint_falls_back_to_the_archive(self):
+        response = client_for(self.admin).get(f'/api/admin/orders/{self.old.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['username'], 'customer')
+        response = client_for(self.admin).get('/api/admin/orders/', {'archived': 1, 'user': self.customer.pk})
+        self.assertEqual([order['id'] for order in response.data], [self.old.pk])
+
+    def test_archived_orders_still_count_for_popularity(self):
+        popularity.rebuild()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.units_sold, 3)
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hour_ago = timezone.now() - timedelta(hours=1)
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'secret-pass-1')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'secret-pass-1')
+        User.objects.update(date_joined=timezone.now() - timedelta(days=1))
+        self.broadcast = self.notify(None, 'Sale', at=self.hour_ago)
+
+    def notify(self, recipient, title, at=None):
+        notification = Notification.objects.create(recipient=recipient, title=title, message='')
+        if at:
+            Notification.objects.filter(pk=notification.pk).update(created_at=at)
+        return notification
+
+    def listing(self, user):
+        return {n['title']: n['is_read'] for n in client_for(user).get('/api/notifications/').data['results']}
+
+    def unread(self, user):
+        return client_for(user).get('/api/notifications/unread-count/').data['unread_count']
+
+    def test_broadcasts_reach_only_users_who_joined_before_them(self):
+        carol = User.objects.create_user('carol', 'carol@example.com', 'secret-pass-1')
+        self.assertEqual(self.listing(self.alice), {'Sale': False})
+        self.assertEqual(self.listing(carol), {})
+        self.notify(None, 'Later')
+        self.assertEqual(self.listing(carol), {'Later': False})
+
+    def test_broadcast_read_state_is_per_user(self):
+        client_for(self.alice).post(f'/api/notifications/{self.broadcast.pk}/read/')
+        self.assertEqual(self.listing(self.alice), {'Sale': True})
+        self.assertEqual(self.listing(self.bob), {'Sale': False})
+        self.assertEqual(NotificationReceipt.objects.get().user, self.alice)
+
+    def test_read_all_sets_a_watermark_instead_of_receipts(self):
+        self.notify(self.alice, 'Shipped', at=self.hour_ago)
+        client_for(self.alice).post('/api/notifications/read/', {'all': True}, format='json')
+        self.notify(None, 'Later')
+        self.assertEqual(self.listing(self.alice), {'Sale': True, 'Shipped': True, 'Later': False})
+        self.assertFalse(NotificationReceipt.objects.exists())
+        self.assertIsNotNone(User.objects.get(pk=self.alice.pk).notifications_read_at)
+
+    def test_unread_count_follows_reads_and_new_broadcasts(self):
+        personal = self.notify(self.alice, 'Shipped')
+        self.assertEqual(self.unread(self.alice), 2)
+        response = client_for(self.alice).post('/api/notifications/read/', {'ids': [personal.pk, self.broadcast.pk]}, format='json')
+        self.assertEqual(response.data['unread_count'], 0)
+        self.assertEqual(self.unread(self.bob), 1)
+        self.notify(None, 'Later')
+        self.assertEqual((self.unread(self.alice), self.unread(self.bob)), (1, 2))
+        client_for(self.alice).post('/api/notifications/read/', {'all': True}, format='json')
+        self.assertEqual(self.unread(self.alice), 0)
+
+    def test_cursor_pages_run_newest_first_without_repeats(self):
+        for minutes in range(5):
+            self.notify(self.alice, f'n{minutes}', at=timezone.now() - timedelta(minutes=minutes))
+        titles, url = [], '/api/notifications/?page_size=2'
+        while url:
+            page = client_for(self.alice).get(url).data
+            titles += [n['title'] for n in page['results']]
+            url = page['next']
+        self.assertEqual(titles, ['n0', 'n1', 'n2', 'n3', 'n4', 'Sale'])
+
+
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+
+    def login(self, password, ip, **headers):
+        return APIClient().post('/api/login/', {'username': 'customer', 'password': password}, format='json',
+                                REMOTE_ADDR=ip, **headers)
+
+    def test_guessing_one_account_is_throttled(self):
+        for _ in range(5):
+            self.assertEqual(self.login('wrong', '10.0.0.1').status_code, 401)
+        self.assertEqual(self.login('wrong', '10.0.0.1').status_code, 429)
+
+    def test_guessing_from_elsewhere_doesnt_lock_the_owner_out(self):
+        for _ in range(6):
+            self.login('wrong', '10.0.0.1')
+        self.assertEqual(self.login('secret-pass-1', '10.0.0.2').status_code, 200)
+
+    def test_forged_forwarded_for_doesnt_reset_the_limit(self):
+        statuses = [self.login('wrong', '10.0.0.1', HTTP_X_FORWARDED_FOR=f'192.0.2.{i}').status_code for i in range(6)]
+        self.assertEqual(statuses[-1], 429)
+
+    def test_guessing_from_many_addresses_hits_the_account_limit(self):
+        rates = {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'login_account_total': '3/min'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            statuses = [self.login('wrong', f'10.0.1.{i}').status_code for i in range(4)]
+        self.assertEqual(statuses, [401, 401, 401, 429])
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        self.token = str(ClaimsRefreshToken.for_user(self.customer).access_token)
+        events.get_broker.cache_clear()
+        self.addCleanup(events.get_broker.cache_clear)
+
+    async def open_stream(self):
+        response = await AsyncClient().get('/api/events/', {'token': self.token})
+        self.assertEqual(response.status_code, 200)
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 5000\n\n')
+        self.assertIn(b'event: ready', await anext(chunks))
+        return chunks
+
+    async def test_published_event_reaches_the_stream(self):
+        chunks = await self.open_stream()
+        events.get_broker().publish(events.user_channel(self.customer.pk), {'type': 'order_status', 'data': {'status': 'shipped'}})
+        self.assertEqual(await anext(chunks), b'event: order_status\ndata: {"status": "shipped"}\n\n')
+        await chunks.aclose()
+
+    async def test_disconnect_unsubscribes(self):
+        chunks = await self.open_stream()
+        self.assertEqual(events.get_broker().connection_count(), 1)
+        # What the ASGI handler does when the client goes away
+        waiting = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(events.get_broker().connection_count(), 0)
+
+    def test_wsgi_requests_are_refused(self):
+        response = self.client.get('/api/events/', {'token': self.token})
+        self.assertEqual(response.status_code, 503)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        self.products = [
+            Product.objects.create(name=f'P{i}', description='', price=10, count=100, category='Kitchen') for i in range(5)
+        ]
+        # Overlapping baskets with tied scores, so the tie-break by id matters
+        for basket in ([0, 1, 2], [0, 1], [0, 2], [1, 2, 3], [3, 4], [0, 4]):
+            self.order([self.products[i] for i in basket])
+
+    def order(self, products):
+        order = Order.objects.create(user=self.customer, total_amount=10, shipping_details={}, status='processing')
+        OrderItem.objects.bulk_create([OrderItem.for_product(order, product, 1) for product in products])
+
+    def table(self):
+        return list(ProductAffinity.objects.order_by('product_id', 'rank').values_list('product_id', 'rank', 'related_id', 'score'))
+
+    def test_numpy_and_python_builds_rank_alike(self):
+        recommendations.build_all(k=2, engine='numpy')
+        numpy_rows = self.table()
+        recommendations.build_all(k=2, engine='python')
+        self.assertEqual(self.table(), numpy_rows)
+        self.assertTrue(numpy_rows)
+
+    def test_refresh_matches_a_full_build(self):
+        recommendations.build_all(k=3)
+        self.order([self.products[2], self.products[4]])
+        recommendations.refresh([self.products[2].pk, self.products[4].pk], k=3)
+        refreshed = [row for row in self.table() if row[0] in (self.products[2].pk, self.products[4].pk)]
+        recommendations.build_all(k=3)
+        self.assertEqual(refreshed, [row for row in self.table() if row[0] in (self.products[2].pk, self.products[4].pk)])
+
+    def test_schedule_refresh_skips_single_product_baskets(self):
+        recommendations.schedule_refresh([self.products[0].pk, self.products[0].pk])
+        jobs = Job.objects.filter(name='recommendations.refresh')
+        self.assertFalse(jobs.exists())
+        recommendations.schedule_refresh([self.products[1].pk, self.products[0].pk])
+        job = jobs.get()
+        self.assertEqual((job.name, job.payload), ('recommendations.refresh', {'product_ids': [self.products[0].pk, self.products[1].pk]}))
+
+    def test_non_numeric_product_id_gets_an_empty_list(self):
+        response = self.client.get('/api/products/abc/recommendations/')
+        self.assertEqual((response.status_code, response.json()), (200, []))
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        jobs.job('test.flaky')(self.flaky)
+        self.addCleanup(jobs._registry.pop, 'test.flaky')
+
+    def flaky(self, fail=True):
+        self.calls.append(fail)
+        if fail:
+            raise RuntimeError('gateway down')
+
+    def run_next(self):
+        Job.objects.filter(status='queued').update(run_at=timezone.now())  # skip the backoff wait
+        return jobs.run(jobs.claim('test-worker'))
+
+    @override_settings(JOB_QUEUE={'BACKOFF_BASE': 10})
+    def test_retries_back_off_exponentially(self):
+        enqueued = jobs.enqueue('test.flaky')
+        for attempt, base in ((1, 10), (2, 20)):
+            before = timezone.now()
+            self.assertFalse(self.run_next())
+            queued = Job.objects.get(pk=enqueued.pk)
+            self.assertEqual((queued.status, queued.attempts), ('queued', attempt))
+            wait = (queued.run_at - before).total_seconds()
+            self.assertTrue(base <= wait <= base * 1.25 + 1, wait)
+            self.assertIn('gateway down', queued.last_error)
+
+    def test_fails_permanently_after_max_attempts(self):
+        enqueued = jobs.enqueue('test.flaky', max_attempts=2)
+        self.run_next()
+        self.run_next()
+        self.assertEqual(Job.objects.get(pk=enqueued.pk).status, 'failed')
+        self.assertIsNone(jobs.claim('test-worker'))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_success_marks_the_job_done(self):
+        enqueued = jobs.enqueue('test.flaky', {'fail': False})
+        self.assertTrue(self.run_next())
+        self.assertEqual(Job.objects.get(pk=enqueued.pk).status, 'done')
+
+    @override_settings(JOB_QUEUE={'LOCK_TIMEOUT': 60})
+    def test_stale_locks_are_requeued(self):
+        stale, fresh = jobs.enqueue('test.flaky'), jobs.enqueue('test.flaky')
+        jobs.claim('dead-worker')
+        jobs.claim('live-worker')
+        Job.objects.filter(pk=stale.pk).update(locked_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(Job.objects.get(pk=stale.pk).status, 'queued')
+        self.assertEqual(Job.objects.get(pk=fresh.pk).status, 'running')
+
+    def test_jobs_enqueued_in_a_rolled_back_transaction_never_run(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            jobs.enqueue('test.flaky', {'fail': False})
+            raise RuntimeError('checkout failed')
+        self.assertFalse(Job.objects.filter(name='test.flaky').exists())
+        self.assertIsNone(jobs.claim('test-worker', names=['test.flaky']))
+
+
+class MailDispatcherTests(TestCase):
+    # The suite runs with EMAIL_WORKERS=0, so get_dispatcher() sends inline
+    def test_plain_mail_is_sent_inline_without_workers(self):
+        self.assertTrue(mail.send_mail('Hi', 'Body', ['a@example.com']))
+        self.assertEqual([m.to for m in django_mail.outbox], [['a@example.com']])
+
+    def test_durable_mail_waits_for_the_job_worker(self):
+        mail.send_mail('Hi', 'Body', ['a@example.com'], durable=True)
+        self.assertEqual(django_mail.outbox, [])
+        job = jobs.claim('test-worker', names=['mail.send'])
+        self.assertTrue(jobs.run(job))
+        self.assertEqual([m.subject for m in django_mail.outbox], ['Hi'])
+
+    def test_worker_threads_send_in_batches(self):
+        dispatcher = mail.MailDispatcher(workers=2, batch_wait=0.05)
+        self.addCleanup(dispatcher.shutdown)
+        for i in range(5):
+            dispatcher.submit(EmailMessage(f'#{i}', 'Body', None, ['a@example.com']))
+        dispatcher.flush()
+        self.assertEqual(sorted(m.subject for m in django_mail.outbox), [f'#{i}' for i in range(5)])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        dispatcher = mail.MailDispatcher(workers=1, queue_size=1, enqueue_timeout=0)
+        dispatcher._start = lambda: None  # no sender threads: the queue never drains
+        dispatcher.submit(EmailMessage('first', 'Body', None, ['a@example.com']))
+        with mock.patch('api.mail.get_dispatcher', return_value=dispatcher):
+            self.assertFalse(mail.send_mail('second', 'Body', ['a@example.com']))
+
+
+@mock.patch('api.db_routers.choose_replica', return_value='replica_0')
+@mock.patch('api.db_routers.replica_aliases', return_value=['replica_0'])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        self.product = Product.objects.create(name='Mug', description='', price=100, count=10, category='Kitchen')
+        self.client = client_for(self.customer)
+
+    def read_aliases(self, path):
+        """Where each read of the request was routed (None: primary). The reads themselves still hit `default`."""
+        seen = []
+        with mock.patch.object(db_routers.ReplicaRouter, 'db_for_read', autospec=True,
+                               side_effect=lambda router, model, **hints: seen.append(db_routers._read_alias.get())):
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return set(seen)
+
+    def test_catalog_reads_go_to_a_replica(self, *mocks):
+        self.assertIn('replica_0', self.read_aliases('/api/products/'))
+
+    def test_a_write_pins_the_user_to_the_primary(self, *mocks):
+        self.assertEqual(self.client.post('/api/cart/', {'product_id': self.product.pk}, format='json').status_code, 200)
+        self.assertEqual(self.read_aliases('/api/products/'), {None})
+        other = User.objects.create_user('other', 'other@example.com', 'secret-pass-1')
+        self.client = client_for(other)
+        self.assertIn('replica_0', self.read_aliases('/api/products/'))
+
+    def test_failed_writes_do_not_pin(self, *mocks):
+        self.client.post('/api/cart/', {'product_id': 0}, format='json')
+        self.assertIn('replica_0', self.read_aliases('/api/products/'))
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def test_reads_follow_read_from_and_writes_stay_on_the_primary(self):
+        router = db_routers.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Product))
+        with db_routers.read_from('replica_0'):
+            self.assertEqual(router.db_for_read(Product), 'replica_0')
+            self.assertEqual(router.db_for_write(Product), 'default')
+        self.assertFalse(router.allow_migrate('replica_0', 'api'))
+
+
+class AsyncViewParityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        for i in range(5):
+            Product.objects.create(name=f'Mug {i}', description='', price=100 + i, count=10, category='Kitchen')
+        self.order = place_order(self.customer, Product.objects.first(), 1)
+
+    def assertSamePayload(self, path, data=None, client=None, method='get'):
+        """The async twin of `path` (under /api/async/) answers with the same status and body (page links aside)."""
+        client = client or APIClient()
+        kwargs = {'format': 'json'} if method == 'post' else {}
+        sync, async_ = (getattr(client, method)(url, data, **kwargs) for url in (path, path.replace('/api/', '/api/async/', 1)))
+        async_body = json.loads(async_.content.decode().replace('/api/async/', '/api/'))
+        self.assertEqual((async_.status_code, async_body), (sync.status_code, sync.json()))
+
+    def test_catalog_payloads_match(self):
+        for query in ({}, {'page': 2, 'page_size': 2}, {'page': 9}, {'search': 'Mug 3'}):
+            self.assertSamePayload('/api/products/', query)
+        self.assertSamePayload(f'/api/products/{Product.objects.first().pk}/')
+        self.assertSamePayload('/api/products/0/')
+
+    @mock.patch('api.payments.acreate_order', new_callable=mock.AsyncMock, return_value={'id': 'order_rzp'})
+    @mock.patch('api.payments.get_client')
+    def test_payment_payloads_match(self, get_client, acreate_order):
+        get_client.return_value.order.create.return_value = {'id': 'order_rzp'}
+        client = client_for(self.customer)
+        self.assertSamePayload('/api/payment/create/', {'amount': 250}, client, 'post')
+        self.assertSamePayload('/api/payment/create/', {}, client, 'post')
+        self.assertSamePayload(f'/api/orders/{self.order.pk}/retry-payment/', {}, client, 'post')
+        self.assertSamePayload('/api/payment/create/', {'amount': 250}, method='post')
+
+
+class MediaDeliveryTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=root.name))
+        storage = media.ContentAddressedStorage(location=root.name)
+        self.name = storage.save('products/mug.jpg', ContentFile(b'0123456789'))
+        self.assertEqual(storage.save('products/mug.jpg', ContentFile(b'0123456789')), self.name)
+        with open(os.path.join(root.name, 'notes.txt'), 'wb') as f:
+            f.write(b'plain')
+
+    def get(self, path=None, **headers):
+        return self.client.get(f'/media/{path or self.name}', headers=headers)
+
+    def test_whole_file_with_cache_headers(self):
+        response = self.get()
+        self.assertEqual((response.status_code, b''.join(response.streaming_content)), (200, b'0123456789'))
+        self.assertEqual(response['Cache-Control'], media.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.get('notes.txt')['Cache-Control'], 'public, max-age=3600')
+
+    def test_byte_ranges(self):
+        response = self.get(Range='bytes=2-5')
+        self.assertEqual((response.status_code, b''.join(response.streaming_content)), (206, b'2345'))
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(self.get(Range='bytes=-3').streaming_content), b'789')
+        response = self.get(Range='bytes=10-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+        # A stale If-Range gets the whole (changed) file
+        self.assertEqual(self.get(Range='bytes=2-5', If_Range='"old"').status_code, 200)
+
+    def test_matching_etag_gets_a_304(self):
+        etag = self.get()['ETag']
+        response = self.get(If_None_Match=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+        self.assertEqual(self.get(If_None_Match='"other"').status_code, 200)
+
+    def test_paths_outside_media_root_are_not_found(self):
+        self.assertEqual(self.get('../settings.py').status_code, 404)
+
+    @override_settings(MEDIA_DELIVERY={'SENDFILE': 'x-accel-redirect'})
+    def test_sendfile_hands_the_body_to_the_proxy(self):
+        response = self.get()
+        self.assertEqual((response.content, response['X-Accel-Redirect']), (b'', f'/protected-media/{self.name}'))
+
+
+@override_settings(RESPONSE_COMPRESSION={'MIN_SIZE': 200})
+class CompressionTests(TestCase):
+    def setUp(self):
+        compression.store.clear()
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        for i in range(10):
+            Product.objects.create(name=f'Mug {i}', description='A sturdy mug. ' * 5, price=100, count=10, category='Kitchen')
+
+    def get(self, path='/api/products/', **headers):
+        return self.client.get(path, headers={'Accept-Encoding': 'gzip', **headers})
+
+    def test_large_get_responses_are_gzipped_once(self):
+        plain = self.client.get('/api/products/')
+        response = self.get()
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.get()
+        self.assertEqual((compression.store.misses, compression.store.hits), (1, 1))
+
+    def test_matching_if_none_match_gets_a_304(self):
+        etag = self.get()['ETag']
+        for sent in (etag, etag.removeprefix('W/')):
+            response = self.get(If_None_Match=sent)
+            self.assertEqual((response.status_code, response.content), (304, b''))
+            self.assertEqual(response['ETag'], etag)
+        Product.objects.create(name='New mug', description='', price=100, count=10, category='Kitchen')
+        self.assertEqual(self.get(If_None_Match=etag).status_code, 200)
+
+    def test_small_and_uncompressible_responses_are_left_alone(self):
+        self.assertFalse(self.get('/api/products/0/').has_header('Content-Encoding'))
+        self.assertFalse(self.client.get('/api/products/', headers={'Accept-Encoding': 'identity'}).has_header('Content-Encoding'))
+
+    def test_post_and_streaming_responses_are_not_compressed(self):
+        response = client_for(self.customer).post('/api/token/refresh/', {'refresh': str(ClaimsRefreshToken.for_user(self.customer))},
+                                                  format='json', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        with mock.patch('api.views.ProductViewSet.list', lambda view, request: StreamingHttpResponse(
+                [b'x' * 1000], content_type='application/json')):
+            response = self.get()
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class OrderSnapshotTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        self.mug = Product.objects.create(name='Mug', description='', price=100, count=10, category='Kitchen')
+        self.cup = Product.objects.create(name='Cup', description='', price=50, count=10, category='Kitchen')
+        self.orders = [place_order(self.customer, product, 1) for product in (self.mug, self.cup, self.mug)]
+
+    def snapshots(self):
+        return list(OrderItem.objects.order_by('pk').values_list('product_name', 'product_category'))
+
+    def backfill(self):
+        out = StringIO()
+        call_command('backfill_order_snapshots', batch_size=2, stdout=out)
+        return out.getvalue().splitlines()[-1]
+
+    def test_backfill_fills_legacy_lines_once(self):
+        OrderItem.objects.filter(order__in=self.orders[:2]).update(product_name='', product_category='')
+        self.assertEqual(self.backfill(), 'Done: 2 order line(s) backfilled')
+        self.assertEqual(self.snapshots(), [('Mug', 'Kitchen'), ('Cup', 'Kitchen'), ('Mug', 'Kitchen')])
+        # Re-running finds nothing, and later catalog edits don't rewrite history
+        Product.objects.filter(pk=self.mug.pk).update(name='Mug v2', category='Dining')
+        self.assertEqual(self.backfill(), 'Done: 0 order line(s) backfilled')
+        self.assertEqual(self.snapshots(), [('Mug', 'Kitchen'), ('Cup', 'Kitchen'), ('Mug', 'Kitchen')])
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_their_indexes(self):
+        call_command('check_query_plans', stdout=StringIO())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret-pass-1', role='admin')
+
+    def test_requests_are_counted_per_route(self):
+        client_for(self.customer).get('/api/orders/')
+        response = client_for(self.admin).get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('route="user-orders-list"', response.content.decode())
+
+    def test_metrics_are_admin_only(self):
+        self.assertEqual(client_for(self.customer).get('/api/metrics/').status_code, 403)
+
+
+class SlowRequestTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'secret-pass-1')
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret-pass-1', role='admin')
+        profiling.buffer.clear()
+        self.addCleanup(profiling.buffer.clear)
+
+    def slow_orders_request(self, sample_rate):
+        with override_settings(SLOW_REQUEST_SAMPLER={'THRESHOLD_MS': 0, 'SAMPLE_RATE': sample_rate}):
+            client_for(self.customer).get('/api/orders/')
+        return profiling.buffer.all()[0]
+
+    def test_unsampled_slow_requests_are_still_captured(self):
+        sample = self.slow_orders_request(0)
+        self.assertEqual((sample['path'], sample['sql_recorded'], sample['statements']), ('/api/orders/', False, []))
+        self.client.force_login(self.admin)
+        response = self.client.get(f"/admin/slow-requests/{sample['id']}/")
+        self.assertContains(response, 'SQL not recorded')
+
+    def test_sampled_slow_requests_record_their_sql(self):
+        sample = self.slow_orders_request(1)
+        self.assertTrue(sample['sql_recorded'])
+        self.assertGreater(sample['query_count'], 0)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_seeded_endpoints_can_be_benchmarked(self):
+        call_command('seed_data', users=3, products=20, orders_per_user=2, notifications_per_user=2, broadcasts=1,
+                     days=5, stdout=StringIO())
+        out = StringIO()
+        call_command('bench_endpoints', iterations=1, warmup=0, only='orders-list', stdout=out, stderr=StringIO())
+        self.assertIn('orders-list', out.getvalue())
+
+
+class StartupTests(SimpleTestCase):
+    def test_heavy_clients_load_lazily(self):
+        # A fresh interpreter: this one has imported everything already
+        lazy = {'numpy', 'requests_oauthlib', *LAZY_MODULES}
+        code = f'import sys, django; django.setup(); import api.urls; print(sorted({lazy!r} & set(sys.modules)))'
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env={**os.environ, 'EMAIL_WORKERS': '0'})
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], '[]')
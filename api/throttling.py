@@ -0,0 +1,116 @@
+"""
+Rate limiting for the expensive anonymous endpoints (login, registration,
+password reset) and payment creation.
+
+Each scope gets up to three limits, all read from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']:
+    '<scope>'                per client IP
+    '<scope>_account'        per account: the authenticated user, or, for
+                             anonymous requests, the username/email/uid in
+                             the request body *and* the client IP
+    '<scope>_account_total'  per anonymous account alone, from any IP
+A scope without a configured rate is not limited.
+
+The (account, IP) bucket is the tight one, so a stranger guessing against
+someone's email only exhausts their own pair, not the owner's attempts.
+The account-alone bucket has a higher limit and caps guessing spread over
+many addresses.
+
+The client IP is DRF's get_ident(): REMOTE_ADDR, or the X-Forwarded-For entry
+added by the last of REST_FRAMEWORK['NUM_PROXIES'] trusted proxies. With
+NUM_PROXIES unset, DRF would believe whatever X-Forwarded-For a client sends.
+
+Counters live in the shared cache and are approximated as a sliding window:
+the current and previous fixed windows are weighted by how far we are into the
+current one. Incrementing first (cache.incr is atomic) means concurrent
+requests can't all slip under the limit. Throttles run in APIView.initial(),
+before the handler, so rejected requests never hash a password or hit the DB.
+"""
+import time
+
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    scope = None
+    scope_suffix = ''
+    cache_format = 'throttle:{scope}:{ident}:{window}'
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    @classmethod
+    def for_scope(cls, scope):
+        """For function views, where there's no view class to carry `throttle_scope`."""
+        return type(cls.__name__, (cls,), {'scope': scope})
+
+    def get_ident_key(self, request):
+        raise NotImplementedError
+
+    def parse_rate(self, rate):
+        num, period = rate.split('/')
+        return int(num), {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+    def allow_request(self, request, view):
+        scope = (getattr(view, 'throttle_scope', None) or self.scope or '') + self.scope_suffix
+        return self.hit(scope, self.get_ident_key(request))
+
+    def hit(self, scope, ident):
+        """Count a request against `scope`'s rate for `ident`; False once over the limit."""
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if not rate or not ident:
+            return True
+
+        limit, period = self.parse_rate(rate)
+        now = time.time()
+        window = int(now // period)
+        current_key = self.cache_format.format(scope=scope, ident=ident, window=window)
+        previous_key = self.cache_format.format(scope=scope, ident=ident, window=window - 1)
+
+        cache.add(current_key, 0, period * 2)
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # Key expired between add() and incr()
+            cache.set(current_key, 1, period * 2)
+            current = 1
+        previous = cache.get(previous_key, 0)
+
+        elapsed = (now % period) / period
+        if previous * (1 - elapsed) + current <= limit:
+            return True
+        self.wait_seconds = period * (1 - elapsed)
+        return False
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPRateThrottle(SlidingWindowThrottle):
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+
+class AccountRateThrottle(SlidingWindowThrottle):
+    scope_suffix = '_account'
+    account_fields = ('username', 'email', 'uid')
+
+    def allow_request(self, request, view):
+        scope = (getattr(view, 'throttle_scope', None) or self.scope or '') + self.scope_suffix
+        if request.user and request.user.is_authenticated:
+            return self.hit(scope, f'user-{request.user.pk}')
+        account = self.get_account_key(request)
+        if not account:
+            return True
+        # The pair first: a request it rejects doesn't use up the account's shared allowance
+        return self.hit(scope, f'{account}-{self.get_ident(request)}') and self.hit(f'{scope}_total', account)
+
+    def get_account_key(self, request):
+        data = request.data if hasattr(request.data, 'get') else {}
+        for field in self.account_fields:
+            value = data.get(field)
+            if isinstance(value, str) and value.strip():
+                # Keys must be safe for memcached/redis; usernames can contain anything
+                return f'{field}-' + value.strip().lower().encode().hex()[:200]
+        return None
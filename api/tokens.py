@@ -0,0 +1,102 @@
+import math
+import time
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+# Claims views actually need, so authentication can skip the per-request User lookup
+USER_CLAIMS = ('username', 'is_superuser', 'role', 'is_blocked')
+
+REVOCATIONS_KEY = 'auth:revocations'
+REVOCATIONS_TTL = 5 * 60
+ROTATED_KEY = 'auth:rotated:{}'
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token (and, through access_token, access token) carrying USER_CLAIMS."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_user_claims(user)
+        return token
+
+    def set_user_claims(self, user):
+        for claim in USER_CLAIMS:
+            self[claim] = getattr(user, claim)
+
+
+def revocations():
+    """
+    {user_id: unix time} – tokens issued before that moment are rejected
+    (math.inf for blocked/inactive users). Kept as one small cache entry and
+    rebuilt from the database when missing, so a cache flush can't un-revoke.
+    """
+    revoked = cache.get(REVOCATIONS_KEY)
+    if revoked is None:
+        from .models import User
+
+        cutoff = timezone.now() - api_settings.REFRESH_TOKEN_LIFETIME
+        revoked = {
+            pk: math.floor(valid_after.timestamp())
+            for pk, valid_after in User.objects.filter(tokens_valid_after__gte=cutoff)
+            .values_list('pk', 'tokens_valid_after')
+        }
+        for pk in User.objects.filter(Q(is_blocked=True) | Q(is_active=False)).values_list('pk', flat=True):
+            revoked[pk] = math.inf
+        cache.set(REVOCATIONS_KEY, revoked, REVOCATIONS_TTL)
+    return revoked
+
+
+def is_revoked(user_id, token):
+    revoked_before = revocations().get(int(user_id))
+    return revoked_before is not None and token.get('iat', 0) < revoked_before
+
+
+def revoke_user_tokens(user):
+    """Invalidate every token issued to user so far (called when auth-relevant fields change)."""
+    from .models import User
+
+    now = timezone.now()
+    User.objects.filter(pk=user.pk).update(tokens_valid_after=now)
+    user.tokens_valid_after = now
+    cache.delete(REVOCATIONS_KEY)
+
+
+def mark_rotated(token):
+    """
+    Record that a refresh token has been exchanged. Returns False if it was
+    already used (a replay). The cache answers repeat attempts without touching
+    the database; the primary-key insert keeps the check correct if the cache
+    is flushed or not shared between workers.
+    """
+    from .models import RotatedRefreshToken
+
+    jti = token[api_settings.JTI_CLAIM]
+    ttl = max(int(token['exp'] - time.time()), 1)
+    if not cache.add(ROTATED_KEY.format(jti), 1, ttl):
+        return False
+    try:
+        with transaction.atomic():
+            RotatedRefreshToken.objects.create(jti=jti, expires_at=datetime_from_epoch(token['exp']))
+    except IntegrityError:
+        return False
+    return True
+
+
+def prune_rotated_tokens(batch_size=1000):
+    """Delete expired rotation records in bounded batches; returns the number removed."""
+    from .models import RotatedRefreshToken
+
+    expired = RotatedRefreshToken.objects.filter(expires_at__lt=timezone.now())
+    removed = 0
+    while True:
+        batch = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return removed
+        removed += RotatedRefreshToken.objects.filter(pk__in=batch).delete()[0]
@@ -4,7 +4,7 @@ from dj_rest_auth.views import (
     UserDetailsView, PasswordChangeView, PasswordResetView, PasswordResetConfirmView
 )
 from .views import (
-    RegisterView, LoginView, GoogleLogin, custom_password_reset_confirm,
+    RegisterView, LoginView, custom_password_reset_confirm,
     ProductViewSet, CartView, WishlistView, AddressViewSet,
     OrderViewSet, OrderCheckoutView, CancelOrderView, RetryPaymentView,
     CreatePaymentView, VerifyPaymentView,
@@ -15,10 +15,16 @@ from .views import (
     SendNotificationView,
     NotificationListView,
     MarkNotificationReadView,
+    BulkMarkNotificationsReadView,
+    UnreadNotificationCountView,
     UserListView,
+    MetricsView,
 )
+from .streaming import event_stream
+from . import async_views
 from rest_framework_simplejwt.views import TokenRefreshView
 from .serializers import CustomPasswordResetSerializer
+from .utils import lazy_view
 
 #  ROUTER SETUP 
 router = DefaultRouter()
@@ -38,7 +44,7 @@ urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'), 
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('auth/google/', GoogleLogin.as_view(), name='google_login'),
+    path('auth/google/', lazy_view('api.social.GoogleLogin'), name='google_login'),
 
     #  Profile & Password 
     path('user/', UserDetailsView.as_view(), name='user_details'),
@@ -72,6 +78,20 @@ urlpatterns = [
     path('notifications/send/', SendNotificationView.as_view(), name='send-notification'),
     path('notifications/', NotificationListView.as_view(), name='my-notifications'),
     path('notifications/<int:pk>/read/', MarkNotificationReadView.as_view(), name='read-notification'),
+    path('notifications/read/', BulkMarkNotificationsReadView.as_view(), name='read-notifications'),
+    path('notifications/unread-count/', UnreadNotificationCountView.as_view(), name='unread-notification-count'),
+
+    # Real-time events (server-sent events, served by the ASGI app)
+    path('events/', event_stream, name='event-stream'),
+
+    # Async variants of the hot endpoints (same responses; for the ASGI deployment)
+    path('async/products/', async_views.product_list, name='async-products-list'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async-products-detail'),
+    path('async/payment/create/', async_views.create_payment, name='async-create-payment'),
+    path('async/orders/<int:pk>/retry-payment/', async_views.retry_payment, name='async-retry-payment'),
 
     path('users/', UserListView.as_view(), name='user-list'),
+
+    # Prometheus metrics (admin only)
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
@@ -1,3 +1,7 @@
+import functools
+
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import exception_handler
 from rest_framework.response import Response
 from rest_framework import status
@@ -13,8 +17,26 @@ def custom_exception_handler(exc, context):
             "detail": str(exc)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    # Standardize error format
+    # Standardize error format (keeping headers such as Retry-After / WWW-Authenticate)
     return Response({
         "error": "Request Failed",
         "detail": response.data
-    }, status=response.status_code)
\ No newline at end of file
+    }, status=response.status_code, headers=dict(response.items()))
+
+
+def lazy_view(dotted_path, **initkwargs):
+    """
+    URLconf entry for a DRF view class that is imported on its first request
+    rather than when the URLconf loads, for views with slow-to-import
+    dependencies. csrf_exempt like every APIView (DRF enforces CSRF itself
+    for session-authenticated requests).
+    """
+    @functools.cache
+    def load():
+        return import_string(dotted_path).as_view(**initkwargs)
+
+    @csrf_exempt
+    def view(request, *args, **kwargs):
+        return load()(request, *args, **kwargs)
+
+    return view
@@ -1,13 +1,14 @@
-import razorpay
 from django.conf import settings
+from django.http import Http404, HttpResponse
 from rest_framework import viewsets, permissions, status, filters, generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.pagination import PageNumberPagination
-from django.db.models import Sum
+from rest_framework.decorators import action, api_view, permission_classes, throttle_classes
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
 from django.contrib.auth import authenticate, login, get_user_model
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import ClaimsRefreshToken
 from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly
 
 # Email & Tokens
@@ -15,28 +16,27 @@ from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_decode
 from django.core.mail import send_mail
 
-# Social Auth
-from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
-from allauth.socialaccount.providers.oauth2.client import OAuth2Client
-from dj_rest_auth.registration.views import SocialLoginView
-
 # Permissions
 from .permissions import IsAdminUser
+from .throttling import IPRateThrottle, AccountRateThrottle
+from .db_routers import ReplicaReadMixin
+from . import inventory, notifications, events, metrics, payments, popularity, recommendations, retention, sweeper
 
 # Models & Serializers
-from .models import Product, ProductImage, CartItem, Wishlist, Order, OrderItem, Address, CancelledOrder, Notification
+from .models import Product, ProductImage, CartItem, Wishlist, Order, OrderItem, Address, CancelledOrder, Notification, ArchivedOrder
 from .serializers import ( 
     UserSerializer, ProductSerializer, CartItemSerializer, 
-    WishlistSerializer, OrderSerializer, CustomUserSerializer, AddressSerializer,
-    AdminUserSerializer, AdminOrderSerializer, NotificationSerializer
+    WishlistSerializer, OrderSerializer, OrderSummarySerializer, CustomUserSerializer, AddressSerializer,
+    AdminUserSerializer, AdminOrderSerializer, NotificationSerializer, RecommendedProductSerializer,
+    ArchivedOrderSerializer, ArchivedOrderSummarySerializer, AdminArchivedOrderSerializer,
 )
 
 User = get_user_model()
-client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
 
 #  AUTHENTICATION
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([IPRateThrottle.for_scope('password_reset'), AccountRateThrottle.for_scope('password_reset')])
 def custom_password_reset_confirm(request):
     uidb64 = request.data.get('uid')
     token = request.data.get('token')
@@ -62,16 +62,22 @@ class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPRateThrottle, AccountRateThrottle]
+    throttle_scope = 'register'
 
 class LoginView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [IPRateThrottle, AccountRateThrottle]
+    throttle_scope = 'login'
     def post(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
         user = authenticate(username=username, password=password)
+        if user and user.is_blocked:
+            return Response({'detail': 'Account is blocked'}, status=status.HTTP_403_FORBIDDEN)
         if user:
             login(request, user)
-            refresh = RefreshToken.for_user(user)
+            refresh = ClaimsRefreshToken.for_user(user)
             return Response({
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
@@ -79,33 +85,19 @@ class LoginView(APIView):
             }, status=status.HTTP_200_OK)
         return Response({'detail': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
-class GoogleLogin(SocialLoginView):
-    adapter_class = GoogleOAuth2Adapter
-    client_class = OAuth2Client
-    callback_url = "https://project-ui-react.vercel.app" 
-
-    def get_response(self):
-        response = super().get_response()
-        user = self.user
-        refresh = RefreshToken.for_user(user)
-        response.data['access'] = str(refresh.access_token)
-        response.data['refresh'] = str(refresh)
-        response.data['user'] = CustomUserSerializer(user).data
-        return response
-    
 class ProductPagination(PageNumberPagination):
     page_size = 8
     page_size_query_param = 'page_size'
     max_page_size = 100
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all().order_by('-id') 
+class ProductViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.prefetch_related('images').order_by('-id')
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly] 
     pagination_class = ProductPagination
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description', 'category']
-    ordering_fields = ['price', 'created_at']
+    ordering_fields = ['price', 'created_at', 'units_sold', 'trending_score', 'wishlist_count']
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -116,9 +108,30 @@ class ProductViewSet(viewsets.ModelViewSet):
         qs = super().get_queryset()
         category = self.request.query_params.get('category')
         if category and category.lower() != 'all':
-            qs = qs.filter(category__iexact=category)
+            qs = qs.in_category(category)
         return qs
 
+    @action(detail=True, methods=['get'], url_path='recommendations')
+    def bought_together(self, request, pk=None):
+        # Precomputed (see api/recommendations.py): one query, no get_object(); unknown ids just get []
+        if not pk.isdigit():
+            return Response([])
+        affinities = recommendations.for_product(pk)
+        return Response(RecommendedProductSerializer(affinities, many=True, context={'request': request}).data)
+
+    @action(detail=False, methods=['get'], url_path='top')
+    def top(self, request):
+        # ?by=trending|best_sellers|wishlisted&category=&limit= : a top-N walk of the score's index
+        column = popularity.LEADERBOARDS.get(request.query_params.get('by', 'trending'))
+        if column is None:
+            return Response({'error': f"by must be one of: {', '.join(popularity.LEADERBOARDS)}"}, 400)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, 400)
+        products = self.get_queryset().filter(is_active=True).order_by(f'-{column}', '-id')[:limit]
+        return Response(self.get_serializer(products, many=True).data)
+
 #  CART & WISHLIST & ADDRESS
 class AddressViewSet(viewsets.ModelViewSet):
     serializer_class = AddressSerializer
@@ -170,15 +183,73 @@ class WishlistView(APIView):
         return Response({'message': 'Removed'})
 
 #  USER ORDER MANAGEMENT
-class OrderViewSet(viewsets.ModelViewSet):
+class ArchivedOrderMixin:
+    """
+    Orders moved out by `manage.py archive_data` (api/retention.py): ?archived=1
+    lists them, and retrieve falls back to them for ids no longer in Order.
+    """
+    archived_serializer_class = ArchivedOrderSerializer
+
+    def wants_archive(self):
+        return self.request.query_params.get('archived') in ('1', 'true')
+
+    def archived_queryset(self):
+        return ArchivedOrder.objects.order_by('-created_at')
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            pk = str(kwargs.get(self.lookup_url_kwarg or self.lookup_field, ''))
+            archived = self.archived_queryset().select_related('user').filter(pk=pk).first() if pk.isdigit() else None
+            if archived is None:
+                raise
+            return Response(self.archived_serializer_class(archived, context=self.get_serializer_context()).data)
+
+class OrderViewSet(ArchivedOrderMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = ProductPagination 
 
+    def get_serializer_class(self):
+        # History pages get summaries; the full order (lines, user, cancellation) is fetched per order
+        if self.action == 'list':
+            return ArchivedOrderSummarySerializer if self.wants_archive() else OrderSummarySerializer
+        return OrderSerializer
+
+    def archived_queryset(self):
+        queryset = super().archived_queryset()
+        if self.request.user.is_superuser:
+            return queryset
+        return queryset.filter(user=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        if self.wants_archive():
+            return super().list(request, *args, **kwargs)
+        # The full history: live orders, then the archived ones once those run out
+        history = retention.OrderHistory(self.get_queryset(), self.archived_queryset().defer('shipping_details', 'cancellation'))
+        page = self.paginate_queryset(history)
+        context = self.get_serializer_context()
+        return self.get_paginated_response([
+            (ArchivedOrderSummarySerializer if isinstance(order, ArchivedOrder) else OrderSummarySerializer)(order, context=context).data
+            for order in page
+        ])
+
     def get_queryset(self):
+        if self.action == 'list' and self.wants_archive():
+            return self.archived_queryset().defer('shipping_details', 'cancellation')
+        if self.action == 'list':
+            first_line = OrderItem.objects.filter(order=OuterRef('pk')).order_by('pk')
+            queryset = Order.objects.only('id', 'status', 'total_amount', 'created_at', 'payment_method').annotate(
+                item_count=Count('items'),
+                thumbnail=Subquery(first_line.values('product_image')[:1]),
+            )
+        else:
+            # Lines render from their snapshots, so products aren't loaded at all
+            queryset = Order.objects.select_related('user', 'cancellation_details').prefetch_related('items')
         if self.request.user.is_superuser:
-            return Order.objects.all().order_by('-created_at')
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+            return queryset.order_by('-created_at')
+        return queryset.filter(user=self.request.user).order_by('-created_at')
 
 class OrderCheckoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -190,21 +261,25 @@ class OrderCheckoutView(APIView):
         
         if not shipping or not total: return Response({'error': 'Missing details'}, 400)
         
-        cart = CartItem.objects.filter(user=request.user)
-        if not cart.exists(): return Response({'error': 'Cart empty'}, 400)
+        cart = list(CartItem.objects.filter(user=request.user).select_related('product').prefetch_related('product__images'))
+        if not cart: return Response({'error': 'Cart empty'}, 400)
 
         try:
             status_val = 'processing' if method == 'cod' else 'pending_payment'
-            order = Order.objects.create(
-                user=request.user, total_amount=total, 
-                shipping_details=shipping, payment_method=method, status=status_val
-            )
-            for item in cart:
-                OrderItem.objects.create(order=order, product=item.product, quantity=item.quantity, price=item.product.price)
-                if item.product.count >= item.quantity:
-                    item.product.count -= item.quantity
-                    item.product.save()
-            cart.delete()
+            # All or nothing: a failure part-way must not leave an order without its stock
+            # movement, or stock sold from a cart that is still full
+            with transaction.atomic():
+                order = Order.objects.create(
+                    user=request.user, total_amount=total, 
+                    shipping_details=shipping, payment_method=method, status=status_val
+                )
+                # One INSERT for all lines, each with its product snapshot
+                OrderItem.objects.bulk_create([OrderItem.for_product(order, item.product, item.quantity) for item in cart])
+                recommendations.schedule_refresh([item.product_id for item in cart])
+                lines = [(item.product_id, item.quantity) for item in cart]
+                inventory.sell(order, lines)
+                popularity.record_sale(lines, order.created_at)
+                CartItem.objects.filter(pk__in=[item.pk for item in cart]).delete()
             return Response({'message': 'Success', 'order_id': order.id, 'status': status_val}, 201)
         except Exception as e: return Response({'error': str(e)}, 500)
 
@@ -212,27 +287,33 @@ class CancelOrderView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def post(self, request, pk):
         try:
-            order = Order.objects.get(id=pk) if request.user.is_superuser else Order.objects.get(id=pk, user=request.user)
-            if order.status in ['delivered', 'cancelled']: return Response({'error': 'Cannot cancel'}, 400)
-            order.status = 'cancelled'
-            order.save()
-            
-            CancelledOrder.objects.create(order=order, cancelled_by=request.user, reason=request.data.get('reason', 'User request'))
-            for item in order.items.all():
-                item.product.count += item.quantity
-                item.product.save()
+            orders = Order.objects.all() if request.user.is_superuser else Order.objects.filter(user=request.user)
+            order = orders.only('pk', 'user_id', 'created_at').get(id=pk)
+            with transaction.atomic():
+                # Claimed like the sweeper does (api/sweeper.py): only the request that flips the status
+                # gives the stock and popularity back, and only it writes the CancelledOrder row
+                if not orders.filter(id=pk).exclude(status__in=inventory.CLOSED_STATUSES).update(status='cancelled'):
+                    return Response({'error': 'Cannot cancel'}, 400)
+                CancelledOrder.objects.create(order=order, cancelled_by=request.user, reason=request.data.get('reason', 'User request'))
+                inventory.restock_orders([order], request.user)
+                popularity.record_cancellations([order])
+            # .update() skips post_save, so publish the status change ourselves
+            events.publish_order_status(order.pk, order.user_id, 'cancelled')
             return Response({'message': 'Cancelled'}, 200)
         except Order.DoesNotExist: return Response({'error': 'Not found'}, 404)
 
 class RetryPaymentView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [IPRateThrottle, AccountRateThrottle]
+    throttle_scope = 'payment'
     def post(self, request, pk):
         try:
             order = Order.objects.get(id=pk, user=request.user)
             if order.status != 'pending_payment': return Response({'error': 'Not pending'}, 400)
             
             amt = int(float(order.total_amount) * 100)
-            rzp_order = client.order.create({"amount": amt, "currency": "INR", "payment_capture": "1"})
+            with metrics.timed('gateway'):
+                rzp_order = payments.get_client().order.create({"amount": amt, "currency": "INR", "payment_capture": "1"})
             
             return Response({
                 'razorpay_order_id': rzp_order['id'], 'amount': amt, 
@@ -242,6 +323,8 @@ class RetryPaymentView(APIView):
 
 class CreatePaymentView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [IPRateThrottle, AccountRateThrottle]
+    throttle_scope = 'payment'
 
     def post(self, request):
         try:
@@ -255,11 +338,12 @@ class CreatePaymentView(APIView):
             amt = int(float(amount) * 100)
 
             # 3. Create Order via Razorpay Client
-            order = client.order.create({
-                "amount": amt, 
-                "currency": "INR", 
-                "payment_capture": "1"
-            })
+            with metrics.timed('gateway'):
+                order = payments.get_client().order.create({
+                    "amount": amt, 
+                    "currency": "INR", 
+                    "payment_capture": "1"
+                })
 
             return Response({
                 'id': order['id'],         
@@ -277,13 +361,19 @@ class VerifyPaymentView(APIView):
     def post(self, request):
         try:
             data = request.data
-            client.utility.verify_payment_signature({
+            payments.get_client().utility.verify_payment_signature({
                 'razorpay_order_id': data['razorpay_order_id'],
                 'razorpay_payment_id': data['razorpay_payment_id'],
                 'razorpay_signature': data['razorpay_signature']
             })
             if data.get('order_id'):
-                Order.objects.filter(id=data['order_id']).update(status='processing', razorpay_payment_id=data['razorpay_payment_id'])
+                order = Order.objects.filter(id=data['order_id'])
+                # Only while it's still unpaid: the sweeper (or the customer) may have cancelled it meanwhile
+                if order.filter(status='pending_payment').update(status='processing', razorpay_payment_id=data['razorpay_payment_id']):
+                    # .update() skips post_save, so publish the status change ourselves
+                    events.publish_order_status(int(data['order_id']), order.values_list('user_id', flat=True).get(), 'processing')
+                elif sweeper.record_late_payment(data['order_id'], data['razorpay_payment_id']):
+                    return Response({'error': 'Order was cancelled before payment; the payment will be refunded'}, 409)
             return Response({'message': 'Verified'}, 200)
         except Exception as e: return Response({'error': str(e)}, 400)
 
@@ -299,7 +389,7 @@ class AdminProductViewSet(viewsets.ModelViewSet):
         qs = super().get_queryset()
         category = self.request.query_params.get('category')
         if category and category != 'All':
-            qs = qs.filter(category__iexact=category)
+            qs = qs.in_category(category)
         return qs
 
     # CREATE: Handles Files AND Links
@@ -322,7 +412,7 @@ class AdminProductViewSet(viewsets.ModelViewSet):
         # 3. Handle Main Image (Legacy)
         if 'image' in request.FILES:
             product.image = request.FILES['image']
-            product.save()
+            product.save(update_fields=['image'])
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -339,7 +429,7 @@ class AdminProductViewSet(viewsets.ModelViewSet):
         for img_id in deleted_ids:
             if img_id == "main":
                 instance.image = None
-                instance.save()
+                instance.save(update_fields=['image'])
             elif img_id.isdigit():
                 ProductImage.objects.filter(id=img_id, product=instance).delete()
 
@@ -357,7 +447,7 @@ class AdminProductViewSet(viewsets.ModelViewSet):
         # 4. Main Image Update (Optional)
         if 'image' in request.FILES:
             instance.image = request.FILES['image']
-            instance.save()
+            instance.save(update_fields=['image'])
 
         return Response(serializer.data)
 
@@ -368,19 +458,28 @@ class AdminUserViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter]
     search_fields = ['username', 'email']
 
-class AdminOrderViewSet(viewsets.ModelViewSet):
+class AdminOrderViewSet(ArchivedOrderMixin, viewsets.ModelViewSet):
     serializer_class = AdminOrderSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+    archived_serializer_class = AdminArchivedOrderSerializer
+
+    def get_serializer_class(self):
+        if self.action == 'list' and self.wants_archive():
+            return AdminArchivedOrderSerializer
+        return AdminOrderSerializer
 
     def get_queryset(self):
-        queryset = Order.objects.all().order_by('-created_at')
+        if self.action == 'list' and self.wants_archive():
+            queryset = self.archived_queryset().select_related('user')
+        else:
+            queryset = Order.objects.select_related('user').prefetch_related('items').order_by('-created_at')
         user_id = self.request.query_params.get('user') 
         if user_id:
             queryset = queryset.filter(user_id=user_id)
         return queryset
     
 # 4. Admin Dashboard Analytics
-class AdminDashboardStatsView(APIView):
+class AdminDashboardStatsView(ReplicaReadMixin, APIView):
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
 
     def get(self, request):
@@ -392,12 +491,21 @@ class AdminDashboardStatsView(APIView):
             status='cancelled'
         ).aggregate(total=Sum('total_amount'))['total'] or 0
 
+        # Archived orders (api/retention.py) are all delivered or cancelled
+        archived = ArchivedOrder.objects.aggregate(
+            orders=Count('pk'),
+            units=Sum('units', filter=Q(status='delivered')),
+            revenue=Sum('total_amount', filter=~Q(status='cancelled')),
+        )
+        total_products_sold += archived['units'] or 0
+        total_revenue += archived['revenue'] or 0
+
         total_customers = User.objects.filter(is_superuser=False).count()
 
         data = {
             "total_users": total_customers, 
             "total_products": Product.objects.count(),
-            "total_orders": Order.objects.count(),
+            "total_orders": Order.objects.count() + archived['orders'],
             "products_sold": total_products_sold,
             "total_revenue": total_revenue,
         }
@@ -415,13 +523,9 @@ class SendNotificationView(APIView):
             return Response({'error': 'Title and Message required'}, status=400)
 
         if recipient_id == "all":
-            users = User.objects.filter(is_superuser=False)
-            notifications = [
-                Notification(recipient=user, title=title, message=message)
-                for user in users
-            ]
-            Notification.objects.bulk_create(notifications)
-            return Response({'message': f'Sent to {len(notifications)} users'})
+            # Stored once with recipient=NULL; NotificationListView merges it into every user's feed
+            Notification.objects.create(recipient=None, title=title, message=message)
+            return Response({'message': 'Sent to all users'})
         
         else:
             try:
@@ -431,22 +535,54 @@ class SendNotificationView(APIView):
             except User.DoesNotExist:
                 return Response({'error': 'User not found'}, 404)
 
+class NotificationPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-created_at'
+
 class NotificationListView(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationPagination
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user).order_by('-created_at')
+        return Notification.objects.for_user(self.request.user).order_by('-created_at')
 
 # 3. Mark as Read
 class MarkNotificationReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def post(self, request, pk):
-        Notification.objects.filter(id=pk, recipient=request.user).update(is_read=True)
+        notifications.mark_read(request.user, ids=[pk])
         return Response({'message': 'Marked as read'})
+
+# Mark several (or all) notifications as read in one request
+class BulkMarkNotificationsReadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    def post(self, request):
+        ids = request.data.get('ids')
+        if request.data.get('all') in (True, 'true', '1'):
+            notifications.mark_read(request.user)
+        elif isinstance(ids, list) and all(str(i).isdigit() for i in ids):
+            notifications.mark_read(request.user, ids=[int(i) for i in ids])
+        else:
+            return Response({'error': 'Provide "ids" (list) or "all": true'}, status=400)
+        return Response({'message': 'Marked as read', 'unread_count': notifications.unread_count(request.user)})
+
+class UnreadNotificationCountView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    def get(self, request):
+        return Response({'unread_count': notifications.unread_count(request.user)})
     
 
 class UserListView(generics.ListAPIView):
     permission_classes = [permissions.IsAdminUser]
     serializer_class = UserSerializer
-    queryset = User.objects.filter(is_superuser=False) 
\ No newline at end of file
+    queryset = User.objects.filter(is_superuser=False) 
+
+
+class MetricsView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
\ No newline at end of file
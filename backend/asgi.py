@@ -3,6 +3,12 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with an ASGI server (e.g. ``uvicorn backend.asgi:application``) so the
+async server-sent events endpoint (/api/events/) can hold many idle client
+connections per worker. The WSGI app answers /api/events/ with a 503, so the
+proxy must route that path here. With more than one process, set REDIS_URL so
+events published elsewhere (other workers, run_jobs) reach every stream.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
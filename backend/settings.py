@@ -1,6 +1,7 @@
 from pathlib import Path
 from datetime import timedelta
 import os
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -11,6 +12,20 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads get content-addressed names (cacheable forever); see api/media.py
+STORAGES = {
+    'default': {'BACKEND': 'api.media.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Media served by api.media.serve_media. MEDIA_SENDFILE=x-accel-redirect (nginx) or x-sendfile
+# hands the transfer to the front proxy; unset, Django streams the file itself.
+MEDIA_DELIVERY = {
+    'SENDFILE': os.getenv('MEDIA_SENDFILE') or None,
+    'X_ACCEL_PREFIX': os.getenv('MEDIA_X_ACCEL_PREFIX', '/protected-media/'),
+    'MAX_AGE': 60 * 60,
+}
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('SECRET_KEY')
 
@@ -52,6 +67,10 @@ SITE_ID = 1
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware', # CORS First
+    'api.metrics.MetricsMiddleware', # per-route latency/query metrics, see /api/metrics/
+    'api.profiling.SlowRequestMiddleware', # SQL + EXPLAIN for slow requests, see /admin/slow-requests/
+    'api.db_routers.ReplicaPinMiddleware', # read-your-writes for replica reads
+    'api.compression.CompressionMiddleware', # gzip/brotli with a precompressed-body store
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,14 +103,64 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'echobaydb', #Hosting
-        'USER': 'echobayuser', #Hosting    
+        'NAME': os.getenv('DB_NAME', 'echobaydb'), #Hosting
+        'USER': os.getenv('DB_USER', 'echobayuser'), #Hosting    
         'PASSWORD': os.getenv('DB_PASSWORD'), 
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': os.getenv('DB_PORT', '5432'),
     }
 }
 
+# DB_ENGINE=sqlite for a throwaway local database (e.g. seed_data + bench_endpoints)
+if os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+    }
+
+# Persistent connections, checked before reuse so a dropped one is replaced instead of erroring
+DATABASES['default'].update({
+    'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+    'CONN_HEALTH_CHECKS': True,
+})
+
+# Read replicas (api/db_routers.py): DB_REPLICA_HOSTS=host1,host2 for PostgreSQL, or
+# DB_REPLICA_NAMES=/tmp/replica.sqlite3 (copies of the primary file) to try it locally with SQLite
+_replica_key = 'NAME' if os.getenv('DB_ENGINE') == 'sqlite' else 'HOST'
+_replicas = os.getenv('DB_REPLICA_NAMES' if _replica_key == 'NAME' else 'DB_REPLICA_HOSTS', '')
+for _i, _value in enumerate(v.strip() for v in _replicas.split(',') if v.strip()):
+    DATABASES[f'replica_{_i}'] = {**DATABASES['default'], _replica_key: _value, 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['api.db_routers.ReplicaRouter']
+# How long a user reads from the primary after writing (should exceed replication lag)
+DATABASE_REPLICAS_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+
+# Cache: token revocations, refresh-token rotation, throttles, notification badges, replica pinning.
+# These only work when every process (gunicorn workers, run_jobs, cron commands) shares one cache,
+# so production needs REDIS_URL. LocMemCache is per process: it's only allowed with DEBUG=True, or
+# with LOCAL_CACHE=True for a deliberate single-process setup.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+    # Server-sent events cross processes over Redis pub/sub (api/events.py)
+    EVENT_BROKER = 'api.events.RedisBroker'
+elif not DEBUG and os.getenv('LOCAL_CACHE', 'False') != 'True':
+    raise ImproperlyConfigured(
+        'REDIS_URL is not set. A per-process cache would give each worker its own revocations and throttles; '
+        'set REDIS_URL, or LOCAL_CACHE=True if this really runs as a single process.'
+    )
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
@@ -130,10 +199,27 @@ AUTHENTICATION_BACKENDS = [
 REST_FRAMEWORK = {
     'EXCEPTION_HANDLER': 'api.utils.custom_exception_handler',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWT without a per-request User query (claims + cached revocations)
+        'api.authentication.StatelessJWTAuthentication',
         'rest_framework.authentication.TokenAuthentication',
         # 'rest_framework.authentication.SessionAuthentication',
     ),
+    # Reverse proxies in front of gunicorn whose X-Forwarded-For entry is trusted (1 behind nginx).
+    # 0 uses REMOTE_ADDR; leaving it unset would let clients pick their throttle IP.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
+    # Used by api.throttling: '<scope>' is per IP, '<scope>_account' per user (or username + IP),
+    # '<scope>_account_total' per username from any IP
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '20/min',
+        'login_account': '5/min',
+        'login_account_total': '100/hour',
+        'register': '10/hour',
+        'password_reset': '10/hour',
+        'password_reset_account': '5/hour',
+        'password_reset_account_total': '20/hour',
+        'payment': '30/min',
+        'payment_account': '10/min',
+    },
 }
 
 # JWT Configuration
@@ -141,7 +227,8 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1), 
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
-    'BLACKLIST_AFTER_ROTATION': True,
+    'BLACKLIST_AFTER_ROTATION': True,  # enforced by api.tokens.mark_rotated (no token_blacklist app)
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.ClaimsTokenRefreshSerializer',
 }
 
 # --- dj-rest-auth Configuration ---
@@ -184,8 +271,64 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD') 
 DEFAULT_FROM_EMAIL = 'EchoBay <echobay@gmail.com>'
 
+# Background email sending (see api/mail.py); WORKERS = 0 sends inline
+EMAIL_DISPATCHER = {
+    'WORKERS': int(os.getenv('EMAIL_WORKERS', 2)),
+    'QUEUE_SIZE': 1000,
+    'BATCH_SIZE': 50,
+}
+
+# Slow-request sampler (api/profiling.py); samples are browsable at /admin/slow-requests/
+SLOW_REQUEST_SAMPLER = {
+    'THRESHOLD_MS': int(os.getenv('SLOW_REQUEST_MS', 500)),
+    'SAMPLE_RATE': float(os.getenv('SLOW_REQUEST_SAMPLE_RATE', 0.01)),
+    'MAX_SAMPLES': 50,
+    'EXPLAIN_TOP': 3,
+}
+
+# CompressionMiddleware (api/compression.py); brotli is used when the `brotli` package is installed
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': 1024,
+    'CACHE_BYTES': int(os.getenv('COMPRESSION_CACHE_MB', '32')) * 1024 * 1024,
+}
+
+# "Frequently bought together" (api/recommendations.py); NumPy, when installed, speeds up full rebuilds
+RECOMMENDATIONS = {
+    'TOP_K': 10,
+}
+
+# Stock ledger (api/inventory.py); `manage.py compact_stock` folds older movements into snapshots
+INVENTORY = {
+    'COMPACT_AFTER_DAYS': 30,
+}
+
+# `manage.py sweep_orders` (api/sweeper.py): expire unpaid orders, report low stock to admins
+SWEEPER = {
+    'PENDING_TTL_HOURS': 24,
+    'LOW_STOCK_THRESHOLD': 5,
+}
+
+# `manage.py archive_data` (api/retention.py): per-policy overrides, e.g. {'orders': {'AFTER_DAYS': 730}}
+RETENTION = {
+    'BATCH_SIZE': 500,
+    'POLICIES': {},
+}
+
+# Best-seller/trending counters on Product (api/popularity.py). Changing HALF_LIFE_HOURS or EPOCH needs `manage.py rebuild_popularity`
+POPULARITY = {
+    'HALF_LIFE_HOURS': int(os.getenv('TRENDING_HALF_LIFE_HOURS', 72)),
+}
+
+# Background job queue (api/jobs.py); run workers with `python manage.py run_jobs`
+JOB_QUEUE = {
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 10,
+    'LOCK_TIMEOUT': 15 * 60,
+}
+
 RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID')
 RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
+RAZORPAY_API_URL = os.getenv('RAZORPAY_API_URL', 'https://api.razorpay.com')
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles') #Hosting
 CORS_ALLOW_ALL_ORIGINS = True #Hosting
@@ -14,16 +14,25 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path,include
-from django.conf.urls.static import static
+from django.urls import path,include,re_path
 from django.conf import settings
+from api.admin import slow_requests_view
+from api.media import serve_media
 
 urlpatterns = [
+    path('admin/slow-requests/', admin.site.admin_view(slow_requests_view), name='admin-slow-requests'),
+    path('admin/slow-requests/<int:sample_id>/', admin.site.admin_view(slow_requests_view), name='admin-slow-request'),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path('accounts/', include('allauth.urls')),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Uploaded media, in production too (ranges, conditional requests, optional X-Accel-Redirect/X-Sendfile).
+# Skipped when MEDIA_URL points at another host (CDN/object storage).
+if settings.MEDIA_URL.startswith('/'):
+    urlpatterns += [
+        re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.+)$", serve_media, name='media'),
+    ]
\ No newline at end of file